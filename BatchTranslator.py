@@ -0,0 +1,100 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+import glob
+import os
+import time
+from CompilationPipeline import CompilationPipeline
+from CompilationCache import CompilationCache
+from Exceptions import LexerException, ParserException, SemanticAnalyzerException
+from Token import SYMBOLS
+
+GENERATED_SUFFIX = ".java"
+OPTIMIZED_SUFFIX = ".optimized.java"
+
+
+@dataclass
+class TranslationResult:
+    path: str
+    generated_path: str = None
+    optimized_path: str = None
+    error: str = None
+    elapsed: float = 0.0
+
+
+def collect_sources(source: str, pattern: str = "*.c") -> tuple[str, list[str]]:
+    """
+        source - каталог (берутся файлы по pattern во всех подкаталогах) или glob-шаблон.
+        Возвращает общий корень файлов и их список
+    """
+    if os.path.isdir(source):
+        root = source
+        paths = glob.glob(os.path.join(glob.escape(source), "**", pattern), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else "."
+    return root, sorted(path for path in paths if os.path.isfile(path))
+
+
+@lru_cache(maxsize=None)
+def process_cache(cache_dir: str) -> CompilationCache:
+    """Один кеш на процесс: размер каталога сканируется при первой записи, а не для каждого файла"""
+    return CompilationCache(cache_dir)
+
+
+def translate_file(path: str, root: str, output_dir: str, encoding: str = "utf-8",
+                   lexer_engine: str = "buffered", cache_dir: str = None) -> TranslationResult:
+    """Транслирует один файл; ошибки трансляции возвращаются в результате, а не выбрасываются"""
+    start = time.perf_counter()
+    SYMBOLS.trim()   # процесс пула транслирует много файлов подряд
+    result = TranslationResult(path)
+    cache = process_cache(cache_dir) if cache_dir is not None else None
+    base = os.path.splitext(os.path.relpath(os.path.abspath(path), os.path.abspath(root)))[0]
+    generated_path = os.path.join(output_dir, base + GENERATED_SUFFIX)
+    optimized_path = os.path.join(output_dir, base + OPTIMIZED_SUFFIX)
+    try:
+        pipeline = CompilationPipeline(path, encoding, lexer_engine, cache)
+        generated = pipeline.generated_code()
+        optimized = pipeline.optimized_code()
+        os.makedirs(os.path.dirname(generated_path), exist_ok=True)
+        with open(generated_path, "w", encoding=encoding) as generated_file:
+            print(generated, file=generated_file)
+        with open(optimized_path, "w", encoding=encoding) as optimized_file:
+            print(optimized, file=optimized_file)
+        result.generated_path = generated_path
+        result.optimized_path = optimized_path
+    except (LexerException, ParserException, SemanticAnalyzerException) as e:
+        result.error = str(e)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+class BatchTranslator:
+    """
+        Независимо транслирует множество файлов в пуле процессов.
+        Ошибка в одном файле не прерывает пакет - она попадает в TranslationResult.error
+    """
+    def __init__(self, output_dir: str, workers: int = None, chunksize: int = 1, encoding: str = "utf-8",
+                 lexer_engine: str = "buffered", cache_dir: str = None) -> None:
+        self.output_dir = output_dir
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.chunksize = chunksize
+        self.encoding = encoding
+        self.lexer_engine = lexer_engine
+        self.cache_dir = cache_dir
+
+    def run(self, paths: list[str], root: str = ".") -> list[TranslationResult]:
+        translate = partial(translate_file, root=root, output_dir=self.output_dir, encoding=self.encoding,
+                            lexer_engine=self.lexer_engine, cache_dir=self.cache_dir)
+        if self.workers <= 1:
+            results = [translate(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(translate, paths, chunksize=self.chunksize))
+        if self.cache_dir is not None:
+            # каждый процесс прибавляет к размеру только свои записи: общий размер выравнивается в конце пакета
+            process_cache(self.cache_dir).evict()
+        return results
@@ -1,6 +1,23 @@
+import io
+from Nodes import NodeSet
+from Instrumentation import observe_stage, tree_counters
+
 class CodeGenerator:
-  def __init__(self, node, exclude_nodes=None):
+  def __init__(self, node, exclude_nodes=None, observer=None, stage="codegen"):
     self.node = node
+    self.observer = observer
+    self.stage = stage
+    if exclude_nodes is not None and not isinstance(exclude_nodes, NodeSet):
+      exclude_nodes = NodeSet(exclude_nodes)
     self.exclude_nodes = exclude_nodes
+  def write(self, file):
+    """Потоково пишет сгенерированный код в file"""
+    if self.observer is not None:
+      counters = lambda _: tree_counters(self.node) | {"excluded": len(self.exclude_nodes or ())}
+      observe_stage(self.observer, self.stage, lambda: self.node.emit(file, self.exclude_nodes), counters)
+    else:
+      self.node.emit(file, self.exclude_nodes)
   def __str__(self):
-    return f'{self.node._generate_text(self.exclude_nodes)}'
\ No newline at end of file
+    out = io.StringIO()
+    self.write(out)
+    return out.getvalue()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from Nodes import *
+from Expressions import *
+from ExpressionInterner import ExpressionInterner
+from LoopOptimizer import ExpressionReplacer
+
+SIMPLE_STATEMENTS = (NodeDeclaration, NodeAssigning, NodeCall)
+
+
+class _Occurrence:
+    __slots__ = ('statement', 'position', 'node')
+
+    def __init__(self, statement: int, position: int, node: Node) -> None:
+        self.statement = statement  # номер оператора в участке
+        self.position = position    # номер узла в прямом обходе выражения оператора
+        self.node = node
+
+
+class CommonSubexpressionEliminator(NodeTransformer):
+    """
+        Устраняет общие подвыражения в линейных участках списков операторов: арифметическое
+        выражение, которое встречается дважды и между вхождениями не меняются его переменные,
+        вычисляется один раз во временную переменную перед оператором с первым вхождением:
+        x = a * b + c; y = a * b + c; -> int cse0 = ((a * b) + c); x = cse0; y = cse0;
+        Временная вычисляется безусловно, поэтому выражения из правых операндов && и || и деления,
+        которые могут бросить исключение, не выносятся. Участок прерывают составные операторы и вызовы функций. Равенство выражений проверяется
+        через ExpressionInterner, поэтому проход работает и на дереве с общими экземплярами выражений
+    """
+    descend_into = STATEMENT_CONTAINERS
+
+    def __init__(self) -> None:
+        self.temporaries = 0
+        self.replaced = 0
+
+    def eliminate(self, tree: Node) -> Node:
+        self.types = TypeTable(tree)
+        self.temps = TempNames(tree)
+        self.interner = ExpressionInterner()
+        return self.rewrite(tree)
+
+    def transform(self, node: Node) -> Node:
+        if not isinstance(node, NodeProgram):
+            return node
+        children = []
+        segment = []
+        for statement in node.children + [None]:
+            if statement is not None and self.__simple(statement):
+                segment.append(statement)
+                continue
+            children += self.__eliminate_segment(segment) if len(segment) > 1 else segment
+            segment = []
+            if statement is not None:
+                children.append(statement)
+        if len(children) == len(node.children):
+            return node
+        return node._replace(children=children)
+
+    @staticmethod
+    def __simple(statement: Node) -> bool:
+        if not isinstance(statement, SIMPLE_STATEMENTS):
+            return False
+        return not any(isinstance(node, NodeCall) and isinstance(node.callable, NodeVar) for node in statement.walk())
+
+    @staticmethod
+    def __expression(statement: Node) -> Node | None:
+        match statement:
+            case NodeDeclaration():
+                return statement.value
+            case NodeAssigning():
+                return statement.right_side
+            case NodeCall():
+                return statement.params
+        return None
+
+    @staticmethod
+    def __target(statement: Node) -> str | None:
+        match statement:
+            case NodeDeclaration():
+                return statement.id.id.value
+            case NodeAssigning():
+                return statement.left_side.id.value
+        return None
+
+    def __groups(self, segment: list[Node]) -> list[list[_Occurrence]]:
+        """Группы вхождений одного выражения, между которыми его переменные не меняются"""
+        groups = []
+        available: dict[int, list[_Occurrence]] = {}  # id канонического выражения: текущая группа
+        readers: dict[str, list[int]] = {}              # имя: выражения, которые его читают
+        for index, statement in enumerate(segment):
+            expression = self.__expression(statement)
+            if expression is not None:
+                conditional = self.__conditional(expression)
+                for position, node in enumerate(expression.walk()):
+                    if not isinstance(node, ARITHMETIC_NODES) or id(node) in conditional:
+                        continue
+                    canonical = self.interner.canonical(node)
+                    if canonical is None or self.types.of(node) is None or may_throw(node, self.types):
+                        continue
+                    key = id(canonical)
+                    if key not in available:
+                        available[key] = []
+                        groups.append(available[key])
+                        for name in read_names(node):
+                            readers.setdefault(name, []).append(key)
+                    available[key].append(_Occurrence(index, position, node))
+            # выражения оператора вычисляются до записи в его переменную
+            for key in readers.pop(self.__target(statement), ()):
+                available.pop(key, None)
+        return [group for group in groups if len(group) > 1]
+
+    @staticmethod
+    def __conditional(expression: Node) -> set[int]:
+        """id узлов правых операндов && и ||: они вычисляются не всегда"""
+        conditional = set()
+        for node in expression.walk():
+            if isinstance(node, (NodeAnd, NodeOr)) and id(node) not in conditional:
+                conditional.update(map(id, node.right.walk()))
+        return conditional
+
+    def __eliminate_segment(self, segment: list[Node]) -> list[Node]:
+        groups = self.__groups(segment)
+        if not groups:
+            return segment
+        sizes = {id(group): sum(1 for _ in group[0].node.walk()) for group in groups}
+        # номер оператора: номер узла: (временная переменная, размер поддерева, первое ли вхождение)
+        replacements: dict[int, dict[int, tuple[str, int, bool]]] = {}
+        declarations: dict[int, list[tuple[_Occurrence, str]]] = {}
+        # сначала объемлющие выражения: вложенные вхождения в их повторах исчезают вместе с ними
+        for group in sorted(groups, key=lambda group: sizes[id(group)], reverse=True):
+            size = sizes[id(group)]
+            group = [occurrence for occurrence in group if not self.__inside_repeat(occurrence, replacements)]
+            if len(group) < 2:
+                continue
+            name = self.temps.fresh("cse")
+            self.types.declare(name, self.types.of(group[0].node))
+            self.temporaries += 1
+            self.replaced += len(group)
+            declarations.setdefault(group[0].statement, []).append((group[0], name))
+            for occurrence in group:
+                replacements.setdefault(occurrence.statement, {})[occurrence.position] = (name, size, occurrence is group[0])
+        result = []
+        for index, statement in enumerate(segment):
+            if index not in replacements:
+                result.append(statement)
+                continue
+            replaced = replacements[index]
+            # копия без общих экземпляров: узлы различаются по id, как того требует ExpressionReplacer
+            copy = clone(self.__expression(statement))
+            nodes = list(copy.walk())
+            # вложенные временные объявляются раньше объемлющих
+            for occurrence, name in reversed(declarations.get(index, [])):
+                value = nodes[occurrence.position]
+                inner = self.__outermost(replaced, nodes, occurrence.position + 1,
+                                         occurrence.position + replaced[occurrence.position][1])
+                value = ExpressionReplacer(inner).rewrite(value)
+                result.append(make_declaration(self.types.of(occurrence.node), name, value, first_token(value)))
+            expression = ExpressionReplacer(self.__outermost(replaced, nodes, 0, len(nodes))).rewrite(copy)
+            match statement:
+                case NodeDeclaration():
+                    result.append(statement._replace(value=expression))
+                case NodeAssigning():
+                    result.append(statement._replace(right_side=expression))
+                case NodeCall():
+                    result.append(statement._replace(params=expression))
+        return result
+
+    @staticmethod
+    def __inside_repeat(occurrence: _Occurrence, replacements: dict[int, dict[int, tuple[str, int, bool]]]) -> bool:
+        """Вхождение внутри заменённого повтора объемлющего выражения (не первого - оно уходит в объявление)"""
+        for position, (_, size, first) in replacements.get(occurrence.statement, {}).items():
+            if not first and position < occurrence.position < position + size:
+                return True
+        return False
+
+    @staticmethod
+    def __outermost(replaced: dict[int, tuple[str, int, bool]], nodes: list[Node], start: int, end: int) -> dict[int, Node]:
+        """Замены для узлов с номерами из [start, end), не вложенные в другие заменяемые узлы"""
+        result = {}
+        covered = start
+        for position in sorted(replaced):
+            if covered <= position < end:
+                name, size, _ = replaced[position]
+                result[id(nodes[position])] = make_var(name, first_token(nodes[position]))
+                covered = position + size
+        return result
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+import tempfile
+from Nodes import Node
+from TreeSerializer import dumps_tree, load_tree
+
+
+# модули, от которых зависят сгенерированный код и сохранённое дерево; запуск, пакетный режим, демон,
+# профилирование и сам кеш в вывод не попадают, и их правка не должна сбрасывать кеш
+OUTPUT_MODULES = (
+    "Token", "Lexer", "Nodes", "Parser", "SemanticAnalyzer", "CodeGenerator", "CompilationPipeline",
+    "Expressions", "ConstantFolder", "DeadBranchEliminator", "DataFlow", "DeadStoreEliminator",
+    "LoopOptimizer", "ExpressionInterner", "CommonSubexpressionEliminator", "OptimizeCode", "TreeSerializer",
+)
+
+
+def _sources_digest() -> str:
+    """Хеш исходников OUTPUT_MODULES: любое изменение кода, от которого зависит вывод, меняет ключи кеша"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in OUTPUT_MODULES:
+        with open(os.path.join(directory, name + ".py"), "rb") as module_file:
+            digest.update(name.encode() + b"\0" + module_file.read() + b"\0")
+    return digest.hexdigest()[:16]
+
+
+TRANSLATOR_VERSION = f"1.0+{_sources_digest()}"
+
+
+@dataclass
+class CacheEntry:
+    """None - этот вывод ещё не строился: запись дополняется, когда он появится"""
+    generated: str | None
+    optimized: str | None
+
+
+class CompilationCache:
+    """
+        Кеш результатов трансляции на диске.
+        Ключ - хеш исходника вместе с версией транслятора (она включает хеш исходников модулей,
+        поэтому записи старых сборок не используются), при превышении max_size
+        вытесняются записи, к которым дольше всего не обращались (LRU по времени изменения файла).
+        Размер каталога считается сканированием один раз, дальше к нему прибавляются записанные файлы;
+        каталог сканируется заново, только когда сумма превысила max_size, и освобождается до EVICT_TO
+        от max_size, чтобы следующие записи не вызывали сканирование каждая.
+        С store_tree рядом хранится дерево в формате TreeSerializer: его загрузка в 2-5 раз быстрее
+        повторного разбора и сравнима с pickle.loads (от 0.5 до 1.6 его времени), но чтение файла
+        из общего каталога не исполняет код, глубина вложенности не упирается в предел рекурсии
+        (pickle на ней падает), а файлы на 10-30% меньше. Испорченный файл считается промахом
+    """
+    ENTRY_SUFFIX = ".json"
+    TREE_SUFFIX = ".tree"
+    EVICT_TO = 0.9
+
+    def __init__(self, directory: str, max_size: int = 64 * 2**20, store_tree: bool = False) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.store_tree = store_tree
+        self.size: int | None = None   # оценка размера записей в каталоге; None - ещё не сканировали
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source: bytes) -> str:
+        return hashlib.sha256(TRANSLATOR_VERSION.encode() + b"\0" + source).hexdigest()
+
+    def __path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def get(self, key: str) -> CacheEntry | None:
+        path = self.__path(key, self.ENTRY_SUFFIX)
+        try:
+            with open(path, "r", encoding="utf-8") as entry_file:
+                data = json.load(entry_file)
+            entry = CacheEntry(data["generated"], data["optimized"])
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            # нечитаемая запись или JSON не той формы - промах
+            return None
+        return entry
+
+    def load_tree(self, key: str) -> Node | None:
+        path = self.__path(key, self.TREE_SUFFIX)
+        try:
+            tree = load_tree(path)
+            os.utime(path)
+        except Exception:
+            # любая ошибка разбора - промах: дерево просто строится заново
+            return None
+        return tree
+
+    def put(self, key: str, generated: str | None, optimized: str | None, tree: Node = None) -> None:
+        data = json.dumps({"generated": generated, "optimized": optimized}).encode("utf-8")
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.__entries())
+        self.__write(self.__path(key, self.ENTRY_SUFFIX), data)
+        written = len(data)
+        if self.store_tree and tree is not None:
+            data = dumps_tree(tree)
+            self.__write(self.__path(key, self.TREE_SUFFIX), data)
+            written += len(data)
+        # перезапись и чужие процессы делают сумму неточной: она уточняется при вытеснении
+        self.size += written
+        if self.size > self.max_size:
+            self.evict()
+
+    def __write(self, path: str, data: bytes) -> None:
+        """Запись через временный файл, чтобы параллельные процессы не увидели недописанную запись"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __entries(self) -> list[tuple[float, int, str]]:
+        """(время изменения, размер, путь) каждого файла записи в каталоге"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith((self.ENTRY_SUFFIX, self.TREE_SUFFIX)):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        entries = self.__entries()
+        total_size = sum(size for _, size, _ in entries)
+        if total_size > self.max_size:
+            entries.sort()
+            target = self.max_size * self.EVICT_TO
+            for _, size, path in entries:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total_size -= size
+                if total_size <= target:
+                    break
+        self.size = total_size
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import io
+from Lexer import LEXER_ENGINES
+from Parser import PARSER_ENGINES
+from SemanticAnalyzer import SemanticAnalyzer, Scope
+from CodeGenerator import CodeGenerator
+from OptimizeCode import OptimizeCode
+from CompilationCache import CompilationCache, CacheEntry
+from Nodes import Node
+from Token import Token
+from Instrumentation import StageObserver
+
+
+class CompilationPipeline:
+    """
+        Прогоняет исходный файл через стадии трансляции.
+        Каждая стадия запускается по требованию один раз, её результат кешируется.
+        С cache готовый код для неизменившегося исходника берётся с диска без запуска стадий
+    """
+    def __init__(self, path: str, encoding: str = "utf-8", lexer_engine: str = "buffered",
+                 cache: CompilationCache = None, observer: StageObserver = None,
+                 parser_engine: str = "recursive") -> None:
+        self.path = path
+        self.encoding = encoding
+        self.lexer_class = LEXER_ENGINES[lexer_engine]
+        self.parser_class = PARSER_ENGINES[parser_engine]
+        self.cache = cache
+        self.observer = observer
+        self._cache_key = None
+        self._cache_entry = None
+        self._source_bytes = None
+        self._source = None
+        self._tokens = None
+        self._tree = None
+        self._tree_stored = False
+        self._scope = None
+        self._generated_code = None
+        self._optimizer = None
+        self._optimized_code = None
+
+    def source_bytes(self) -> bytes:
+        if self._source_bytes is None:
+            with open(self.path, "rb") as in_file:
+                self._source_bytes = in_file.read()
+        return self._source_bytes
+
+    def source(self) -> str:
+        if self._source is None:
+            # как при открытии в текстовом режиме: с универсальными переводами строк
+            text_file = io.TextIOWrapper(io.BytesIO(self.source_bytes()), encoding=self.encoding)
+            self._source = text_file.read()
+        return self._source
+
+    def __cached(self) -> CacheEntry | None:
+        if self.cache is not None and self._cache_key is None:
+            self._cache_key = self.cache.key(self.source_bytes())
+            self._cache_entry = self.cache.get(self._cache_key)
+            if self._cache_entry is not None:
+                if self._cache_entry.generated is not None:
+                    self._generated_code = self._cache_entry.generated
+                if self._cache_entry.optimized is not None:
+                    self._optimized_code = self._cache_entry.optimized
+        return self._cache_entry
+
+    def __store(self) -> None:
+        """Записывает каждый вывод, как только он построен; запись дополняется следующим выводом"""
+        if self.cache is None:
+            return
+        self.__cached()
+        entry = CacheEntry(self._generated_code, self._optimized_code)
+        if entry == self._cache_entry:
+            return
+        self._cache_entry = entry
+        # дерево пишется один раз: повторная запись того же дерева лишь тратит время
+        tree = None if self._tree_stored else self._tree
+        self.cache.put(self._cache_key, entry.generated, entry.optimized, tree)
+        self._tree_stored = self._tree is not None
+
+    def tokens(self) -> list[Token]:
+        if self._tokens is None:
+            lexer = self.lexer_class(io.StringIO(self.source()), self.observer)
+            self._tokens = lexer.get_all_tokens()
+        return self._tokens
+
+    def tree(self) -> Node:
+        if self._tree is None and self.cache is not None and self.cache.store_tree and self.__cached() is not None:
+            self._tree = self.cache.load_tree(self._cache_key)
+            self._tree_stored = self._tree is not None
+        if self._tree is None:
+            parser = self.parser_class(self.tokens(), self.observer)
+            self._tree = parser.parse()
+        return self._tree
+
+    def scope(self) -> Scope:
+        if self._scope is None:
+            semantic = SemanticAnalyzer(scope_cache=True, observer=self.observer)
+            self._scope = semantic.analyze(self.tree())
+        return self._scope
+
+    def generated_code(self) -> str:
+        self.__cached()
+        if self._generated_code is None:
+            self._generated_code = str(CodeGenerator(self.tree(), observer=self.observer))
+            self.__store()
+        return self._generated_code
+
+    def write_generated_code(self, file) -> None:
+        """Пишет код в file; если текст ещё не строился, генерирует его потоково, не держа в памяти"""
+        self.__cached()
+        if self._generated_code is not None:
+            file.write(self._generated_code)
+        else:
+            CodeGenerator(self.tree(), observer=self.observer).write(file)
+
+    def optimizer(self) -> OptimizeCode:
+        if self._optimizer is None:
+            self._optimizer = OptimizeCode(self.scope(), self.tree(), observer=self.observer)
+        return self._optimizer
+
+    def optimized_code(self) -> str:
+        self.__cached()
+        if self._optimized_code is None:
+            self._optimized_code = str(self.optimizer())
+            self.__store()
+        return self._optimized_code
+
+    def write_optimized_code(self, file) -> None:
+        self.__cached()
+        if self._optimized_code is not None:
+            file.write(self._optimized_code)
+        else:
+            self.optimizer().write(file)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+import math
+from Nodes import *
+from Token import Token, TokenInfo
+from Expressions import ARITHMETIC_NODES, declared_types, int_literal
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+INT_TYPES = {"int"}
+FLOAT_TYPES = {"float", "double"}
+BOOL_TYPES = {"bool"}
+BOOLEAN_NAMES = {"true": True, "false": False}
+
+COMPARISONS = {
+    NodeL: lambda a, b: a < b,
+    NodeG: lambda a, b: a > b,
+    NodeLE: lambda a, b: a <= b,
+    NodeGE: lambda a, b: a >= b,
+    NodeEQ: lambda a, b: a == b,
+    NodeNEQ: lambda a, b: a != b,
+}
+
+
+def wrap_int(value: int) -> int:
+    """Переполнение int как в Java: по модулю 2^32 в дополнительном коде"""
+    return (value - INT_MIN) % 2**32 + INT_MIN
+
+
+def java_division(a: int, b: int) -> int:
+    """Целочисленное деление Java - с отбрасыванием дробной части"""
+    quotient = abs(a) // abs(b)
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+def boolean_constant(node: Node) -> bool | None:
+    """True/False, если узел - литерал true/false, иначе None"""
+    if isinstance(node, NodeVar):
+        return BOOLEAN_NAMES.get(node.id.value)
+    return None
+
+
+class ConstantFolder(NodeTransformer):
+    """
+        Свёртка констант и алгебраические упрощения выражений: арифметика над литералами
+        (int с переполнением как в Java, деление на ноль не сворачивается), сравнения,
+        and/or/not с true/false и тождества вида x*1, x+0.
+        Исходное дерево не меняется (см. NodeTransformer). Обход один и без рекурсии, время линейно
+    """
+    def __init__(self) -> None:
+        self.types: dict[int, str] = {}   # id узла: "int" | "double" | "bool"
+        self.impure: set[int] = set()     # id узлов, в поддереве которых есть вызов
+        self.declared: dict[str, set[str]] = {}
+        self.created: list[Node] = []     # новые узлы живут до конца свёртки, чтобы их id не переиспользовались
+        self.folded = 0
+
+    def fold(self, tree: Node) -> Node:
+        # имя считается числом, только если все его объявления числовые
+        self.declared = declared_types(tree)
+        return self.rewrite(tree)
+
+    def transform(self, node: Node) -> Node:
+        match node:
+            case NodeIntLiteral():
+                self.types[id(node)] = "int"
+            case NodeFloatLiteral():
+                self.types[id(node)] = "double"
+            case NodeVar():
+                self.types[id(node)] = self.__var_type(node.id.value)
+            case NodeCall():
+                self.impure.add(id(node))
+            case NodeUnaryMinus() | NodeNot():
+                return self.__fold_unary(node)
+            case NodeBinaryOperator():
+                return self.__fold_binary(node)
+            case _:
+                if any(id(child) in self.impure for child in node.get_children()):
+                    self.impure.add(id(node))
+        return node
+
+    def __var_type(self, name: str) -> str | None:
+        if name in BOOLEAN_NAMES:
+            return "bool"
+        types = self.declared.get(name)
+        if not types:
+            return None
+        for kind, names in (("int", INT_TYPES), ("double", FLOAT_TYPES), ("bool", BOOL_TYPES)):
+            if types <= names:
+                return kind
+        return None
+
+    def __constant(self, node: Node):
+        """Значение константы (int, float или bool) или None"""
+        match node:
+            case NodeIntLiteral():
+                value = int_literal(node.value.value)
+                return value if value is not None and INT_MIN <= value <= INT_MAX else None
+            case NodeFloatLiteral():
+                return float(node.value.value)
+            case NodeVar() if node.id.value in BOOLEAN_NAMES:
+                return BOOLEAN_NAMES[node.id.value]
+        return None
+
+    def __make_constant(self, value, like: Node) -> Node | None:
+        """Узел-литерал со значением value; позиция берётся из токена узла like"""
+        token = like.value if isinstance(like, NodeLiteral) else like.id
+        if isinstance(value, bool):
+            node = NodeVar(Token(TokenInfo.ID, "true" if value else "false", token.lineno, token.pos))
+            self.types[id(node)] = "bool"
+        elif isinstance(value, int):
+            node = NodeIntLiteral(Token(TokenInfo.INT_LITERAL, str(wrap_int(value)), token.lineno, token.pos))
+            self.types[id(node)] = "int"
+        elif math.isfinite(value):
+            node = NodeFloatLiteral(Token(TokenInfo.FLOAT_LITERAL, repr(value), token.lineno, token.pos))
+            self.types[id(node)] = "double"
+        else:
+            return None
+        self.folded += 1
+        self.created.append(node)
+        return node
+
+    def __fold_unary(self, node: NodeUnaryOperator) -> Node:
+        operand = node.operand
+        value = self.__constant(operand)
+        if isinstance(node, NodeNot):
+            self.types[id(node)] = "bool"
+            if isinstance(value, bool):
+                return self.__make_constant(not value, operand)
+            if isinstance(operand, NodeNot) and self.types.get(id(operand.operand)) == "bool":
+                self.folded += 1
+                return operand.operand
+        else:
+            operand_type = self.types.get(id(operand))
+            self.types[id(node)] = operand_type if operand_type in ("int", "double") else None
+            if value is not None and not isinstance(value, bool):
+                return self.__make_constant(-value, operand) or node
+        if id(operand) in self.impure:
+            self.impure.add(id(node))
+        return node
+
+    def __fold_binary(self, node: NodeBinaryOperator) -> Node:
+        left, right = node.left, node.right
+        left_type, right_type = self.types.get(id(left)), self.types.get(id(right))
+        left_value, right_value = self.__constant(left), self.__constant(right)
+        if id(left) in self.impure or id(right) in self.impure:
+            self.impure.add(id(node))
+        elif isinstance(node, (NodeDivision, NodeMod)) and not right_value:
+            self.impure.add(id(node))  # может бросить ArithmeticException - такое выражение нельзя отбрасывать
+
+        match node:
+            case NodeAnd() | NodeOr():
+                self.types[id(node)] = "bool"
+                return self.__fold_logical(node, left_value, right_value)
+            case _ if node.__class__ in COMPARISONS:
+                self.types[id(node)] = "bool"
+                if left_value is not None and right_value is not None and \
+                        isinstance(left_value, bool) == isinstance(right_value, bool):
+                    if isinstance(left_value, bool) and node.__class__ not in (NodeEQ, NodeNEQ):
+                        return node
+                    return self.__make_constant(COMPARISONS[node.__class__](left_value, right_value), left)
+                return node
+            case _ if isinstance(node, ARITHMETIC_NODES):
+                result_type = None
+                if left_type in ("int", "double") and right_type in ("int", "double"):
+                    result_type = "int" if left_type == right_type == "int" else "double"
+                self.types[id(node)] = result_type
+                if isinstance(left_value, bool) or isinstance(right_value, bool):
+                    return node
+                if left_value is not None and right_value is not None:
+                    value = self.__evaluate(node, left_value, right_value)
+                    return node if value is None else (self.__make_constant(value, left) or node)
+                if result_type == "int":
+                    return self.__simplify_int(node, left, right, left_value, right_value)
+        return node
+
+    @staticmethod
+    def __evaluate(node: NodeBinaryOperator, a, b):
+        both_int = isinstance(a, int) and isinstance(b, int)
+        match node:
+            case NodePlus():
+                return a + b
+            case NodeMinus():
+                return a - b
+            case NodeMultiply():
+                return a * b
+            case NodeDivision():
+                if b == 0:
+                    return None
+                return java_division(a, b) if both_int else a / b
+            case NodeMod():
+                if b == 0:
+                    return None
+                return a - b * java_division(a, b) if both_int else math.fmod(a, b)
+        return None
+
+    def __fold_logical(self, node: NodeBinaryOperator, left_value, right_value) -> Node:
+        """and/or с true/false; отбрасываемый операнд без вызовов, иначе пропали бы его побочные эффекты"""
+        absorbing = isinstance(node, NodeOr)  # значение, которое определяет результат: true для or, false для and
+        left, right = node.left, node.right
+        if isinstance(left_value, bool):
+            self.folded += 1
+            return left if left_value == absorbing else right
+        if isinstance(right_value, bool):
+            if right_value != absorbing:
+                self.folded += 1
+                return left
+            if id(left) not in self.impure:
+                self.folded += 1
+                return right
+        return node
+
+    def __simplify_int(self, node: NodeBinaryOperator, left: Node, right: Node, left_value, right_value) -> Node:
+        """Тождества для целых: x+0, x-0, x*1, x/1, x*0 и сложение констант в цепочке (x + c1) + c2"""
+        match node:
+            case NodePlus() if left_value == 0:
+                self.folded += 1
+                return right
+            case NodePlus() | NodeMinus() if right_value == 0:
+                self.folded += 1
+                return left
+            case NodeMultiply() if left_value == 1:
+                self.folded += 1
+                return right
+            case NodeMultiply() | NodeDivision() if right_value == 1:
+                self.folded += 1
+                return left
+            case NodeMultiply() if (left_value == 0 and id(right) not in self.impure) or \
+                                   (right_value == 0 and id(left) not in self.impure):
+                return self.__make_constant(0, left if left_value == 0 else right)
+        # сложение и умножение целых ассоциативны и с переполнением: (x op c1) op c2 = x op (c1 op c2)
+        if isinstance(node, (NodePlus, NodeMultiply)) and right_value is not None and left.__class__ is node.__class__:
+            inner_value = self.__constant(left.right)
+            if isinstance(inner_value, int) and not isinstance(inner_value, bool) and \
+                    self.types.get(id(left.left)) == "int":
+                constant = self.__make_constant(self.__evaluate(node, inner_value, right_value), left.right)
+                combined = node._replace(left=left.left, right=constant)
+                self.created.append(combined)
+                self.types[id(combined)] = "int"
+                if id(left.left) in self.impure:
+                    self.impure.add(id(combined))
+                return self.__simplify_int(combined, left.left, constant, None, self.__constant(constant))
+        return node
@@ -0,0 +1,348 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from Nodes import *
+from Expressions import TypeTable, may_throw
+
+FUNCTION = -1  # имя функции в таблице областей видимости - не переменная
+
+
+@dataclass(eq=False)
+class Instruction:
+    """
+        Одно действие базового блока: оператор списка, условие или часть заголовка for.
+        uses - битовое множество слотов читаемых переменных, target - слот присваиваемой переменной,
+        declares - слот объявляемой. references - номера упомянутых переменных, variable - объявляемой
+    """
+    node: Node
+    target: int | None = None
+    uses: int = 0
+    essential: bool = False   # результат нужен сам по себе: условие, вызов, заголовок for
+    calls: bool = False       # вызов функции - она может читать глобальные переменные
+    removable: bool = False   # оператор из списка блока, его можно удалить целиком
+    declares: int | None = None
+    variable: int | None = None
+    references: tuple[int, ...] = ()
+
+
+@dataclass(eq=False)
+class BasicBlock:
+    index: int
+    instructions: list[Instruction] = field(default_factory=list)
+    successors: list[BasicBlock] = field(default_factory=list)
+    predecessors: list[BasicBlock] = field(default_factory=list)
+
+    def link(self, successor: BasicBlock) -> None:
+        self.successors.append(successor)
+        successor.predecessors.append(self)
+
+
+@dataclass(eq=False)
+class ControlFlowGraph:
+    """Граф программы или одной функции; exit_live - переменные, нужные после выхода"""
+    node: Node
+    entry: BasicBlock = None
+    exit: BasicBlock = None
+    blocks: list[BasicBlock] = field(default_factory=list)
+    exit_live: int = 0
+
+    def new_block(self) -> BasicBlock:
+        block = BasicBlock(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def postorder(self) -> list[BasicBlock]:
+        """Обратный порядок обхода в глубину от входа, затем недостижимые блоки"""
+        order = []
+        visited = [False] * len(self.blocks)
+        visited[self.entry.index] = True
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if not visited[successor.index]:
+                    visited[successor.index] = True
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                order.append(block)
+                stack.pop()
+        order += (block for block in self.blocks if not visited[block.index])
+        return order
+
+
+def solve(order: list[BasicBlock], update, dependents) -> None:
+    """
+        Итерация до неподвижной точки: update(block) пересчитывает блок и возвращает True,
+        если результат изменился - тогда помечаются для пересчёта dependents(block).
+        Проходы идут по order целиком, пропуская непомеченные блоки: в порядке обхода
+        графа из структурных конструкций хватает числа проходов порядка глубины вложенности циклов
+    """
+    rank = {id(block): number for number, block in enumerate(order)}
+    edges = [[rank[id(dependent)] for dependent in dependents(block)] for block in order]
+    dirty = bytearray(b"\x01") * len(order)
+    number = 0
+    while True:
+        # следующий помеченный блок не раньше текущего, после конца прохода - снова с начала
+        number = dirty.find(1, number)
+        if number < 0:
+            number = dirty.find(1)
+            if number < 0:
+                break
+        dirty[number] = 0
+        if update(order[number]):
+            for dependent in edges[number]:
+                dirty[dependent] = 1
+        number += 1
+
+
+class ControlFlowBuilder:
+    """
+        Строит графы потока управления по дереву: один для программы и по одному на функцию.
+        Имена разрешаются по областям видимости Java (блоки, заголовок for, параметры),
+        поэтому одноимённые переменные разных блоков получают разные номера.
+        В битовых множествах переменная занимает слот - как ячейка стека: после выхода из блока
+        его слоты достаются переменным следующих блоков, и маски растут с числом видимых
+        одновременно переменных, а не всех переменных программы.
+        Внешние переменные, которые читает хоть одна функция (outer_reads), считаются
+        читаемыми любым вызовом пользовательской функции; внешние переменные функции
+        нужны после выхода из неё. Присваивание, которое может бросить исключение
+        (целочисленное деление), нужно всегда, даже если значение не используется
+    """
+    def __init__(self) -> None:
+        self.names: list[str] = []          # номер переменной: имя
+        self.slots: list[int] = []          # номер переменной: слот
+        self.free_slot = 0
+        self.outer_reads = 0
+        self.routine_start = 0              # слоты меньше - переменные внешних областей
+        self.graphs: list[ControlFlowGraph] = []
+        self.scopes: list[dict[str, int]] = []
+        self.loops: list[tuple[BasicBlock, BasicBlock]] = []  # (выход по break, переход по continue)
+        self.graph: ControlFlowGraph = None
+        self.types: TypeTable = None
+
+    def build(self, tree: Node) -> list[ControlFlowGraph]:
+        self.types = TypeTable(tree)
+        self.__routine(tree, tree.children, ())
+        return self.graphs
+
+    def declare(self, name: str) -> int:
+        index = len(self.names)
+        self.names.append(name)
+        self.slots.append(self.free_slot)
+        self.free_slot += 1
+        self.scopes[-1][name] = index
+        return index
+
+    def enter_scope(self) -> int:
+        self.scopes.append({})
+        return self.free_slot
+
+    def leave_scope(self, free_slot: int) -> None:
+        self.scopes.pop()
+        self.free_slot = free_slot
+
+    def resolve(self, name: str) -> int | None:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                index = scope[name]
+                return None if index == FUNCTION else index
+        return None
+
+    def __routine(self, node: Node, statements: list[Node], params) -> None:
+        outer_graph, outer_loops, outer_start = self.graph, self.loops, self.routine_start
+        self.routine_start = self.free_slot
+        # после выхода нужны все объявленные раньше переменные: из них функции видны только внешние
+        self.graph = graph = ControlFlowGraph(node, exit_live=(1 << self.routine_start) - 1)
+        self.graphs.append(graph)
+        self.loops = []
+        graph.entry = graph.new_block()
+        free_slot = self.enter_scope()
+        for param in params:
+            variable = self.declare(param.id.value)
+            slot = self.slots[variable]
+            graph.entry.instructions.append(Instruction(param, target=slot, declares=slot, variable=variable,
+                                                        references=(variable,)))
+        end = self.__statements(statements, graph.entry)
+        graph.exit = graph.new_block()
+        end.link(graph.exit)
+        self.leave_scope(free_slot)
+        self.graph, self.loops, self.routine_start = outer_graph, outer_loops, outer_start
+
+    def __statements(self, statements: list[Node], current: BasicBlock) -> BasicBlock:
+        """Добавляет операторы в граф начиная с блока current и возвращает блок, в котором они заканчиваются"""
+        for statement in statements:
+            current = self.__statement(statement, current)
+        return current
+
+    def __scoped(self, statements: list[Node], current: BasicBlock) -> BasicBlock:
+        free_slot = self.enter_scope()
+        current = self.__statements(statements, current)
+        self.leave_scope(free_slot)
+        return current
+
+    def __statement(self, node: Node, current: BasicBlock) -> BasicBlock:
+        graph = self.graph
+        match node:
+            case NodeIfConstruction():
+                current.instructions.append(self.__condition(node.condition))
+                then_block, else_block, join = graph.new_block(), graph.new_block(), graph.new_block()
+                current.link(then_block)
+                current.link(else_block)
+                self.__scoped(node.block.children, then_block).link(join)
+                self.__scoped(node.else_block.children, else_block).link(join)
+                return join
+            case NodeWhileConstruction():
+                head, body, exit = graph.new_block(), graph.new_block(), graph.new_block()
+                current.link(head)
+                head.instructions.append(self.__condition(node.condition))
+                head.link(body)
+                head.link(exit)
+                self.loops.append((exit, head))
+                self.__scoped(node.block.children, body).link(head)
+                self.loops.pop()
+                return exit
+            case NodeForConstruction():
+                free_slot = self.enter_scope()
+                current.instructions.append(self.__simple(node.init, removable=False))
+                head, body, step, exit = graph.new_block(), graph.new_block(), graph.new_block(), graph.new_block()
+                current.link(head)
+                head.instructions.append(self.__condition(node.condition))
+                head.link(body)
+                head.link(exit)
+                self.loops.append((exit, step))
+                self.__scoped(node.block.children, body).link(step)
+                self.loops.pop()
+                step.instructions.append(self.__simple(node.step, removable=False))
+                step.link(head)
+                self.leave_scope(free_slot)
+                return exit
+            case NodeScopeBlock():
+                return self.__scoped(node.block.children, current)
+            case NodeBreak() | NodeContinue() if self.loops:
+                exit, continue_target = self.loops[-1]
+                current.link(exit if isinstance(node, NodeBreak) else continue_target)
+                return graph.new_block()  # следующие операторы недостижимы
+            case NodeBreak() | NodeContinue():
+                return current
+            case NodeFunction():
+                self.scopes[-1][node.name.id.value] = FUNCTION
+                self.__routine(node, node.block.children, node.params.ids)
+                return current
+            case _:
+                current.instructions.append(self.__simple(node, removable=True))
+                return current
+
+    def __condition(self, node: Node) -> Instruction:
+        uses, _, calls, references = self.__expression(node)
+        return Instruction(node, uses=uses, essential=True, calls=calls, references=references)
+
+    def __simple(self, node: Node, removable: bool) -> Instruction:
+        """Объявление, присваивание или выражение-оператор; неудаляемые части заголовка for всегда нужны"""
+        match node:
+            case NodeDeclaration():
+                uses, has_call, calls, references = self.__expression(node.value) if node.value is not None \
+                    else (0, False, False, ())
+                throws = node.value is not None and may_throw(node.value, self.types)
+                variable = self.declare(node.id.id.value)
+                slot = self.slots[variable]
+                return Instruction(node, slot if node.value is not None else None, uses,
+                                   has_call or throws or not removable, calls, removable, declares=slot,
+                                   variable=variable, references=references + (variable,))
+            case NodeAssigning():
+                uses, has_call, calls, references = self.__expression(node.right_side)
+                variable = self.resolve(node.left_side.id.value)
+                # присваивание неизвестному имени не трогаем
+                essential = has_call or variable is None or not removable or may_throw(node.right_side, self.types)
+                if variable is None:
+                    return Instruction(node, None, uses, essential, calls, removable, references=references)
+                return Instruction(node, self.slots[variable], uses, essential, calls, removable,
+                                   references=references + (variable,))
+        uses, _, calls, references = self.__expression(node)
+        return Instruction(node, uses=uses, essential=True, calls=calls, references=references)
+
+    def __expression(self, node: Node) -> tuple[int, bool, bool, tuple[int, ...]]:
+        """
+            Слоты читаемых выражением переменных, есть ли в нём вызов, есть ли вызов пользовательской функции
+            и номера читаемых переменных
+        """
+        uses = 0
+        references = []
+        outer = (1 << self.routine_start) - 1
+        has_call = calls = False
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            match node:
+                case NodeVar():
+                    variable = self.resolve(node.id.value)
+                    if variable is not None:
+                        uses |= 1 << self.slots[variable]
+                        references.append(variable)
+                case NodeChainedVar():
+                    pass
+                case NodeCall():
+                    has_call = True
+                    calls = calls or isinstance(node.callable, NodeVar)
+                    stack.append(node.params)
+                case _:
+                    stack += node.get_children()
+        self.outer_reads |= uses & outer
+        return uses, has_call, calls, tuple(references)
+
+
+class Liveness:
+    """
+        Сильная живость переменных: переменная жива, если её значение понадобится условию,
+        вызову, заголовку for или присваиванию живой переменной. В отличие от обычной живости
+        присваивание a = a + 1 в цикле, результат которого никуда не уходит, живым a не делает.
+        Множества - битовые маски int, итерация по блокам до неподвижной точки.
+        call_uses - переменные, которые может прочитать вызов функции (ControlFlowBuilder.outer_reads)
+    """
+    def __init__(self, graph: ControlFlowGraph, call_uses: int) -> None:
+        self.graph = graph
+        self.call_uses = call_uses
+        self.live_in = [0] * len(graph.blocks)
+        self.live_out = [0] * len(graph.blocks)
+        self.__solve()
+
+    def transfer(self, instruction: Instruction, live: int) -> int:
+        """Живые переменные перед инструкцией по живым после неё"""
+        target = instruction.target
+        if instruction.essential or (target is not None and live >> target & 1):
+            if target is not None:
+                live &= ~(1 << target)
+            live |= instruction.uses
+            if instruction.calls:
+                live |= self.call_uses
+        if instruction.declares is not None:
+            # до объявления переменная не жива: объявление доминирует над её использованиями,
+            # и живой слот дальше принадлежит переменной другого блока
+            live &= ~(1 << instruction.declares)
+        return live
+
+    def __solve(self) -> None:
+        graph = self.graph
+        live_in, live_out = self.live_in, self.live_out
+
+        def update(block: BasicBlock) -> bool:
+            out = graph.exit_live if block is graph.exit else 0
+            for successor in block.successors:
+                out |= live_in[successor.index]
+            live_out[block.index] = out
+            for instruction in reversed(block.instructions):
+                out = self.transfer(instruction, out)
+            if out == live_in[block.index]:
+                return False
+            live_in[block.index] = out
+            return True
+
+        # обратная задача - блоки в обратном порядке обхода: сначала преемники
+        solve(graph.postorder(), update, lambda block: block.predecessors)
+
+    def instructions(self):
+        """Пары (инструкция, живые переменные после неё)"""
+        for block in self.graph.blocks:
+            live = self.live_out[block.index]
+            for instruction in reversed(block.instructions):
+                yield instruction, live
+                live = self.transfer(instruction, live)
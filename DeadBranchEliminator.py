@@ -0,0 +1,42 @@
+from __future__ import annotations
+from Nodes import *
+from ConstantFolder import boolean_constant
+
+
+class DeadBranchEliminator(NodeTransformer):
+    """
+        Удаляет ветви с условием-константой (после ConstantFolder): if (true) заменяется
+        своим блоком, if (false) - блоком else, while (false) и for (...; false; ...) удаляются.
+        Оставшийся блок сохраняет фигурные скобки (NodeScopeBlock) - объявления в нём
+        не должны попасть в объемлющую область видимости
+    """
+    descend_into = STATEMENT_CONTAINERS
+
+    def __init__(self) -> None:
+        self.eliminated = 0
+
+    def eliminate(self, tree: Node) -> Node:
+        return self.rewrite(tree)
+
+    def transform(self, node: Node) -> Node | None:
+        match node:
+            case NodeIfConstruction():
+                condition = boolean_constant(node.condition)
+                if condition is None:
+                    return node
+                self.eliminated += 1
+                block = node.block if condition else node.else_block
+                return NodeScopeBlock(block) if block.children else None
+            case NodeWhileConstruction() if boolean_constant(node.condition) is False:
+                self.eliminated += 1
+                return None
+            case NodeForConstruction() if boolean_constant(node.condition) is False:
+                # инициализация выполняется и при ложном условии: удаляется, только если в ней нет эффектов
+                self.eliminated += 1
+                init = node.init
+                if not any(isinstance(child, (NodeCall, NodeAssigning)) for child in init.walk()):
+                    return None
+                if any(isinstance(child, NodeDeclaration) for child in init.walk()):
+                    return NodeScopeBlock(NodeBlock([init]))
+                return init
+        return node
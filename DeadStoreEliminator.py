@@ -0,0 +1,54 @@
+from __future__ import annotations
+from Nodes import *
+from DataFlow import ControlFlowBuilder, Liveness
+
+
+class DeadStoreEliminator(NodeTransformer):
+    """
+        Удаляет присваивания и объявления, значение которых дальше не нужно (см. Liveness).
+        Объявление, у которого не нужен только инициализатор, остаётся без него, если
+        переменная ещё где-то упоминается: int x = 5; x = 7; ... -> int x; x = 7; ...
+        Присваивания с вызовами или делением, которое может бросить исключение, и части заголовка for не удаляются
+    """
+    descend_into = STATEMENT_CONTAINERS
+
+    def __init__(self) -> None:
+        self.dead = NodeSet()
+        self.uninitialized = NodeSet()   # объявления, от которых остаётся только int x;
+        self.removed = 0
+
+    def eliminate(self, tree: Node) -> Node:
+        builder = ControlFlowBuilder()
+        graphs = builder.build(tree)
+        surviving = set()   # переменные, упоминаемые в остающихся инструкциях
+        dead_declarations = []
+        for graph in graphs:
+            liveness = Liveness(graph, builder.outer_reads)
+            for instruction, live in liveness.instructions():
+                target = instruction.target
+                if instruction.removable and not instruction.essential and \
+                        (target is None or not live >> target & 1):
+                    if instruction.declares is not None:
+                        dead_declarations.append(instruction)
+                    else:
+                        self.dead.add(instruction.node)
+                else:
+                    surviving.update(instruction.references)
+        for instruction in dead_declarations:
+            if instruction.variable in surviving:
+                if instruction.node.value is not None:
+                    self.uninitialized.add(instruction.node)
+            else:
+                self.dead.add(instruction.node)
+        if not self.dead and not self.uninitialized:
+            return tree
+        return self.rewrite(tree)
+
+    def transform(self, node: Node) -> Node | None:
+        if node in self.dead:
+            self.removed += 1
+            return None
+        if node in self.uninitialized:
+            self.removed += 1
+            return node._replace(value=None)
+        return node
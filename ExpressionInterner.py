@@ -0,0 +1,78 @@
+from __future__ import annotations
+from Nodes import *
+
+# узлы, которые можно делить между вхождениями: выражения без вызовов
+INTERNABLE_NODES = (NodeBinaryOperator, NodeUnaryOperator, NodeVar, NodeLiteral)
+
+
+class ExpressionInterner:
+    """
+        Хеш-консинг выражений: структурно равные поддеревья из бинарных и унарных операций,
+        переменных и литералов сводятся к одному экземпляру. Ключ узла - класс, тексты токенов
+        и id канонических детей. Ключ плоский и считается один раз при первой встрече узла,
+        поэтому сравнение поддеревьев любой глубины стоит одного поиска в словаре.
+        Канонический экземпляр хранит токены первого вхождения: позиции повторов теряются
+    """
+    def __init__(self) -> None:
+        self.table: dict[tuple, Node] = {}   # ключ: канонический узел
+        self.shared = 0                      # вхождений, заменённых уже известным экземпляром
+        # id встреченного узла: (узел, его канонический экземпляр или None - не интернируется)
+        self._canonical: dict[int, tuple[Node, Node | None]] = {}
+
+    def canonical(self, node: Node) -> Node | None:
+        """Канонический экземпляр выражения; None, если в нём есть вызовы и другие неинтернируемые узлы"""
+        known = self._canonical
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if id(current) in known:
+                continue
+            if not isinstance(current, INTERNABLE_NODES):
+                known[id(current)] = (current, None)
+                continue
+            children = current.get_children()
+            if children and not expanded:
+                stack.append((current, True))
+                stack += ((child, False) for child in children)
+                continue
+            known[id(current)] = (current, self.__lookup(current))
+        return known[id(node)][1]
+
+    def __lookup(self, node: Node) -> Node | None:
+        known = self._canonical
+        key = [node.__class__]
+        changes = {}
+        for name in node._token_fields:
+            key.append(getattr(node, name).value)
+        for name in node._child_fields:
+            child = getattr(node, name)
+            if child is None:
+                key.append(None)
+                continue
+            canonical = known[id(child)][1]
+            if canonical is None:
+                return None
+            if canonical is not child:
+                changes[name] = canonical
+            key.append(id(canonical))
+        key = tuple(key)
+        canonical = self.table.get(key)
+        if canonical is None:
+            canonical = self.table[key] = node._replace(**changes) if changes else node
+            known[id(canonical)] = (canonical, canonical)
+        elif canonical is not node:
+            self.shared += 1
+        return canonical
+
+    def intern(self, tree: Node) -> Node:
+        """Дерево, в котором каждое интернируемое выражение заменено каноническим экземпляром"""
+        return _Canonicalizer(self).rewrite(tree)
+
+
+class _Canonicalizer(NodeTransformer):
+    def __init__(self, interner: ExpressionInterner) -> None:
+        self.interner = interner
+
+    def transform(self, node: Node) -> Node:
+        canonical = self.interner.canonical(node)
+        return node if canonical is None else canonical
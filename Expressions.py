@@ -0,0 +1,166 @@
+from __future__ import annotations
+from Nodes import *
+from Token import Token, TokenInfo
+
+NUMERIC_TYPES = ("int", "float", "double")  # в порядке расширения при смешанной арифметике Java
+ARITHMETIC_NODES = (NodePlus, NodeMinus, NodeMultiply, NodeDivision, NodeMod)
+
+
+def int_literal(text: str) -> int | None:
+    """Значение целого литерала по правилам C и Java: с ведущим нулём - восьмеричное; None для 08 и 09"""
+    if len(text) > 1 and text[0] == "0":
+        return int(text, 8) if "8" not in text and "9" not in text else None
+    return int(text)
+
+
+def has_call(node: Node) -> bool:
+    return any(isinstance(child, NodeCall) for child in node.walk())
+
+
+def may_throw(node: Node, types: TypeTable) -> bool:
+    """Есть целочисленное деление или остаток не на ненулевой литерал: при нулевом делителе - ArithmeticException"""
+    for child in node.walk():
+        if isinstance(child, (NodeDivision, NodeMod)) and types.of(child) not in ("float", "double") and \
+                not (isinstance(child.right, NodeIntLiteral) and int_literal(child.right.value.value)):
+            return True
+    return False
+
+
+def read_names(node: Node) -> set[str]:
+    """Имена переменных, которые читает выражение (без имён вызываемых функций и Console.Write)"""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        match node:
+            case NodeVar():
+                names.add(node.id.value)
+            case NodeChainedVar():
+                pass
+            case NodeCall():
+                stack.append(node.params)
+            case _:
+                stack += node.get_children()
+    return names
+
+
+def written_names(node: Node) -> set[str]:
+    """Имена, которые поддерево объявляет или которым присваивает"""
+    names = set()
+    for child in node.walk():
+        match child:
+            case NodeAssigning():
+                names.add(child.left_side.id.value)
+            case NodeDeclaration():
+                names.add(child.id.id.value)
+    return names
+
+
+def first_token(node: Node) -> Token | None:
+    """Самый левый токен поддерева - позиция для узлов, которые строит оптимизатор"""
+    for child in node.walk():
+        for name in child._token_fields:
+            return getattr(child, name)
+    return None
+
+
+def clone(node: Node) -> Node:
+    """
+        Копия поддерева: узел, вставляемый в дерево второй раз, не должен быть общим.
+        Общий экземпляр (например, после ExpressionInterner) копируется отдельно для каждого вхождения
+    """
+    copies = []
+    stack = [(node, False)]
+    while stack:
+        node, built = stack.pop()
+        if not built:
+            stack.append((node, True))
+            stack += ((child, False) for child in reversed(node.get_children()))
+            continue
+        changes = {}
+        first = start = len(copies) - len(node.get_children())
+        for name in node._child_fields:
+            attr = getattr(node, name)
+            if attr.__class__ is list:
+                changes[name] = copies[start:start + len(attr)]
+                start += len(attr)
+            elif attr is not None:
+                changes[name] = copies[start]
+                start += 1
+        del copies[first:]
+        copies.append(node._replace(**changes))
+    return copies[0]
+
+
+def make_var(name: str, like: Token) -> NodeVar:
+    return NodeVar(Token(TokenInfo.ID, name, like.lineno, like.pos))
+
+
+def make_int(value: int, like: Token) -> NodeIntLiteral:
+    return NodeIntLiteral(Token(TokenInfo.INT_LITERAL, str(value), like.lineno, like.pos))
+
+
+def make_declaration(type: str, name: str, value: Node, like: Token) -> NodeDeclaration:
+    return NodeDeclaration(NodeAtomType(Token(TokenInfo.ID, type, like.lineno, like.pos)), make_var(name, like), value)
+
+
+def declared_types(tree: Node) -> dict[str, set[str | None]]:
+    """Типы всех объявлений и параметров каждого имени в дереве; None - составной тип (массив)"""
+    declared: dict[str, set[str | None]] = {}
+    declare = lambda name, type: declared.setdefault(name, set()).add(
+        type.id.value if isinstance(type, NodeAtomType) else None)
+    for node in tree.walk():
+        match node:
+            case NodeDeclaration():
+                declare(node.id.id.value, node.type)
+            case NodeFormalParams():
+                for id, type in zip(node.ids, node.types):
+                    declare(id.id.value, type)
+    return declared
+
+
+class TypeTable:
+    """
+        Числовые типы выражений по правилам Java: int, float или double (литерал с точкой - double).
+        Тип имени известен, только если все его объявления в дереве одного типа
+    """
+    def __init__(self, tree: Node) -> None:
+        declared = declared_types(tree)
+        self.names = {name: types.pop() for name, types in declared.items()
+                      if len(types) == 1 and next(iter(types)) in NUMERIC_TYPES}
+
+    def declare(self, name: str, type: str) -> None:
+        self.names[name] = type
+
+    def of(self, node: Node) -> str | None:
+        match node:
+            case NodeIntLiteral():
+                return "int"
+            case NodeFloatLiteral():
+                return "double"
+            case NodeVar():
+                return self.names.get(node.id.value)
+            case NodeUnaryMinus():
+                return self.of(node.operand)
+            case _ if isinstance(node, ARITHMETIC_NODES):
+                left, right = self.of(node.left), self.of(node.right)
+                if left is None or right is None:
+                    return None
+                return max(left, right, key=NUMERIC_TYPES.index)
+        return None
+
+
+class TempNames:
+    """Имена временных переменных, не совпадающие ни с одним именем программы"""
+    def __init__(self, tree: Node) -> None:
+        self.used = {node.id.value for node in tree.walk() if isinstance(node, NodeVar)}
+        self.counters: dict[str, int] = {}
+
+    def fresh(self, prefix: str) -> str:
+        number = self.counters.get(prefix, 0)
+        while f"{prefix}{number}" in self.used:
+            number += 1
+        self.counters[prefix] = number + 1
+        name = f"{prefix}{number}"
+        self.used.add(name)
+        return name
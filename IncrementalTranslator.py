@@ -0,0 +1,243 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import io
+from itertools import chain
+from Lexer import LEXER_ENGINES, BufferedLexer
+from Parser import Parser
+from SemanticAnalyzer import SemanticAnalyzer, Scope
+from CodeGenerator import CodeGenerator
+from OptimizeCode import OptimizeCode
+from Nodes import Node, NodeProgram
+from Token import Token, TokenInfo
+
+OPENING_TOKENS = {TokenInfo.LBR, TokenInfo.LCBR, TokenInfo.LSBR}
+CLOSING_TOKENS = {TokenInfo.RBR, TokenInfo.RCBR, TokenInfo.RSBR}
+
+
+@dataclass
+class TopLevelItem:
+    key: tuple          # (вид, значение) всех токенов элемента - по нему ищется неизменившийся элемент
+    tokens: list[Token]
+    node: Node
+    text: str = None    # сгенерированный код элемента без завершающей ';'
+    start: int = None   # смещения первого и конца последнего токена в исходнике (только для BufferedLexer)
+    end: int = None
+
+
+def split_top_level(tokens: list[Token]) -> list[list[Token]]:
+    """
+        Делит поток токенов на верхнеуровневые операторы так же, как их разбирает Parser.parse:
+        оператор заканчивается ';' вне скобок или '}', закрывающей конструкцию (если за ней нет else)
+    """
+    items = []
+    start = 0
+    depth = 0
+    for i, token in enumerate(tokens):
+        kind = token.token
+        if kind == TokenInfo.EOF:
+            break
+        if kind in OPENING_TOKENS:
+            depth += 1
+        elif kind in CLOSING_TOKENS:
+            depth -= 1
+            if depth <= 0 and kind == TokenInfo.RCBR and tokens[i + 1].token != TokenInfo.ELSE:
+                items.append(tokens[start:i + 1])
+                start = i + 1
+                depth = 0
+        elif kind == TokenInfo.SEMI and depth == 0:
+            items.append(tokens[start:i + 1])
+            start = i + 1
+    if start < len(tokens) - 1:
+        items.append(tokens[start:len(tokens) - 1])
+    return items
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    low, high = 0, min(len(a), len(b), limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class IncrementalTranslator:
+    """
+        Хранит результат предыдущей трансляции. При новой версии исходника перепарсивает
+        и перегенерирует только те верхнеуровневые операторы, токены которых изменились;
+        код неизменившихся операторов вставляется из прошлого прогона.
+        С BufferedLexer заново разбирается только текст от первого до последнего изменённого оператора
+    """
+    def __init__(self, lexer_engine: str = "buffered") -> None:
+        self.lexer_class = LEXER_ENGINES[lexer_engine]
+        self.source: str = None
+        self.translated_source: str = None  # исходник, которому соответствуют tree, scope и код
+        self.items: list[TopLevelItem] = []
+        self.eof: Token = None
+        self.tree: NodeProgram = None
+        self.scope: Scope = None
+        self.generated_code: str = None
+        self.optimized_code: str = None
+        self.reused = 0
+        self.reparsed = 0
+
+    def update_file(self, path: str, encoding: str = "utf-8") -> IncrementalTranslator:
+        with open(path, "r", encoding=encoding) as in_file:
+            return self.update(in_file.read())
+
+    def update(self, source: str) -> IncrementalTranslator:
+        if source == self.translated_source:
+            self.reused, self.reparsed = len(self.items), 0
+            return self
+
+        if issubclass(self.lexer_class, BufferedLexer):
+            kept, spans, synced, eof = self.__relex_changed(source)
+        else:
+            tokens = self.lexer_class(io.StringIO(source)).get_all_tokens()
+            kept, spans, synced, eof = 0, [(span, None, None) for span in split_top_level(tokens)], None, tokens[-1]
+        head = self.items[:kept]
+        tail = self.items[synced:] if synced is not None else []
+
+        previous = {}
+        for item in self.items[kept:synced]:
+            previous.setdefault(item.key, []).append(item)
+        middle = []
+        moved = []
+        for span, start, end in spans:
+            key = tuple((token.token, token.value) for token in span)
+            candidates = previous.get(key)
+            if candidates:
+                item = candidates.pop(0)
+                moved.append((item, span, start, end))
+            else:
+                item = TopLevelItem(key, span, self.__parse_item(span, eof, source), start=start, end=end)
+            middle.append(item)
+
+        # разбор прошёл - теперь можно менять позиции токенов в старых узлах
+        for item, span, start, end in moved:
+            item.start, item.end = start, end
+            for old_token, new_token in zip(item.tokens, span):
+                old_token.lineno = new_token.lineno
+                old_token.pos = new_token.pos
+        if tail:
+            self.__shift_tail(tail, source)
+        self.items = head + middle + tail
+        self.source = source
+        self.eof = eof
+        self.reused = len(head) + len(moved) + len(tail)
+        self.reparsed = len(middle) - len(moved)
+        if not self.items:
+            Parser([eof]).parse()  # пустой файл - та же ошибка, что и при полном разборе
+
+        tree = NodeProgram([item.node for item in self.items])
+        scope = SemanticAnalyzer(scope_cache=True).analyze(tree)
+        for item in self.items:
+            if item.text is None:
+                item.text = str(CodeGenerator(item.node))
+        self.tree = tree
+        self.scope = scope
+        self.generated_code = "\n".join(item.text + ";" for item in self.items)
+        self.optimized_code = str(OptimizeCode(scope, tree))
+        self.translated_source = source
+        return self
+
+    def __relex_changed(self, source: str) -> tuple[int, list, int | None, Token]:
+        """
+            Разбирает на токены только изменённую часть source.
+            Возвращает число неизменных операторов в начале, новые операторы в виде (токены, начало, конец),
+            индекс прежнего оператора, с которого продолжается неизменный хвост (или None), и токен EOF
+        """
+        old_items = self.items
+        old_source = self.source or ""
+        prefix = common_prefix_length(old_source, source)
+        suffix = common_suffix_length(old_source, source, min(len(old_source), len(source)) - prefix)
+        delta = len(source) - len(old_source)
+
+        # оператор неизменен, если следующий за ним токен (от него зависит граница при else) тоже целиком до правки
+        kept = 0
+        while kept + 1 < len(old_items):
+            following = old_items[kept + 1]
+            if following.start + len(following.tokens[0].value) >= prefix:
+                break
+            kept += 1
+        suffix_start = len(old_source) - suffix
+        starts = {item.start: index for index, item in enumerate(old_items[kept:], kept) if item.start >= suffix_start}
+
+        lexer = BufferedLexer(io.StringIO(source))
+        lexer.seek(old_items[kept - 1].end if kept else 0)
+        spans = []
+        span = []
+        span_start = None
+        depth = 0
+        token = lexer.getnexttoken()
+        end = lexer.index
+        while token.token != TokenInfo.EOF:
+            if not span:
+                span_start = end - len(token.value)
+                # с начала прежнего оператора в неизменном хвосте разбор дал бы те же токены
+                synced = starts.get(span_start - delta)
+                if synced is not None:
+                    return kept, spans, synced, self.eof
+            span.append(token)
+            kind = token.token
+            next_token = lexer.getnexttoken()
+            next_end = lexer.index
+            closed = False
+            if kind in OPENING_TOKENS:
+                depth += 1
+            elif kind in CLOSING_TOKENS:
+                depth -= 1
+                closed = depth <= 0 and kind == TokenInfo.RCBR and next_token.token != TokenInfo.ELSE
+            elif kind == TokenInfo.SEMI:
+                closed = depth == 0
+            if closed:
+                spans.append((span, span_start, end))
+                span = []
+                depth = 0
+            token, end = next_token, next_end
+        if span:
+            spans.append((span, span_start, end))
+        return kept, spans, None, token
+
+    def __shift_tail(self, tail: list[TopLevelItem], source: str) -> None:
+        """Переносит смещения и позиции токенов неизменного хвоста на их место в новом исходнике"""
+        old_start = tail[0].start
+        delta = len(source) - len(self.source)
+        new_start = old_start + delta
+        line = self.source.count("\n", 0, old_start) + 1
+        line_delta = source.count("\n", 0, new_start) + 1 - line
+        pos_delta = (new_start - source.rfind("\n", 0, new_start)) - (old_start - self.source.rfind("\n", 0, old_start))
+        for item in tail:
+            item.start += delta
+            item.end += delta
+        if not line_delta and not pos_delta:
+            return
+        for token in chain((token for item in tail for token in item.tokens), [self.eof]):
+            if token.lineno == line:
+                token.pos += pos_delta
+            elif not line_delta:
+                # дальше строки не сдвигаются, а следующие строки не затронуты правкой
+                return
+            token.lineno += line_delta
+
+    @staticmethod
+    def __parse_item(span: list[Token], eof: Token, source: str) -> Node:
+        statements = Parser(span + [eof]).parse().children
+        if len(statements) != 1:
+            # граница оператора определена неверно - полный разбор даст ту же ошибку, что и обычная трансляция
+            Parser(BufferedLexer(io.StringIO(source))).parse()
+            raise RuntimeError("top-level statement split does not match the parser")
+        return statements[0]
@@ -0,0 +1,119 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable
+import cProfile
+import io
+import pstats
+import sys
+import time
+
+
+class StageObserver:
+    """
+        Наблюдатель стадий трансляции. Передаётся параметром observer в Lexer, Parser,
+        SemanticAnalyzer, CodeGenerator и OptimizeCode; без наблюдателя стадии ничего не замеряют.
+        counters - функция, вычисляющая счётчики стадии; вызывать её стоит уже после замера времени
+    """
+    def stage_started(self, stage: str) -> None:
+        pass
+
+    def stage_finished(self, stage: str, counters: Callable[[], dict]) -> None:
+        pass
+
+
+def observe_stage(observer: StageObserver, stage: str, function: Callable, counters: Callable = None):
+    """Выполняет function как стадию stage; counters(result) возвращает счётчики стадии"""
+    observer.stage_started(stage)
+    try:
+        result = function()
+    except BaseException as e:
+        observer.stage_finished(stage, lambda: {"error": type(e).__name__})
+        raise
+    observer.stage_finished(stage, (lambda: counters(result)) if counters is not None else dict)
+    return result
+
+
+def tree_counters(tree) -> dict:
+    """Число узлов и глубина дерева - по ней рекурсивно спускаются Parser и SemanticAnalyzer"""
+    nodes = 0
+    max_depth = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, depth = stack.pop()
+        nodes += 1
+        max_depth = max(max_depth, depth)
+        stack.extend((child, depth + 1) for child in node.get_children() if child is not None)
+    return {"nodes": nodes, "max_depth": max_depth}
+
+
+def scope_counters(scope) -> dict:
+    scopes = 0
+    variables = 0
+    stack = [scope]
+    while stack:
+        scope = stack.pop()
+        scopes += 1
+        variables += len(scope.variable_table)
+        stack.extend(scope.children)
+    return {"scopes": scopes, "variables": variables}
+
+
+@dataclass
+class StageProfile:
+    stage: str
+    started: float
+    finished: float = None
+    counters: dict = field(default_factory=dict)
+    stats: pstats.Stats = None
+
+    @property
+    def seconds(self) -> float:
+        return self.finished - self.started
+
+
+class ProfileObserver(StageObserver):
+    """
+        Собирает StageProfile каждой стадии: время начала и конца, счётчики и изменение
+        числа выделенных блоков памяти. С cprofile=True стадия ещё и профилируется cProfile
+        (вложенная стадия, например ленивый лексер внутри парсера, профилируется вместе с внешней)
+    """
+    def __init__(self, cprofile: bool = False) -> None:
+        self.cprofile = cprofile
+        self.stages: list[StageProfile] = []
+        self.running: dict[str, tuple[StageProfile, int, cProfile.Profile | None]] = {}
+        self.profiling = False
+
+    def stage_started(self, stage: str) -> None:
+        profiler = None
+        if self.cprofile and not self.profiling:
+            profiler = cProfile.Profile()
+            self.profiling = True
+        profile = StageProfile(stage, time.perf_counter())
+        self.stages.append(profile)
+        self.running[stage] = (profile, sys.getallocatedblocks(), profiler)
+        if profiler is not None:
+            profiler.enable()
+
+    def stage_finished(self, stage: str, counters: Callable[[], dict]) -> None:
+        profile, blocks, profiler = self.running.pop(stage)
+        if profiler is not None:
+            profiler.disable()
+            self.profiling = False
+        profile.finished = time.perf_counter()
+        profile.counters["allocated_blocks"] = sys.getallocatedblocks() - blocks
+        profile.counters.update(counters())
+        if profiler is not None:
+            profile.stats = pstats.Stats(profiler, stream=io.StringIO())
+
+    def summary(self, file=sys.stdout, top: int = 10) -> None:
+        for profile in self.stages:
+            counters = " ".join(f"{name}={value}" for name, value in profile.counters.items())
+            print(f"{profile.stage:<20} {profile.seconds * 1000:>10.3f} ms  {counters}", file=file)
+        if self.stages:
+            wall = max(profile.finished for profile in self.stages) - self.stages[0].started
+            print(f"{'total':<20} {wall * 1000:>10.3f} ms", file=file)
+        for profile in self.stages:
+            if profile.stats is not None:
+                print(f"\n--- {profile.stage} ---", file=file)
+                profile.stats.stream = file
+                profile.stats.sort_stats("cumulative").print_stats(top)
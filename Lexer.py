@@ -1,10 +1,13 @@
 from Token import *
 from Exceptions import LexerException
+from TokenExport import write_tokens
+import re
 import sys
 
 class Lexer:
-  def __init__(self, file):
+  def __init__(self, file, observer=None):
       self.file = file
+      self.observer = observer
       self.lineno = 1
       self.pos  = 1
       self.state = None
@@ -18,211 +21,369 @@ class Lexer:
         self.pos = 1
 
   def getnexttoken(self):
-    match self.state:
+    while True:
+      match self.state:
 
-      case TokenInfo.G:
-        self.__getnextchar()
-        if self.char == '=':
-          self.state = None
+        case TokenInfo.G:
           self.__getnextchar()
-          return Token(TokenInfo.GE, ">=", self.lineno, self.pos)
-        else:
-          self.state = None
-          return Token(TokenInfo.G, ">", self.lineno, self.pos)
+          if self.char == '=':
+            self.state = None
+            self.__getnextchar()
+            return Token(TokenInfo.GE, ">=", self.lineno, self.pos)
+          else:
+            self.state = None
+            return Token(TokenInfo.G, ">", self.lineno, self.pos)
 
-      case TokenInfo.ASSIGN:
-        self.__getnextchar()
-        if self.char == '=':
-          self.state = None
+        case TokenInfo.ASSIGN:
           self.__getnextchar()
-          return Token(TokenInfo.EQ, "==", self.lineno, self.pos)
-        else:
-          self.state = None
-          return Token(TokenInfo.ASSIGN, "=", self.lineno, self.pos)
+          if self.char == '=':
+            self.state = None
+            self.__getnextchar()
+            return Token(TokenInfo.EQ, "==", self.lineno, self.pos)
+          else:
+            self.state = None
+            return Token(TokenInfo.ASSIGN, "=", self.lineno, self.pos)
 
-      case TokenInfo.L:
-        self.__getnextchar()
-        if self.char == '=':
-          self.state = None
+        case TokenInfo.L:
           self.__getnextchar()
-          return Token(TokenInfo.LE, "<=", self.lineno, self.pos)
-        else:
-          self.state = None
-          return Token(TokenInfo.L, "<", self.lineno, self.pos)
+          if self.char == '=':
+            self.state = None
+            self.__getnextchar()
+            return Token(TokenInfo.LE, "<=", self.lineno, self.pos)
+          else:
+            self.state = None
+            return Token(TokenInfo.L, "<", self.lineno, self.pos)
 
-      case TokenInfo.INT_LITERAL:
-        int_literal = ""
-        while self.char.isdigit():
-          int_literal += self.char
-          self.__getnextchar()
-        if self.char == '.':
-          self.state = TokenInfo.FLOAT_LITERAL
-          float_literal = int_literal + '.'
-          self.__getnextchar()
+        case TokenInfo.INT_LITERAL:
+          int_literal = ""
           while self.char.isdigit():
-            float_literal += self.char
+            int_literal += self.char
             self.__getnextchar()
-        if self.char.isalpha() or self.char == '_':
-          raise LexerException(f"Wrong identifier in {self.lineno} line, {self.pos} pos")
-        if self.state == TokenInfo.INT_LITERAL:
-          self.state = None
-          return Token(TokenInfo.INT_LITERAL, int_literal, self.lineno, self.pos-1)
-        if self.state == TokenInfo.FLOAT_LITERAL:
-          self.state = None
-          return Token(TokenInfo.FLOAT_LITERAL, float_literal, self.lineno, self.pos-1)
+          if self.char == '.':
+            self.state = TokenInfo.FLOAT_LITERAL
+            float_literal = int_literal + '.'
+            self.__getnextchar()
+            while self.char.isdigit():
+              float_literal += self.char
+              self.__getnextchar()
+          if self.char.isalpha() or self.char == '_':
+            raise LexerException(f"Wrong identifier in {self.lineno} line, {self.pos} pos")
+          if self.state == TokenInfo.INT_LITERAL:
+            self.state = None
+            return Token(TokenInfo.INT_LITERAL, int_literal, self.lineno, self.pos-1)
+          if self.state == TokenInfo.FLOAT_LITERAL:
+            self.state = None
+            return Token(TokenInfo.FLOAT_LITERAL, float_literal, self.lineno, self.pos-1)
 
-      case TokenInfo.ID:
-        id = self.char
-        self.__getnextchar()
-        while self.char.isalpha() or self.char.isdigit() or self.char == '_':
-          id += self.char
+        case TokenInfo.ID:
+          id = self.char
           self.__getnextchar()
-        self.state = None
-        if id in TokenInfo.keywords():
-          return Token(TokenInfo.keywords()[id], id, self.lineno, self.pos-1)
-        else:
-          return Token(TokenInfo.ID, id, self.lineno, self.pos-1)
-
-      case TokenInfo.PLUS:
-        self.__getnextchar()
-        self.state = None
-        if self.char == "=":
-          self.__getnextchar()
-          return Token(TokenInfo.PLUS_ASSIGN, "+=", self.lineno, self.pos)
-        else:
-          return Token(TokenInfo.PLUS, "+", self.lineno, self.pos)
-
-      case TokenInfo.MINUS:
-        self.__getnextchar()
-        self.state = None
-        if self.char == "=":
+          while self.char.isalpha() or self.char.isdigit() or self.char == '_':
+            id += self.char
+            self.__getnextchar()
+          self.state = None
+          if id in KEYWORDS:
+            return Token(KEYWORDS[id], id, self.lineno, self.pos-1)
+          else:
+            symbol = SYMBOLS.intern(id)
+            return Token(TokenInfo.ID, SYMBOLS.names[symbol], self.lineno, self.pos-1, symbol)
+
+        case TokenInfo.PLUS:
           self.__getnextchar()
-          return Token(TokenInfo.MINUS_ASSIGN, "-=", self.lineno, self.pos)
-        else:
-          return Token(TokenInfo.MINUS, "-", self.lineno, self.pos)
-
-      case TokenInfo.ASTERISK:
-        self.__getnextchar()
-        self.state = None
-        if self.char == "=":
+          self.state = None
+          if self.char == "=":
+            self.__getnextchar()
+            return Token(TokenInfo.PLUS_ASSIGN, "+=", self.lineno, self.pos)
+          else:
+            return Token(TokenInfo.PLUS, "+", self.lineno, self.pos)
+
+        case TokenInfo.MINUS:
           self.__getnextchar()
-          return Token(TokenInfo.ASTERISK_ASSIGN, "*=", self.lineno, self.pos)
-        else:
-          return Token(TokenInfo.ASTERISK, "*", self.lineno, self.pos)
-
-      case TokenInfo.SLASH:
-        self.__getnextchar()
-        self.state = None
-        if self.char == "=":
+          self.state = None
+          if self.char == "=":
+            self.__getnextchar()
+            return Token(TokenInfo.MINUS_ASSIGN, "-=", self.lineno, self.pos)
+          else:
+            return Token(TokenInfo.MINUS, "-", self.lineno, self.pos)
+
+        case TokenInfo.ASTERISK:
           self.__getnextchar()
-          return Token(TokenInfo.SLASH_ASSIGN, "/=", self.lineno, self.pos)
-        elif self.char == "/":
           self.state = None
-          while self.char != "\n":
+          if self.char == "=":
             self.__getnextchar()
+            return Token(TokenInfo.ASTERISK_ASSIGN, "*=", self.lineno, self.pos)
+          else:
+            return Token(TokenInfo.ASTERISK, "*", self.lineno, self.pos)
+
+        case TokenInfo.SLASH:
           self.__getnextchar()
-          return self.getnexttoken()
-        elif self.char == "*":
           self.state = None
-          comment_ended = False
-          while not comment_ended and self.char != "":
+          if self.char == "=":
             self.__getnextchar()
-            if self.char == "*":
+            return Token(TokenInfo.SLASH_ASSIGN, "/=", self.lineno, self.pos)
+          elif self.char == "/":
+            self.state = None
+            while self.char not in ("\n", ""):
               self.__getnextchar()
-              if self.char == "/":
-                comment_ended = True
-          self.__getnextchar()
-          return self.getnexttoken()
+            self.__getnextchar()
+            continue
+          elif self.char == "*":
+            self.state = None
+            comment_ended = False
+            while not comment_ended and self.char != "":
+              self.__getnextchar()
+              if self.char == "*":
+                self.__getnextchar()
+                if self.char == "/":
+                  comment_ended = True
+            self.__getnextchar()
+            continue
           
-        else:
-          return Token(TokenInfo.SLASH, "/", self.lineno, self.pos)
+          else:
+            return Token(TokenInfo.SLASH, "/", self.lineno, self.pos)
 
-      case TokenInfo.PERCENT:
-        self.__getnextchar()
-        self.state = None
-        if self.char == "=":
+        case TokenInfo.PERCENT:
           self.__getnextchar()
-          return Token(TokenInfo.PERCENT_ASSIGN, "%=", self.lineno, self.pos)
-        else:
-          return Token(TokenInfo.PERCENT, "%", self.lineno, self.pos)
+          self.state = None
+          if self.char == "=":
+            self.__getnextchar()
+            return Token(TokenInfo.PERCENT_ASSIGN, "%=", self.lineno, self.pos)
+          else:
+            return Token(TokenInfo.PERCENT, "%", self.lineno, self.pos)
 
-      case None:
-        if self.char is None:
-          self.__getnextchar()
-          return self.getnexttoken()
-        elif self.char in ["\n", " ", "\t"]:
-          self.__getnextchar()
-          return self.getnexttoken()
-        elif self.char == '':
-          return Token(TokenInfo.EOF, "", self.lineno, self.pos)
-        elif self.char == '+':
-          self.state = TokenInfo.PLUS
-          return self.getnexttoken()
-        elif self.char == '-':
-          self.state = TokenInfo.MINUS
-          return self.getnexttoken()
-        elif self.char == '*':
-          self.state = TokenInfo.ASTERISK
-          return self.getnexttoken()
-        elif self.char == '%':
-          self.__getnextchar()
-          return self.getnexttoken()
-        elif self.char == '(':
-          self.__getnextchar()
-          return Token(TokenInfo.LBR, "(", self.lineno, self.pos)
-        elif self.char == ')':
-          self.__getnextchar()
-          return Token(TokenInfo.RBR, ")", self.lineno, self.pos)
-        elif self.char == '{':
-          self.__getnextchar()
-          return Token(TokenInfo.LCBR, "{", self.lineno, self.pos)
-        elif self.char == '}':
-          self.__getnextchar()
-          return Token(TokenInfo.RCBR, "}", self.lineno, self.pos)
-        elif self.char == '[':
-          self.__getnextchar()
-          return Token(TokenInfo.LSBR, "[", self.lineno, self.pos)
-        elif self.char == ']':
-          self.__getnextchar()
-          return Token(TokenInfo.RSBR, "]", self.lineno, self.pos)
-        elif self.char == ';':
-          self.__getnextchar()
-          return Token(TokenInfo.SEMI, ";", self.lineno, self.pos)
-        elif self.char == ',':
-          self.__getnextchar()
-          return Token(TokenInfo.COMMA, ",", self.lineno, self.pos)
-        elif self.char == '.':
-          self.__getnextchar()
-          return Token(TokenInfo.DOT, ".", self.lineno, self.pos)
-        elif self.char == '!':
-          self.__getnextchar()
-          if self.char == '=':
+        case None:
+          if self.char is None:
+            self.__getnextchar()
+            continue
+          elif self.char in ["\n", " ", "\t"]:
+            while self.char in ["\n", " ", "\t"]:
+              self.__getnextchar()
+            continue
+          elif self.char == '':
+            return Token(TokenInfo.EOF, "", self.lineno, self.pos)
+          elif self.char == '+':
+            self.state = TokenInfo.PLUS
+            continue
+          elif self.char == '-':
+            self.state = TokenInfo.MINUS
+            continue
+          elif self.char == '*':
+            self.state = TokenInfo.ASTERISK
+            continue
+          elif self.char == '%':
+            self.__getnextchar()
+            continue
+          elif self.char == '(':
+            self.__getnextchar()
+            return Token(TokenInfo.LBR, "(", self.lineno, self.pos)
+          elif self.char == ')':
+            self.__getnextchar()
+            return Token(TokenInfo.RBR, ")", self.lineno, self.pos)
+          elif self.char == '{':
+            self.__getnextchar()
+            return Token(TokenInfo.LCBR, "{", self.lineno, self.pos)
+          elif self.char == '}':
+            self.__getnextchar()
+            return Token(TokenInfo.RCBR, "}", self.lineno, self.pos)
+          elif self.char == '[':
+            self.__getnextchar()
+            return Token(TokenInfo.LSBR, "[", self.lineno, self.pos)
+          elif self.char == ']':
+            self.__getnextchar()
+            return Token(TokenInfo.RSBR, "]", self.lineno, self.pos)
+          elif self.char == ';':
+            self.__getnextchar()
+            return Token(TokenInfo.SEMI, ";", self.lineno, self.pos)
+          elif self.char == ',':
             self.__getnextchar()
-            return Token(TokenInfo.NEQ, "!=", self.lineno, self.pos)
+            return Token(TokenInfo.COMMA, ",", self.lineno, self.pos)
+          elif self.char == '.':
+            self.__getnextchar()
+            return Token(TokenInfo.DOT, ".", self.lineno, self.pos)
+          elif self.char == '!':
+            self.__getnextchar()
+            if self.char == '=':
+              self.__getnextchar()
+              return Token(TokenInfo.NEQ, "!=", self.lineno, self.pos)
+            else:
+              raise LexerException(f"Expected '=' in {self.lineno} line, {self.pos} pos")
+          elif self.char == '/':
+            self.state = TokenInfo.SLASH
+            continue
+          elif self.char == '=':
+            self.state = TokenInfo.ASSIGN
+            continue
+          elif self.char == '<':
+            self.state = TokenInfo.L
+            continue
+          elif self.char == '>':
+            self.state = TokenInfo.G
+            continue
+          elif self.char.isalpha() or self.char == '_':
+            self.state = TokenInfo.ID
+            continue
+          elif self.char.isdigit():
+            self.state = TokenInfo.INT_LITERAL
+            continue
           else:
-            raise LexerException(f"Expected '=' in {self.lineno} line, {self.pos} pos")
-        elif self.char == '/':
-          self.state = TokenInfo.SLASH
-          return self.getnexttoken()
-        elif self.char == '=':
-          self.state = TokenInfo.ASSIGN
-          return self.getnexttoken()
-        elif self.char == '<':
-          self.state = TokenInfo.L
-          return self.getnexttoken()
-        elif self.char == '>':
-          self.state = TokenInfo.G
-          return self.getnexttoken()
-        elif self.char.isalpha() or self.char == '_':
-          self.state = TokenInfo.ID
-          return self.getnexttoken()
-        elif self.char.isdigit():
-          self.state = TokenInfo.INT_LITERAL
-          return self.getnexttoken()
+            raise LexerException(f"Unexpected symbol {self.char!r} in {self.lineno} line, {self.pos} pos")
         
-  def print_all_tokens(self, file=sys.stdout):
+  def __iter__(self):
+    """Ленивый поток токенов, заканчивающийся токеном EOF"""
+    if self.observer is not None:
+      return self.__observed_tokens()
+    return self.__tokens()
+
+  def __tokens(self):
     token = self.getnexttoken()
     while token.token != TokenInfo.EOF:
-      print(token, file=file)
+      yield token
       token = self.getnexttoken()
-    print(token, file=file)
\ No newline at end of file
+    yield token
+
+  def __observed_tokens(self):
+    self.observer.stage_started("lexer")
+    count = 0
+    try:
+      for token in self.__tokens():
+        count += 1
+        yield token
+    finally:
+      self.observer.stage_finished("lexer", lambda: {"tokens": count, "lines": self.lineno})
+
+  def get_all_tokens(self):
+    return list(self)
+
+  def print_all_tokens(self, file=sys.stdout, format="text"):
+    write_tokens(self.__tokens(), file, format)
+
+
+class BufferedLexer(Lexer):
+  """
+    Читает весь вход в буфер и разбирает его одним скомпилированным регулярным выражением.
+    Выдаёт тот же поток токенов, что и посимвольный Lexer
+  """
+  TOKEN_REGEX = re.compile(r"""
+      (?P<SKIP>[ \t\n%]+)
+    | (?P<LINE_COMMENT>//[^\n]*\n?)
+    | (?P<BLOCK_COMMENT>/\*(?:[^*]+|\*[^/])*(?:(?P<COMMENT_END>\*/)|\*?\Z))
+    | (?P<FLOAT>\d+\.\d*)
+    | (?P<INT>\d+)
+    | (?P<ID>[^\W\d]\w*)
+    | (?P<OP>[<>=+\-*/!]=|[<>=+\-*/(){}\[\];,.])
+  """, re.VERBOSE)
+
+  OPERATORS = {
+    "=": TokenInfo.ASSIGN, "==": TokenInfo.EQ, "!=": TokenInfo.NEQ,
+    "<": TokenInfo.L, "<=": TokenInfo.LE, ">": TokenInfo.G, ">=": TokenInfo.GE,
+    "+": TokenInfo.PLUS, "+=": TokenInfo.PLUS_ASSIGN,
+    "-": TokenInfo.MINUS, "-=": TokenInfo.MINUS_ASSIGN,
+    "*": TokenInfo.ASTERISK, "*=": TokenInfo.ASTERISK_ASSIGN,
+    "/": TokenInfo.SLASH, "/=": TokenInfo.SLASH_ASSIGN,
+    "(": TokenInfo.LBR, ")": TokenInfo.RBR, "{": TokenInfo.LCBR, "}": TokenInfo.RCBR,
+    "[": TokenInfo.LSBR, "]": TokenInfo.RSBR, ";": TokenInfo.SEMI, ",": TokenInfo.COMMA,
+    ".": TokenInfo.DOT,
+  }
+
+  def __init__(self, file, observer=None):
+    super().__init__(file, observer)
+    self.buffer = None
+    self.index = 0
+    self.line_start = -1  # индекс последнего перевода строки перед курсором
+    self.line = 1         # номер строки без учёта символа под курсором
+
+  def seek(self, index):
+    """Продолжает разбор с index - начала токена или промежутка между токенами"""
+    if self.buffer is None:
+      self.buffer = self.file.read()
+    self.index = index
+    self.line = self.buffer.count("\n", 0, index) + 1
+    self.line_start = self.buffer.rfind("\n", 0, index)
+
+  def __skip(self, start, end):
+    newlines = self.buffer.count("\n", start, end)
+    if newlines:
+      self.line += newlines
+      self.line_start = self.buffer.rfind("\n", start, end)
+
+  def __move_to(self, index):
+    """Выставляет lineno и pos так же, как их выставил бы Lexer, прочитав символ index"""
+    self.index = index
+    if index < len(self.buffer) and self.buffer[index] == "\n":
+      self.lineno = self.line + 1
+      self.pos = 1
+    else:
+      self.lineno = self.line
+      self.pos = index - self.line_start + 1
+
+  def getnexttoken(self):
+    if self.buffer is None:
+      self.buffer = self.file.read()
+    buffer = self.buffer
+    while True:
+      start = self.index
+      if start >= len(buffer):
+        self.__move_to(start)
+        return Token(TokenInfo.EOF, "", self.lineno, self.pos)
+      match = self.TOKEN_REGEX.match(buffer, start)
+      if match is None:
+        if buffer[start] == "!":
+          self.__move_to(start + 1)
+          raise LexerException(f"Expected '=' in {self.lineno} line, {self.pos} pos")
+        self.__move_to(start)
+        raise LexerException(f"Unexpected symbol {buffer[start]!r} in {self.lineno} line, {self.pos} pos")
+      end = match.end()
+      kind = match.lastgroup
+      if kind == "SKIP":
+        self.__skip(start, end)
+        self.index = end
+        continue
+      if kind == "LINE_COMMENT":
+        self.__skip(start, end)
+        # комментарий без перевода строки кончается концом файла: Lexer, как и после
+        # незакрытого блочного, дочитывает на один символ дальше
+        self.index = end if buffer[end - 1] == "\n" else end + 1
+        continue
+      if kind == "BLOCK_COMMENT":
+        self.__skip(start, end)
+        # незакрытый комментарий Lexer дочитывает на один символ дальше конца файла
+        self.index = end if match.group("COMMENT_END") else end + 1
+        continue
+      value = match.group()
+      self.__move_to(end)
+      if kind == "ID":
+        keyword = KEYWORDS.get(value)
+        if keyword is not None:
+          return Token(keyword, value, self.lineno, self.pos-1)
+        symbol = SYMBOLS.intern(value)
+        return Token(TokenInfo.ID, SYMBOLS.names[symbol], self.lineno, self.pos-1, symbol)
+      if kind == "OP":
+        return Token(self.OPERATORS[value], value, self.lineno, self.pos)
+      if end < len(buffer) and (buffer[end].isalpha() or buffer[end] == "_"):
+        raise LexerException(f"Wrong identifier in {self.lineno} line, {self.pos} pos")
+      if kind == "INT":
+        return Token(TokenInfo.INT_LITERAL, value, self.lineno, self.pos-1)
+      return Token(TokenInfo.FLOAT_LITERAL, value, self.lineno, self.pos-1)
+
+
+LEXER_ENGINES = {
+  "char": Lexer,
+  "buffered": BufferedLexer,
+}
+
+
+class TokenStream(Lexer):
+  """Отдаёт готовую последовательность токенов (например, общий список) через интерфейс лексера"""
+  def __init__(self, tokens):
+    super().__init__(None)
+    self.tokens = iter(tokens)
+    self.last_token = None
+
+  def getnexttoken(self):
+    token = next(self.tokens, None)
+    if token is None:
+      token = self.last_token
+    self.last_token = token
+    self.lineno = token.lineno
+    self.pos = token.pos
+    return token
@@ -0,0 +1,278 @@
+from __future__ import annotations
+from Nodes import *
+from Expressions import *
+from ConstantFolder import wrap_int
+
+
+LOOP_NODES = (NodeWhileConstruction, NodeForConstruction)
+
+
+def _node_classes(base: type) -> list[type]:
+    classes = [base]
+    for cls in classes:
+        classes += cls.__subclasses__()
+    return classes
+
+
+# типы, в которые спускается обработка цикла: вложенные циклы к этому моменту уже обработаны
+LOOP_BODY_NODES = tuple(cls for cls in _node_classes(Node) if not issubclass(cls, LOOP_NODES))
+
+
+class ExpressionReplacer(NodeTransformer):
+    """Заменяет узлы по id: replacements - id узла: новый узел (None - убрать оператор)"""
+    def __init__(self, replacements: dict[int, Node | None], descend_into: tuple[type, ...] = None) -> None:
+        self.replacements = replacements
+        self.descend_into = descend_into
+
+    def transform(self, node: Node) -> Node | None:
+        return self.replacements.get(id(node), node)
+
+
+class LoopOptimizer(NodeTransformer):
+    """
+        Оптимизации циклов while и for:
+        - вынос инвариантов: арифметическое выражение, переменные которого цикл не меняет,
+          вычисляется один раз во временную переменную перед циклом;
+        - снижение стоимости: в for с шагом i = i + c произведение i * k (k - литерал или
+          инвариант) заменяется переменной, которая в начале каждой итерации увеличивается на c * k.
+        Временные переменные объявляются в блоке { ... } вокруг цикла. Вложенные циклы
+        обрабатываются раньше внешних, поэтому инвариант выносится через все уровни, а внешний
+        цикл не просматривает тела вложенных заново - ему хватает их сводки изменяемых имён
+    """
+    descend_into = STATEMENT_CONTAINERS
+
+    def __init__(self) -> None:
+        self.hoisted = 0
+        self.reduced = 0
+        self.invariants: set[str] = set()  # временные переменные вынесенных инвариантов
+        # id цикла: (цикл, имена, изменяемые телом, имена, изменяемые всем циклом, есть ли вызовы функций)
+        self.summaries: dict[int, tuple[Node, set[str], set[str], bool]] = {}
+
+    def optimize(self, tree: Node) -> Node:
+        self.function_writes = set()  # имена, которые может изменить вызов функции
+        has_bodies = False
+        for node in tree.walk():
+            if isinstance(node, NodeFunction):
+                self.function_writes |= written_names(node.block)
+            elif isinstance(node, LOOP_NODES) and node.block.children:
+                has_bodies = True
+        # циклы с пустым телом удалит OptimizeCode, выносить из них нечего - дерево не обходится ещё раз
+        if not has_bodies:
+            return tree
+        self.types = TypeTable(tree)
+        self.temps = TempNames(tree)
+        return self.rewrite(tree)
+
+    def transform(self, node: Node) -> Node:
+        # сводка цикла с пустым телом строится, только если он вложен в другой цикл
+        if not isinstance(node, LOOP_NODES) or not node.block.children:
+            return node
+        self.__summarize(node)
+        loop = node
+        prelude = []
+        if isinstance(loop, NodeForConstruction):
+            loop = self.__derive(node, self.__reduce_strength(loop, prelude), prelude)
+        loop = self.__derive(node, self.__hoist_invariants(loop, prelude), prelude)
+        if not prelude:
+            return loop
+        return NodeScopeBlock(NodeBlock(prelude + [loop]))
+
+    def __derive(self, original: Node, loop: Node, prelude: list[Node]) -> Node:
+        """Сводка изменённого цикла: к именам исходного добавляются временные (обновления ind в начале тела)"""
+        if loop is not original:
+            _, block_writes, writes, calls = self.summaries[id(original)]
+            created = {declaration.id.id.value for declaration in prelude}
+            self.summaries[id(loop)] = (loop, block_writes | created, writes | created, calls)
+        return loop
+
+    @staticmethod
+    def __loop_parts(loop: Node) -> list[Node]:
+        if isinstance(loop, NodeForConstruction):
+            return [loop.condition, loop.block, loop.step]
+        return [loop.condition, loop.block]
+
+    def __summarize(self, loop: Node) -> None:
+        """Сводка цикла; вложенные циклы уже обработаны, их сводки берутся готовыми (кроме циклов с пустым телом)"""
+        block_writes = set()
+        writes = set()
+        calls = False
+        for part in self.__loop_parts(loop):
+            names = block_writes if part is loop.block else writes
+            stack = [part]
+            while stack:
+                node = stack.pop()
+                match node:
+                    case NodeAssigning():
+                        names.add(node.left_side.id.value)
+                    case NodeDeclaration():
+                        names.add(node.id.id.value)
+                    case NodeCall() if isinstance(node.callable, NodeVar):
+                        calls = True
+                    case NodeWhileConstruction() | NodeForConstruction():
+                        if id(node) not in self.summaries:
+                            self.__summarize(node)
+                        _, _, nested_writes, nested_calls = self.summaries[id(node)]
+                        names |= nested_writes
+                        calls = calls or nested_calls
+                        continue
+                stack += node.get_children()
+        if isinstance(loop, NodeForConstruction):
+            writes |= written_names(loop.init)
+        self.summaries[id(loop)] = (loop, block_writes, writes | block_writes, calls)
+
+    def __variant_names(self, loop: Node) -> set[str]:
+        """Имена, значение которых может меняться между итерациями"""
+        _, _, names, calls = self.summaries[id(loop)]
+        if calls:
+            return names | self.function_writes
+        return names
+
+    def __invariant(self, node: Node, variant: set[str]) -> bool:
+        names = read_names(node)
+        if not names or names & variant or self.types.of(node) is None or has_call(node):
+            return False
+        # вынесенное выражение вычисляется, даже если цикл не выполнится ни разу - оно не должно бросать исключений
+        return not may_throw(node, self.types)
+
+    def __hoist_invariants(self, loop: Node, prelude: list[Node]) -> Node:
+        variant = self.__variant_names(loop)
+        temps: dict[str, str] = {}  # текст выражения: имя временной переменной
+        replacements = {}
+        # инвариант вложенного цикла, не зависящий и от этого цикла, поднимается целиком
+        liftable = lambda node: isinstance(node, NodeDeclaration) and node.id.id.value in self.invariants and \
+            not read_names(node.value) & variant
+        lifted = []
+        stack = [loop.block]
+        while stack:
+            node = stack.pop()
+            if liftable(node):
+                lifted.append(node)
+                replacements[id(node)] = None
+            elif isinstance(node, NodeScopeBlock) and node.block.children and \
+                    isinstance(node.block.children[-1], LOOP_NODES) and all(map(liftable, node.block.children[:-1])):
+                # блок вокруг вложенного цикла, из которого поднимаются все объявления, больше не нужен
+                lifted += node.block.children[:-1]
+                replacements[id(node)] = node.block.children[-1]
+            elif isinstance(node, STATEMENT_CONTAINERS + (NodeBlock,)) and not isinstance(node, LOOP_NODES):
+                stack += reversed(node.get_children())
+        for declaration in lifted:
+            prelude.append(declaration)
+            temps.setdefault(declaration.value._generate_text(), declaration.id.id.value)
+        stack = self.__loop_parts(loop)[::-1]
+        while stack:
+            node = stack.pop()
+            if id(node) in replacements:
+                continue
+            if isinstance(node, ARITHMETIC_NODES) and self.__invariant(node, variant):
+                text = node._generate_text()
+                if text not in temps:
+                    token = first_token(node)
+                    name = self.temps.fresh("inv")
+                    type = self.types.of(node)
+                    self.types.declare(name, type)
+                    self.invariants.add(name)
+                    prelude.append(make_declaration(type, name, node, token))
+                    temps[text] = name
+                    self.hoisted += 1
+                replacements[id(node)] = make_var(temps[text], first_token(node))
+            elif not isinstance(node, (NodeChainedVar, NodeFunction) + LOOP_NODES):
+                stack += reversed(node.get_children())
+        if not replacements:
+            return loop
+        replacer = ExpressionReplacer(replacements, LOOP_BODY_NODES)
+        if isinstance(loop, NodeForConstruction):
+            return loop._replace(condition=replacer.rewrite(loop.condition), block=replacer.rewrite(loop.block),
+                                 step=replacer.rewrite(loop.step))
+        return loop._replace(condition=replacer.rewrite(loop.condition), block=replacer.rewrite(loop.block))
+
+    def __induction(self, loop: NodeForConstruction) -> tuple[str, int, Node] | None:
+        """Переменная цикла вида for (int i = start; ...; i = i + step): (имя, step, start)"""
+        match loop.init:
+            case NodeDeclaration(value=start) if start is not None:
+                name = loop.init.id.id.value
+            case NodeAssigning(right_side=start):
+                name = loop.init.left_side.id.value
+            case _:
+                return None
+        if self.types.of(make_var(name, first_token(loop.init))) != "int" or \
+                self.types.of(start) != "int" or has_call(start):
+            return None
+        match loop.step:
+            case NodeAssigning(left_side=NodeVar(id=target), right_side=NodePlus(left=NodeVar(id=var), right=NodeIntLiteral(value=step))) | \
+                 NodeAssigning(left_side=NodeVar(id=target), right_side=NodePlus(left=NodeIntLiteral(value=step), right=NodeVar(id=var))):
+                step = int_literal(step.value)
+            case NodeAssigning(left_side=NodeVar(id=target), right_side=NodeMinus(left=NodeVar(id=var), right=NodeIntLiteral(value=step))):
+                step = int_literal(step.value)
+                step = None if step is None else -step
+            case _:
+                return None
+        if step is None or target.value != name or var.value != name:
+            return None
+        return name, step, start
+
+    def __reduce_strength(self, loop: NodeForConstruction, prelude: list[Node]) -> NodeForConstruction:
+        induction = self.__induction(loop)
+        if induction is None:
+            return loop
+        name, step, start = induction
+        _, block_writes, _, calls = self.summaries[id(loop)]
+        if name in block_writes or name in self.function_writes and calls:
+            return loop
+        variant = self.__variant_names(loop)
+        factors: dict[str, str] = {}  # текст множителя: имя переменной, равной i * множитель
+        updates = []
+        replacements = {}
+        stack = [loop.block]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, NodeMultiply):
+                factor = self.__factor(node, name, variant)
+                if factor is not None:
+                    text = factor._generate_text()
+                    if text not in factors:
+                        factors[text] = self.__induction_temp(factor, step, start, prelude, updates)
+                    replacements[id(node)] = make_var(factors[text], first_token(node))
+                    continue
+            if not isinstance(node, (NodeChainedVar, NodeFunction) + LOOP_NODES):
+                stack += reversed(node.get_children())
+        if not replacements:
+            return loop
+        block = ExpressionReplacer(replacements, LOOP_BODY_NODES).rewrite(loop.block)
+        return loop._replace(block=block._replace(children=updates + block.children))
+
+    def __factor(self, node: NodeMultiply, name: str, variant: set[str]) -> Node | None:
+        """Множитель k в произведении i * k или k * i, если k - целый литерал или инвариант"""
+        for induction, factor in ((node.left, node.right), (node.right, node.left)):
+            if isinstance(induction, NodeVar) and induction.id.value == name:
+                if isinstance(factor, NodeIntLiteral) and int_literal(factor.value.value) is not None or \
+                        isinstance(factor, NodeVar) and factor.id.value not in variant and self.types.of(factor) == "int":
+                    return factor
+        return None
+
+    def __induction_temp(self, factor: Node, step: int, start: Node, prelude: list[Node], updates: list[Node]) -> str:
+        """
+            Переменная t = i * factor: до цикла t = (start - step) * factor, в начале итерации
+            t = t + step * factor. Обновление в начале тела не пропускается при continue,
+            а переполнение int не мешает - равенство выполняется по модулю 2^32
+        """
+        token = first_token(factor)
+        name = self.temps.fresh("ind")
+        self.types.declare(name, "int")
+        self.reduced += 1
+        if isinstance(factor, NodeIntLiteral):
+            k = int_literal(factor.value.value)
+            increment = make_int(wrap_int(step * k), token)
+            if isinstance(start, NodeIntLiteral) and int_literal(start.value.value) is not None:
+                initial = make_int(wrap_int((int_literal(start.value.value) - step) * k), token)
+            else:
+                initial = NodeMultiply(NodeMinus(clone(start), make_int(step, token)), make_int(k, token))
+        else:
+            increment = clone(factor) if step == 1 else NodeMultiply(make_int(step, token), clone(factor))
+            if isinstance(start, NodeIntLiteral) and int_literal(start.value.value) is not None:
+                first = make_int(wrap_int(int_literal(start.value.value) - step), token)
+            else:
+                first = NodeMinus(clone(start), make_int(step, token))
+            initial = NodeMultiply(first, clone(factor))
+        prelude.append(make_declaration("int", name, initial, token))
+        updates.append(NodeAssigning(make_var(name, token), NodePlus(make_var(name, token), increment)))
+        return name
@@ -1,252 +1,543 @@
 from __future__ import annotations
+import io
 from Token import *
 from abc import ABC, abstractmethod
 
 class Node:
+    """
+        Поля узла перечисляются в __slots__ каждого класса.
+        _fields - все публичные слоты с учётом наследования, в порядке объявления,
+        _token_fields - поля, хранящие Token, _child_fields - поля с дочерними узлами
+    """
+    __slots__ = ()
+    _fields: tuple[str, ...] = ()
+    _token_fields: tuple[str, ...] = ()
+    _child_fields: tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if not name.startswith('_') and name not in fields:
+                    fields.append(name)
+        cls._fields = tuple(fields)
+        cls._child_fields = tuple(name for name in fields if name not in cls._token_fields)
+
     def __get_class_name(self):
         c = str(self.__class__)
         pos_1 = c.find('.')+1
         pos_2 = c.find("'", pos_1)
         return f"{c[pos_1:pos_2]}"
 
-    def __repr__(self, level=0):
-        attrs = self.__dict__
-        res = f"{self.__get_class_name()}\n"
-        for attr_name in attrs:
-            if attrs[attr_name] is None:
+    def __repr__(self):
+        out = io.StringIO()
+        self.dump(out)
+        return out.getvalue()
+
+    def dump(self, file, chunk_size=4096):
+        """
+            Пишет дамп поддерева в формате |+- в file без рекурсии: каждая строка выводится
+            сразу, а не копируется в строку родителя, поэтому время линейно по размеру дампа
+        """
+        chunk = []
+        names = {}  # класс узла: строка с его именем
+        stack = [(self, 0)]
+        pop = stack.pop
+        while stack:
+            item = pop()
+            if item.__class__ is str:
+                chunk.append(item)
                 continue
-            res += '|   ' * level
-            res += "|+-"
-            match attrs[attr_name]:
-                case Token():
-                    res += f"{attr_name}: {attrs[attr_name]}\n"
-                case Node():
-                    res += f"{attr_name}: {attrs[attr_name].__repr__(level+1)}"
-                case list() as elements:
-                    res += f"{attr_name}:\n"
-                    for el in elements:
-                        res += '|   ' * (level + 1)
-                        res += "|+-"
-                        res += el.__repr__(level+2)
-        return res
+            node, level = item
+            name = names.get(node.__class__)
+            if name is None:
+                name = names[node.__class__] = f"{node.__get_class_name()}\n"
+            chunk.append(name)
+            if len(chunk) >= chunk_size:
+                file.write("".join(chunk))
+                chunk.clear()
+            indent = "|   " * level
+            parts = []
+            for attr_name in node._fields:
+                attr = getattr(node, attr_name)
+                if attr is None:
+                    continue
+                if attr.__class__ is list:
+                    parts.append(f"{indent}|+-{attr_name}:\n")
+                    for el in attr:
+                        parts.append(f"{indent}|   |+-")
+                        parts.append((el, level + 2))
+                elif isinstance(attr, Node):
+                    parts.append(f"{indent}|+-{attr_name}: ")
+                    parts.append((attr, level + 1))
+                elif isinstance(attr, Token):
+                    parts.append(f"{indent}|+-{attr_name}: {attr}\n")
+                else:
+                    parts.append(f"{indent}|+-")
+            parts.reverse()
+            stack += parts
+        file.write("".join(chunk))
 
     @abstractmethod
-    def _generate_text(self, exclude_nodes=None):
+    def _text_parts(self, exclude_nodes=None):
+        """
+            Порождает части кода узла: строки, дочерние узлы
+            или пары (узел, exclude_nodes), если исключения передаются дочернему узлу
+        """
         pass
 
+    def emit(self, file, exclude_nodes=None, chunk_size=4096):
+        """Пишет код поддерева в file за один проход, без рекурсии и промежуточных строк"""
+        chunk = []
+        stack = [iter(self._text_parts(exclude_nodes))]
+        while stack:
+            for part in stack[-1]:
+                if part.__class__ is str:
+                    chunk.append(part)
+                    if len(chunk) >= chunk_size:
+                        file.write("".join(chunk))
+                        chunk.clear()
+                elif part.__class__ is tuple:
+                    stack.append(iter(part[0]._text_parts(part[1])))
+                    break
+                else:
+                    stack.append(iter(part._text_parts()))
+                    break
+            else:
+                stack.pop()
+        file.write("".join(chunk))
+
+    def _generate_text(self, exclude_nodes=None):
+        out = io.StringIO()
+        self.emit(out, exclude_nodes)
+        return out.getvalue()
+
+    def _replace(self, **changes) -> Node:
+        """Копия узла с заменёнными полями; остальные поля, в том числе поддеревья, общие с исходным"""
+        node = object.__new__(self.__class__)
+        for name in self._fields:
+            setattr(node, name, changes[name] if name in changes else getattr(self, name))
+        return node
+
     def get_children(self) -> list[Node]:
         children = []
-        for attr in self.__dict__.values():
-            if isinstance(attr, list):
-                for el in attr:
-                    if isinstance(el, Node):
-                        children.append(el)
-            elif isinstance(attr, Node):
+        for attr_name in self._child_fields:
+            attr = getattr(self, attr_name)
+            if attr.__class__ is list:
+                children += attr
+            elif attr is not None:
                 children.append(attr)
         return children
 
+    def walk(self):
+        """Обход поддерева в прямом порядке без рекурсии"""
+        stack = [self]
+        pop = stack.pop
+        while stack:
+            node = pop()
+            yield node
+            if node._child_fields:
+                children = node.get_children()
+                children.reverse()
+                stack += children
+
+    def walk_postorder(self, descend: tuple[type, ...] = None):
+        """
+            Обход поддерева в обратном порядке (дети раньше родителя) без рекурсии.
+            descend - типы узлов, в детей которых спускаться (остальные узлы - листья обхода), None - все
+        """
+        stack = [(self, False)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node, expanded = pop()
+            if expanded or not node._child_fields or (descend is not None and not isinstance(node, descend)):
+                yield node
+                continue
+            push((node, True))
+            for child in reversed(node.get_children()):
+                push((child, False))
+
+
+class _Dispatch(dict):
+    """Тип узла: метод посетителя. Метод для типа ищется один раз - при первом узле этого типа"""
+    __slots__ = ("visitor_class",)
+
+    def __init__(self, visitor_class: type) -> None:
+        super().__init__()
+        self.visitor_class = visitor_class
+
+    def __missing__(self, node_class: type):
+        for klass in node_class.__mro__:
+            method = getattr(self.visitor_class, f"visit_{klass.__name__}", None)
+            if method is not None:
+                break
+        else:
+            method = self.visitor_class.generic_visit
+        self[node_class] = method
+        return method
+
+
+class NodeVisitor:
+    """
+        Вызывает для узла метод visit_<ИмяКласса> (с учётом наследования узлов) или generic_visit.
+        Методы связываются с типами узлов один раз на класс посетителя. context - состояние обхода,
+        которое получают дети (например, область видимости); методы вызываются как method(node, context)
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = _Dispatch(cls)
+
+    def visit(self, node: Node, context=None):
+        return self._dispatch[node.__class__](self, node, context)
+
+    def generic_visit(self, node: Node, context=None):
+        # дети диспетчеризуются здесь же, без промежуточного вызова visit и без списка детей
+        dispatch = self._dispatch
+        for name in node._child_fields:
+            attr = getattr(node, name)
+            if attr.__class__ is list:
+                for child in attr:
+                    dispatch[child.__class__](self, child, context)
+            elif attr is not None:
+                dispatch[attr.__class__](self, attr, context)
+
+
+NodeVisitor._dispatch = _Dispatch(NodeVisitor)
+
+
+class NodeTransformer:
+    """
+        Перестраивает дерево снизу вверх без рекурсии, не изменяя исходные узлы.
+        transform получает узел с уже преобразованными детьми и возвращает замену: тот же узел,
+        другой узел или None - убрать узел из списка операторов. Изменённые узлы и их предки
+        копируются через Node._replace, неизменённые поддеревья остаются общими с исходным деревом.
+        descend_into - типы узлов, в детей которых спускаться, если преобразование не трогает выражения
+    """
+    descend_into: tuple[type, ...] = None
+
+    def transform(self, node: Node) -> Node | None:
+        return node
+
+    def rewrite(self, tree: Node) -> Node:
+        replaced: dict[int, Node | None] = {}
+        # промежуточные узлы держатся до конца обхода, чтобы их id не достались новым узлам
+        self._created = []
+        for node in tree.walk_postorder(self.descend_into):
+            current = self.__with_children(node, replaced) if replaced else node
+            result = self.transform(current)
+            if result is not node:
+                replaced[id(node)] = result
+                self._created += (current, result)
+        return replaced.get(id(tree), tree)
+
+    @staticmethod
+    def __with_children(node: Node, replaced: dict[int, Node | None]) -> Node:
+        changes = {}
+        for name in node._child_fields:
+            attr = getattr(node, name)
+            if attr.__class__ is list:
+                if any(id(child) in replaced for child in attr):
+                    children = []
+                    for child in attr:
+                        if id(child) in replaced:
+                            child = replaced[id(child)]
+                            if child is None:
+                                continue
+                        children.append(child)
+                    changes[name] = children
+            elif attr is not None and id(attr) in replaced:
+                changes[name] = replaced[id(attr)]
+        return node._replace(**changes) if changes else node
+
+class NodeSet:
+    """Множество узлов с проверкой принадлежности за O(1) по идентичности узла, а не по равенству"""
+    __slots__ = ('_nodes',)
+
+    def __init__(self, nodes=()):
+        self._nodes = {id(node): node for node in nodes}
+
+    def add(self, node: Node) -> None:
+        self._nodes[id(node)] = node
+
+    def discard(self, node: Node) -> None:
+        self._nodes.pop(id(node), None)
+
+    def __contains__(self, node) -> bool:
+        return id(node) in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes.values())
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
 class NodeProgram(Node):
+    __slots__ = ('children',)
     def __init__(self, children):
         self.children = children
-    def _generate_text(self, exclude_nodes=None):
-        if exclude_nodes:
-            generated_text = [child._generate_text(exclude_nodes) + ";" for child in self.children if child not in exclude_nodes]
-        else:
-            generated_text = [child._generate_text() + ";" for child in self.children]
-        return "\n".join(generated_text)
+    def _text_parts(self, exclude_nodes=None):
+        first = True
+        for child in self.children:
+            if exclude_nodes and child in exclude_nodes:
+                continue
+            if not first:
+                yield "\n"
+            first = False
+            yield (child, exclude_nodes)
+            yield ";"
 
-class NodeBlock(NodeProgram): pass
+class NodeBlock(NodeProgram):
+    __slots__ = ()
 
-class NodeElseBlock(NodeBlock): pass
+class NodeElseBlock(NodeBlock):
+    __slots__ = ()
 
 class NodeDeclaration(Node):
+    __slots__ = ('type', 'id', 'value')
     def __init__(self, _type: NodeType, id: NodeVar, value=None):
         self.type = _type
         self.id = id
         self.value = value
-    def _generate_text(self, exclude_nodes=None):
-        assign_part = ""
+    def _text_parts(self, exclude_nodes=None):
+        yield self.type
+        yield " "
+        yield self.id
         if self.value:
-            assign_part = " = " + self.value._generate_text()
-        return f"{self.type._generate_text()} {self.id._generate_text()}" + assign_part
+            yield " = "
+            yield self.value
 
 class NodeAssigning(Node):
+    __slots__ = ('left_side', 'right_side')
     def __init__(self, left_side: NodeVar, right_side):
         self.left_side = left_side
         self.right_side = right_side
-    def _generate_text(self, exclude_nodes=None):
-        return " = ".join([self.left_side._generate_text(), self.right_side._generate_text()])
+    def _text_parts(self, exclude_nodes=None):
+        return (self.left_side, " = ", self.right_side)
 
 class NodeIfConstruction(Node):
+    __slots__ = ('condition', 'block', 'else_block')
     def __init__(self, condition, block, else_block):
         self.condition = condition
         self.block = block
         self.else_block = else_block
-    def _generate_text(self, exclude_nodes=None):
-        else_str = f'else {{\n{self.else_block._generate_text(exclude_nodes)}\n}}' if len(self.else_block.children) > 0 else ""
-        return f'if ({self.condition._generate_text(exclude_nodes)}){{\n{self.block._generate_text(exclude_nodes)}\n}}{else_str}'
+    def _text_parts(self, exclude_nodes=None):
+        yield "if ("
+        yield (self.condition, exclude_nodes)
+        yield "){\n"
+        yield (self.block, exclude_nodes)
+        yield "\n}"
+        if len(self.else_block.children) > 0:
+            yield "else {\n"
+            yield (self.else_block, exclude_nodes)
+            yield "\n}"
 
 class NodeWhileConstruction(Node):
+    __slots__ = ('condition', 'block')
     def __init__(self, condition, block):
         self.condition = condition
         self.block = block
-    def _generate_text(self, exclude_nodes=None):
-        return f'while ({self.condition._generate_text(exclude_nodes)}){{\n{self.block._generate_text(exclude_nodes)}\n}}'
+    def _text_parts(self, exclude_nodes=None):
+        return ("while (", (self.condition, exclude_nodes), "){\n", (self.block, exclude_nodes), "\n}")
 
 class NodeForConstruction(Node):
+    __slots__ = ('init', 'condition', 'step', 'block')
     def __init__(self, init, condition, step, block):
         self.init = init
         self.condition = condition
         self.step = step
         self.block = block
-    def _generate_text(self, exclude_nodes=None):
-        return f"for ({self.init._generate_text()}; {self.condition._generate_text()}; {self.step._generate_text()}) {{\n{self.block._generate_text(exclude_nodes)}\n}}"
+    def _text_parts(self, exclude_nodes=None):
+        return ("for (", self.init, "; ", self.condition, "; ", self.step, ") {\n", (self.block, exclude_nodes), "\n}")
+
+class NodeScopeBlock(Node):
+    """Отдельный блок в фигурных скобках - собственная область видимости, например от if (true)"""
+    __slots__ = ('block',)
+    def __init__(self, block):
+        self.block = block
+    def _text_parts(self, exclude_nodes=None):
+        return ("{\n", (self.block, exclude_nodes), "\n}")
 
 class NodeLiteral(Node):
+    __slots__ = ('value',)
+    _token_fields = ('value',)
     def __init__(self, value):
         self.value = value
-    def _generate_text(self, exclude_nodes=None):
-        return f'{self.value.value}'
+    def _text_parts(self, exclude_nodes=None):
+        return (f'{self.value.value}',)
 
-class NodeIntLiteral(NodeLiteral): pass
+class NodeIntLiteral(NodeLiteral):
+    __slots__ = ()
 
-class NodeFloatLiteral(NodeLiteral): pass
+class NodeFloatLiteral(NodeLiteral):
+    __slots__ = ()
 
 class NodeVar(Node):
+    __slots__ = ('id',)
+    _token_fields = ('id',)
     def __init__(self, id: Token):
         self.id = id
-    def _generate_text(self, exclude_nodes=None):
-        return f'{self.id.value}'
+    def _text_parts(self, exclude_nodes=None):
+        return (f'{self.id.value}',)
 
 class NodeChainedVar(Node):
+    __slots__ = ('ids',)
     def __init__(self, ids: list[NodeVar]) -> None:
         self.ids = ids
-    def _generate_text(self, exclude_nodes=None):
+    def _text_parts(self, exclude_nodes=None):
         s = ".".join([id.id.value for id in self.ids])
         if s == "Console.WriteLine":
             s = "System.out.println"
         elif s == "Console.Write":
             s = "System.out.print"
-        return s
+        return (s,)
 
 class NodeType(Node):
-    pass
+    __slots__ = ()
 
 class NodeAtomType(NodeType):
+    __slots__ = ('id',)
+    _token_fields = ('id',)
     def __init__(self, id: Token):
         self.id = id
-    def _generate_text(self, exclude_nodes=None):
+    def _text_parts(self, exclude_nodes=None):
         s = f'{self.id.value}'
         if s == "bool":
             s = "boolean"
-        return s
+        return (s,)
 
 class NodeComplexType(NodeType):
+    __slots__ = ('id', 'size')
+    _token_fields = ('id', 'size')
     def __init__(self, id, size):
         self.id = id
         self.size = size
-    def _generate_text(self, exclude_nodes=None):
+    def _text_parts(self, exclude_nodes=None):
         atom_type = {self.id}
         if atom_type == "bool":
             atom_type = "boolean"
-        return f'{atom_type}({self.size})'
+        return (f'{atom_type}({self.size})',)
 
 class NodeUnaryOperator(Node):
+    __slots__ = ('operand',)
     def __init__(self, operand):
         self.operand = operand
-    def _generate_text(self, exclude_nodes=None):
-        return f'{self.operand._generate_text()}'
-
-class NodeUnaryMinus(NodeUnaryOperator): pass
-class NodeNot(NodeUnaryOperator): pass
-
-class NodeBreak(Node): 
-    def _generate_text(self, exclude_nodes=None):
-        return "break"
-
-class NodeContinue(Node): 
-    def _generate_text(self, exclude_nodes=None):
-        return "continue"
+    def _text_parts(self, exclude_nodes=None):
+        return (self.operand,)
+
+class NodeUnaryMinus(NodeUnaryOperator):
+    __slots__ = ()
+    def _text_parts(self, exclude_nodes=None):
+        return ("(-", self.operand, ")")
+class NodeNot(NodeUnaryOperator):
+    __slots__ = ()
+    def _text_parts(self, exclude_nodes=None):
+        return ("(!", self.operand, ")")
+
+class NodeBreak(Node):
+    __slots__ = ()
+    def _text_parts(self, exclude_nodes=None):
+        return ("break",)
+
+class NodeContinue(Node):
+    __slots__ = ()
+    def _text_parts(self, exclude_nodes=None):
+        return ("continue",)
 
 class NodeBinaryOperator(Node):
+    """operator - обозначение операции в Java"""
+    __slots__ = ('left', 'right')
+    operator: str = None
     def __init__(self, left, right):
         self.left = left
         self.right = right
-    def _generate_text(self, exclude_nodes=None):
-        pass
+    def _text_parts(self, exclude_nodes=None):
+        return ("(", self.left, f" {self.operator} ", self.right, ")")
 
 class NodeL(NodeBinaryOperator):
-    def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} < {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "<"
 class NodeG(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} > {self.right._generate_text()})'
+    __slots__ = ()
+    operator = ">"
 class NodeLE(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} <= {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "<="
 class NodeGE(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} >= {self.right._generate_text()})'
+    __slots__ = ()
+    operator = ">="
 class NodeEQ(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} == {self.right._generate_text()})'
-class NodeNEQ(NodeBinaryOperator): 
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} != {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "=="
+class NodeNEQ(NodeBinaryOperator):
+    __slots__ = ()
+    operator = "!="
 class NodeOr(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} || {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "||"
 class NodeAnd(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} && {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "&&"
 
 class NodePlus(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} + {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "+"
 class NodeMinus(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} - {self.right._generate_text()})'
-class NodeDivision(NodeBinaryOperator): 
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} / {self.right._generate_text()})'
-class NodeMultiply(NodeBinaryOperator): 
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} * {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "-"
+class NodeDivision(NodeBinaryOperator):
+    __slots__ = ()
+    operator = "/"
+class NodeMultiply(NodeBinaryOperator):
+    __slots__ = ()
+    operator = "*"
 class NodeMod(NodeBinaryOperator):
-   def _generate_text(self, exclude_nodes=None):
-        return f'({self.left._generate_text()} % {self.right._generate_text()})'
+    __slots__ = ()
+    operator = "%"
 
 
 class NodeFormalParams(Node):
+    __slots__ = ('types', 'ids')
     def __init__(self, types: list[NodeType], ids: list[NodeVar]) -> None:
         self.types = types
         self.ids = ids
-    def _generate_text(self, exclude_nodes=None):
-        params_strs = []
-        for type, id in zip(self.types, self.ids):
-            s = f"{type._generate_text()} {id._generate_text()}"
-            params_strs.append(s)
-        return ", ".join(params_strs)
+    def _text_parts(self, exclude_nodes=None):
+        for i, (type, id) in enumerate(zip(self.types, self.ids)):
+            if i > 0:
+                yield ", "
+            yield type
+            yield " "
+            yield id
 
 class NodeActualParams(Node):
+    __slots__ = ('values',)
     def __init__(self, values: list[Node]) -> None:
         self.values = values
-    def _generate_text(self, exclude_nodes=None):
-        return ", ".join([value._generate_text() for value in self.values])
+    def _text_parts(self, exclude_nodes=None):
+        for i, value in enumerate(self.values):
+            if i > 0:
+                yield ", "
+            yield value
 
 class NodeCall(Node):
+    __slots__ = ('callable', 'params')
     def __init__(self, callable: NodeVar, params: NodeActualParams) -> None:
         self.callable = callable
         self.params = params
-    def _generate_text(self, exclude_nodes=None):
-        return f"{self.callable._generate_text()}({self.params._generate_text()})"
+    def _text_parts(self, exclude_nodes=None):
+        return (self.callable, "(", self.params, ")")
 
 class NodeFunction(Node):
+    __slots__ = ('name', 'params', 'return_type', 'block')
     def __init__(self, name: NodeVar, params: NodeFormalParams, return_type: NodeType, block) -> None:
         self.name = name
         self.params = params
         self.return_type = return_type
         self.block = block
-    def _generate_text(self, exclude_nodes=None):
-        return f"{self.return_type._generate_text()} {self.name._generate_text()}({self.params._generate_text()}) {{\n{self.block._generate_text()}\n}}"
-    
\ No newline at end of file
+    def _text_parts(self, exclude_nodes=None):
+        return (self.return_type, " ", self.name, "(", self.params, ") {\n", (self.block, exclude_nodes), "\n}")
+
+# узлы, содержащие операторы: преобразования уровня операторов не спускаются в выражения
+STATEMENT_CONTAINERS = (NodeProgram, NodeIfConstruction, NodeWhileConstruction, NodeForConstruction,
+                        NodeScopeBlock, NodeFunction)
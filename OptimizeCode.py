@@ -1,78 +1,74 @@
 from SemanticAnalyzer import Scope
 from CodeGenerator import CodeGenerator
+from ConstantFolder import ConstantFolder
+from DeadBranchEliminator import DeadBranchEliminator
+from DeadStoreEliminator import DeadStoreEliminator
+from LoopOptimizer import LoopOptimizer
+from CommonSubexpressionEliminator import CommonSubexpressionEliminator
 from Nodes import *
+from Instrumentation import observe_stage, tree_counters
 from sys import stdout
 
 class OptimizeCode:
-    def __init__(self, global_scope: Scope, tree: Node, out_file=stdout):
-        self.global_scope = global_scope
-        self.tree = tree
+    def __init__(self, global_scope: Scope, tree: Node, out_file=stdout, observer=None):
         self.out_file = out_file
-        self.unnessessary_nodes = []
+        self.observer = observer
+        self.unnessessary_nodes = NodeSet()
 
-        self.optimize(tree)
+        # свёртка строит новое дерево, исходное (общее с другими стадиями) не меняется
+        folder = ConstantFolder()
+        tree = self.__stage("fold", lambda: folder.fold(tree), lambda _: {"folded": folder.folded})
+        eliminator = DeadBranchEliminator()
+        tree = self.__stage("dead branches", lambda: eliminator.eliminate(tree),
+                            lambda _: {"eliminated": eliminator.eliminated})
+        stores = DeadStoreEliminator()
+        tree = self.__stage("dead stores", lambda: stores.eliminate(tree), lambda _: {"removed": stores.removed})
+        loops = LoopOptimizer()
+        tree = self.__stage("loops", lambda: loops.optimize(tree),
+                            lambda _: {"hoisted": loops.hoisted, "reduced": loops.reduced})
+        subexpressions = CommonSubexpressionEliminator()
+        tree = self.__stage("cse", lambda: subexpressions.eliminate(tree),
+                            lambda _: {"temporaries": subexpressions.temporaries, "replaced": subexpressions.replaced})
+        self.tree = tree
 
-    def print(self):
-        generation = CodeGenerator(self.tree, self.unnessessary_nodes)
-        print(generation, file=self.out_file)
+        self.__stage("optimize", lambda: self.optimize(tree),
+                     lambda _: tree_counters(tree) | {"removed": len(self.unnessessary_nodes)})
 
-    def optimize(self, node: Node) -> None:
-        match node:
-            case NodeDeclaration():
-                id = node.id.id.value
-                if not self.global_scope.is_var_using(id):
-                    self.unnessessary_nodes.append(node)
-            case NodeAssigning():
-                id = node.left_side.id.value
-                if not self.global_scope.is_var_using(id):
-                    self.unnessessary_nodes.append(node)
-            case NodeIfConstruction():
-                if not node.block.children:
-                    self.unnessessary_nodes.append(node)
-                else:
-                    self.optimize(node.block)
-                    rmv_flag = True
-                    for child in node.block.children:
-                        if child not in self.unnessessary_nodes:
-                            rmv_flag = False
-                    if rmv_flag:
-                        self.unnessessary_nodes.append(node)
+    def __stage(self, stage: str, function, counters):
+        """Без наблюдателя вызывает проход напрямую, иначе - как стадию через observe_stage"""
+        if self.observer is None:
+            return function()
+        return observe_stage(self.observer, stage, function, counters)
+
+    def code_generator(self) -> CodeGenerator:
+        return CodeGenerator(self.tree, self.unnessessary_nodes, self.observer, "optimized codegen")
 
-                    if not node.else_block.children:
-                        self.unnessessary_nodes.append(node.else_block)
-                    else:
-                        self.optimize(node.else_block)
-                        rmv_flag = True
-                        for child in node.else_block.children:
-                            if child not in self.unnessessary_nodes:
-                                rmv_flag = False
-                        if rmv_flag:
-                            self.unnessessary_nodes.append(node.else_block)
+    def __str__(self):
+        return str(self.code_generator())
 
-            case NodeWhileConstruction():
-                if not node.block.children:
-                    self.unnessessary_nodes.append(node)
-                else:
-                    self.optimize(node.block)
-                    rmv_flag = True
-                    for child in node.block.children:
-                        if child not in self.unnessessary_nodes:
-                            rmv_flag = False
-                    if rmv_flag:
-                        self.unnessessary_nodes.append(node)
-            case NodeForConstruction():
-                if not node.block.children:
-                    self.unnessessary_nodes.append(node)
-                else:
-                    self.optimize(node.block)
-                    rmv_flag = True
-                    for child in node.block.children:
-                        if child not in self.unnessessary_nodes:
-                            rmv_flag = False
-                    if rmv_flag:
-                        self.unnessessary_nodes.append(node)
+    def write(self, file):
+        self.code_generator().write(file)
 
-        for child in node.get_children():
-            if isinstance(node, NodeDeclaration) or isinstance(node, NodeAssigning):
-                continue
-            self.optimize(child)
\ No newline at end of file
+    def print(self):
+        self.write(self.out_file)
+        self.out_file.write("\n")
+
+    def is_dead_block(self, block: NodeBlock) -> bool:
+        """Блок пуст или все его операторы помечены как ненужные"""
+        return all(child in self.unnessessary_nodes for child in block.children)
+
+    def optimize(self, node: Node) -> None:
+        """
+            Убирает конструкции, блоки которых опустели после удаления мёртвых присваиваний.
+            Обходит дерево снизу вверх: к моменту проверки конструкции её блоки уже разобраны
+        """
+        for current in node.walk_postorder(STATEMENT_CONTAINERS):
+            match current:
+                case NodeIfConstruction():
+                    if self.is_dead_block(current.block) and self.is_dead_block(current.else_block):
+                        self.unnessessary_nodes.add(current)
+                    elif self.is_dead_block(current.else_block):
+                        self.unnessessary_nodes.add(current.else_block)
+                case NodeWhileConstruction() | NodeForConstruction() | NodeScopeBlock():
+                    if self.is_dead_block(current.block):
+                        self.unnessessary_nodes.add(current)
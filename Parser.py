@@ -1,25 +1,43 @@
+from collections import deque
 from Nodes import *
 from Token import *
 from Exceptions import *
+from Lexer import Lexer, TokenStream
+from Instrumentation import observe_stage, tree_counters
 
 class Parser:
-    def __init__(self, lexer):
+    def __init__(self, lexer, observer=None):
+        """lexer - любой лексер или итерируемая последовательность токенов"""
+        self.observer = observer
+        if not isinstance(lexer, Lexer):
+            lexer = TokenStream(lexer)
         self.lexer = lexer
-        self.token = self.lexer.getnexttoken()
+        self.tokens = iter(lexer)
+        self.eof_token = None
+        self.peek_tokens_queue = deque()
+        self.token = self.__pull_token()
         self.iteration_flag = False
         self.ignore_semi = False
-        self.peek_tokens_queue = []
+
+    def __pull_token(self):
+        token = next(self.tokens, None)
+        if token is None:
+            return self.eof_token
+        if token.token == TokenInfo.EOF:
+            self.eof_token = token
+        return token
 
     def next_token(self):
         if self.peek_tokens_queue:
-            self.token = self.peek_tokens_queue.pop(0)
+            self.token = self.peek_tokens_queue.popleft()
         else:
-            self.token = self.lexer.getnexttoken()
+            self.token = self.__pull_token()
 
-    def peek_next_token(self):
-        """Посмотреть следующий токен, не переключаясь на него"""
-        self.peek_tokens_queue.append(self.lexer.getnexttoken())
-        return self.peek_tokens_queue[-1]      
+    def peek(self, k=1):
+        """Посмотреть k-й следующий токен, не переключаясь на него"""
+        while len(self.peek_tokens_queue) < k:
+            self.peek_tokens_queue.append(self.__pull_token())
+        return self.peek_tokens_queue[k - 1]
 
     def require(self, expected_token):
         if self.token.token != expected_token:
@@ -75,7 +93,7 @@ class Parser:
         match self.token.token:
             case TokenInfo.NOT:
                 self.next_token()
-                return NodeNot(self.logical_operand())
+                return NodeNot(self.inversion())
             case _:
                 return self.and_operand()
 
@@ -108,7 +126,7 @@ class Parser:
             match op:
                 case TokenInfo.PLUS:
                     left = NodePlus(left, self.term())
-                case Token.MINUS:
+                case TokenInfo.MINUS:
                     left = NodeMinus(left, self.term())
             op = self.token.token
         return left
@@ -200,8 +218,8 @@ class Parser:
         self.require_get_and_next(TokenInfo.LCBR)
         block = self.block()
         self.require_get_and_next(TokenInfo.RCBR)
-        self.ignore_semi = True
         if self.token.token != TokenInfo.ELSE:
+            self.ignore_semi = True
             return NodeIfConstruction(condition, block, NodeElseBlock([]))
         self.next_token()
         self.require_get_and_next(TokenInfo.LCBR)
@@ -241,9 +259,9 @@ class Parser:
     def statement(self) -> Node:
         match self.token.token:
             case TokenInfo.ID:
-                match self.peek_next_token().token:
+                match self.peek(1).token:
                     case TokenInfo.ID:
-                        if self.peek_next_token().token == TokenInfo.LBR:
+                        if self.peek(2).token == TokenInfo.LBR:
                             return self.function()
                         else:
                             return self.declaration()
@@ -314,6 +332,11 @@ class Parser:
         return NodeActualParams(values)
 
     def parse(self) -> Node:
+        if self.observer is not None:
+            return observe_stage(self.observer, "parser", self.__parse_program, tree_counters)
+        return self.__parse_program()
+
+    def __parse_program(self) -> Node:
         if self.token.token == TokenInfo.EOF:
             self.error("Пустой файл!")
         else:
@@ -323,4 +346,138 @@ class Parser:
                 if not self.ignore_semi:
                     self.require_get_and_next(TokenInfo.SEMI)
                 self.ignore_semi = False
-            return NodeProgram(statements)
\ No newline at end of file
+            return NodeProgram(statements)
+
+
+class IterativeParser(Parser):
+    """
+        Разбирает операторы без рекурсии: каждая открытая конструкция (блок, if, while, for, функция)
+        - генератор на явном стеке, который отдаёт наверх вложенный оператор или блок и получает
+        готовый узел обратно. Глубина вложенности не ограничена пределом рекурсии Python.
+        Деревья, флаги iteration_flag и ignore_semi и ошибки - те же, что у Parser;
+        выражения разбираются унаследованным рекурсивным спуском
+    """
+    def __run(self, frame) -> Node:
+        stack = [frame]
+        value = None
+        while True:
+            try:
+                nested = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                if not stack:
+                    return stop.value
+                value = stop.value
+                continue
+            stack.append(nested)
+            value = None
+
+    def statement(self) -> Node:
+        frame = self.__compound()
+        return super().statement() if frame is None else self.__run(frame)
+
+    def block(self) -> Node:
+        return self.__run(self.__block(NodeBlock))
+
+    def else_block(self) -> Node:
+        return self.__run(self.__block(NodeElseBlock))
+
+    def if_stmt(self) -> NodeIfConstruction:
+        return self.__run(self.__if_stmt())
+
+    def while_stmt(self) -> NodeWhileConstruction:
+        return self.__run(self.__while_stmt())
+
+    def for_stmt(self) -> NodeForConstruction:
+        return self.__run(self.__for_stmt())
+
+    def function(self) -> NodeFunction:
+        return self.__run(self.__function())
+
+    def __compound(self):
+        """Генератор разбора составного оператора под курсором; None - простой оператор без вложенных"""
+        match self.token.token:
+            case TokenInfo.IF:
+                return self.__if_stmt()
+            case TokenInfo.WHILE:
+                return self.__while_stmt()
+            case TokenInfo.FOR:
+                return self.__for_stmt()
+            case TokenInfo.ID if self.peek(1).token == TokenInfo.ID and self.peek(2).token == TokenInfo.LBR:
+                return self.__function()
+        return None
+
+    def __block(self, node_class):
+        statements = []
+        while self.token.token not in {TokenInfo.RCBR, TokenInfo.EOF}:
+            frame = self.__compound()
+            statements.append(Parser.statement(self) if frame is None else (yield frame))
+            if not self.ignore_semi:
+                self.require_get_and_next(TokenInfo.SEMI)
+            self.ignore_semi = False
+        return node_class(statements)
+
+    def __if_stmt(self):
+        self.next_token()
+        condition = self.condition()
+        self.require_get_and_next(TokenInfo.LCBR)
+        block = yield self.__block(NodeBlock)
+        self.require_get_and_next(TokenInfo.RCBR)
+        if self.token.token != TokenInfo.ELSE:
+            self.ignore_semi = True
+            return NodeIfConstruction(condition, block, NodeElseBlock([]))
+        self.next_token()
+        self.require_get_and_next(TokenInfo.LCBR)
+        else_block = yield self.__block(NodeElseBlock)
+        self.require_get_and_next(TokenInfo.RCBR)
+        self.ignore_semi = True
+        return NodeIfConstruction(condition, block, else_block)
+
+    def __while_stmt(self):
+        self.next_token()
+        self.iteration_flag = True
+        condition = self.condition()
+        self.require_get_and_next(TokenInfo.LCBR)
+        block = yield self.__block(NodeBlock)
+        self.require_get_and_next(TokenInfo.RCBR)
+        self.iteration_flag = False
+        self.ignore_semi = True
+        return NodeWhileConstruction(condition, block)
+
+    def __for_stmt(self):
+        self.next_token()
+        self.iteration_flag = True
+        self.require_get_and_next(TokenInfo.LBR)
+        frame = self.__compound()
+        init = Parser.statement(self) if frame is None else (yield frame)
+        self.require_get_and_next(TokenInfo.SEMI)
+        condition = self.condition()
+        self.require_get_and_next(TokenInfo.SEMI)
+        frame = self.__compound()
+        step = Parser.statement(self) if frame is None else (yield frame)
+        self.require_get_and_next(TokenInfo.RBR)
+        self.require_get_and_next(TokenInfo.LCBR)
+        block = yield self.__block(NodeBlock)
+        self.require_get_and_next(TokenInfo.RCBR)
+        self.iteration_flag = False
+        self.ignore_semi = True
+        return NodeForConstruction(init, condition, step, block)
+
+    def __function(self):
+        self.require(TokenInfo.ID)
+        _type = self.type()
+        id = self.require_get_and_next(TokenInfo.ID)
+        self.require_get_and_next(TokenInfo.LBR)
+        params = self.formal_params()
+        self.require_get_and_next(TokenInfo.RBR)
+        self.require_get_and_next(TokenInfo.LCBR)
+        block = yield self.__block(NodeBlock)
+        self.require_get_and_next(TokenInfo.RCBR)
+        self.ignore_semi = True
+        return NodeFunction(NodeVar(id), params, _type, block)
+
+
+PARSER_ENGINES = {
+    "recursive": Parser,
+    "iterative": IterativeParser,
+}
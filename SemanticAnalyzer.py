@@ -2,7 +2,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from Exceptions import SemanticAnalyzerException
 from Nodes import *
+from Token import SYMBOLS
 from collections import OrderedDict
+from Instrumentation import observe_stage, tree_counters, scope_counters
 import sys
 
 
@@ -21,14 +23,20 @@ class Scope:
     parent: Scope
     children: list[Scope]
     scope_name: str
-    variable_table: OrderedDict[str, Variable]  # name: variable
+    variable_table: OrderedDict[int, Variable]  # номер имени в SYMBOLS: variable
+    chain_cache: dict[int, Variable | None] | None  # номер имени: результат поиска по цепочке областей
 
 
-    def __init__(self, scope_name: str = "", parent: Scope = None) -> None:
+    def __init__(self, scope_name: str = "", parent: Scope = None, chain_cache: bool = False) -> None:
+        """chain_cache - запоминать результаты поиска переменных по цепочке родительских областей"""
         self.parent = parent
         self.children = []
         self.scope_name = scope_name
         self.variable_table = OrderedDict()
+        self.root = self if parent is None else parent.root
+        self.generation = 0  # у корня - число объявлений во всём дереве областей
+        self.chain_cache = {} if chain_cache else None
+        self.cache_generation = 0
     
     def print(self, file=sys.stdout, level=0):
         offset = lambda l: "   " * l
@@ -41,109 +49,158 @@ class Scope:
             child.print(file, level + 2)
 
     def add_variable(self, name: Token, type: NodeType | str, value=None) -> None:
-        if name.value in self.variable_table:
+        symbol = name.symbol()
+        if symbol in self.variable_table:
             raise SemanticAnalyzerException(f"Переменная уже объявлена : line {name.lineno}, pos {name.pos}")
         if isinstance(type, NodeType):
             type_str = type._generate_text()
         else:
             type_str = type 
-        self.variable_table[name.value] = Variable(name, type_str, value)
+        self.variable_table[symbol] = Variable(name, type_str, value)
+        self.root.generation += 1
     
 
     def update_variable(self, name: Token, value) -> None:
-        variable = self.find_variable(name.value)
+        variable = self.lookup_symbol(name.symbol())
         if variable is None:
             raise SemanticAnalyzerException(f"Обновление не объявленной переменной : line {name.lineno}, pos {name.pos}")
         variable.value = value
 
 
     def add_scope(self, scope_name: str = "") -> Scope:
-        new_scope = Scope(scope_name, parent=self)
+        new_scope = Scope(scope_name, parent=self, chain_cache=self.chain_cache is not None)
         self.children.append(new_scope)
         return new_scope
 
 
-    def find_variable(self, name: str) -> Variable | None:
-        """Ищет переменную в более глобальных областях видимости"""
+    def lookup(self, name: str) -> Variable | None:
+        """
+            Возвращает саму запись таблицы переменных (без копирования), найденную в этой
+            или более глобальных областях видимости.
+            С chain_cache повторный поиск того же имени выполняется за O(1); кеш сбрасывается
+            при любом новом объявлении в дереве областей
+        """
+        # поиск не добавляет имён в SYMBOLS: имени, которого нет в таблице, нет ни в одной области
+        symbol = SYMBOLS.ids.get(name)
+        return None if symbol is None else self.lookup_symbol(symbol)
+
+    def lookup_symbol(self, symbol: int) -> Variable | None:
+        """lookup по номеру имени в SYMBOLS - без хеширования строки"""
+        cache = self.chain_cache
+        if cache is not None:
+            if self.cache_generation != self.root.generation:
+                cache.clear()
+                self.cache_generation = self.root.generation
+            elif symbol in cache:
+                return cache[symbol]
+        variable = None
         curr_scope = self
-        while curr_scope != None:
-            if name in curr_scope.variable_table:
-                return Variable(name, curr_scope.variable_table[name], curr_scope.variable_table[name].value, curr_scope.variable_table[name].is_using)
+        while curr_scope is not None:
+            variable = curr_scope.variable_table.get(symbol)
+            if variable is not None:
+                break
             curr_scope = curr_scope.parent
-        return None
+        if cache is not None:
+            cache[symbol] = variable
+        return variable
+
+    def find_variable(self, name: str) -> Variable | None:
+        """Ищет переменную в более глобальных областях видимости"""
+        return self.lookup(name)
     
     def find_scope(self, name: str) -> Scope | None:
         '''
             Ищем область видимости в которой есть наша переменная
         '''
+        symbol = SYMBOLS.ids.get(name)
+        if symbol is None:
+            return None
         curr_scope = self
         while curr_scope != None:
-            if name in curr_scope.variable_table:
+            if symbol in curr_scope.variable_table:
                 return curr_scope
             curr_scope = curr_scope.parent
         return None
     
     def has_variable(self, name: Token) -> bool:
-        return self.find_variable(name.value) is not None
+        return self.lookup_symbol(name.symbol()) is not None
 
     def is_var_using(self, name: str) -> bool:
-        var_ = self.find_variable(name)
-        if not var_:
+        var_ = self.lookup(name)
+        if var_ is None:
             return False
         else:
             return var_.is_using
     
     def change_is_using(self, name: Token) -> None:
-        scope = self.find_scope(name.value)
-        if scope is not None:
-            scope.variable_table[name.value].is_using = True
+        var_ = self.lookup_symbol(name.symbol())
+        if var_ is not None:
+            var_.is_using = True
 
 
-class SemanticAnalyzer:
+class SemanticAnalyzer(NodeVisitor):
     last_declared_id: str = ""
     is_declaration: bool = False
 
+    def __init__(self, scope_cache: bool = False, observer=None) -> None:
+        """scope_cache - включить Scope.chain_cache во всех создаваемых областях видимости"""
+        self.scope_cache = scope_cache
+        self.observer = observer
+
     def analyze(self, syntax_tree_root: Node) -> Scope:
-        global_scope = Scope(scope_name="global")
+        if self.observer is not None:
+            return observe_stage(self.observer, "semantic", lambda: self.__analyze(syntax_tree_root),
+                                 lambda scope: tree_counters(syntax_tree_root) | scope_counters(scope))
+        return self.__analyze(syntax_tree_root)
+
+    def __analyze(self, syntax_tree_root: Node) -> Scope:
+        global_scope = Scope(scope_name="global", chain_cache=self.scope_cache)
         for builtin_id in builtin_ids:
             global_scope.add_variable(Token(TokenInfo.ID, builtin_id, 0, 0), "")
-        self.__analyze(syntax_tree_root, global_scope)
+        self.visit(syntax_tree_root, global_scope)
         return global_scope
 
-
-    def __analyze(self, node: Node, scope: Scope):
-        match node:
-            case NodeDeclaration():
-                self.last_declared_id = node.id.id.value
-                self.is_declaration = True
-                scope.add_variable(node.id.id, node.type, node.value)
-            case NodeAssigning():
-                self.is_declaration = False
-                scope.update_variable(node.left_side.id, node.right_side)
-            case NodeForConstruction():
-                self.is_declaration = False
-                scope = scope.add_scope("For")
-            case NodeWhileConstruction():
-                self.is_declaration = False
-                scope = scope.add_scope("While")
-            case NodeFunction():
-                self.is_declaration = False
-                scope.add_variable(node.name.id, "Function")
-                scope = scope.add_scope("Function " + node.name.id.value)
-                for id, type in zip(node.params.ids, node.params.types):
-                    scope.add_variable(id.id, type)
-            case NodeIfConstruction():
-                self.is_declaration = False
-                scope.add_scope("If")
-            case NodeElseBlock():
-                self.is_declaration = False
-                scope.add_scope("Else")
-            case NodeVar():
-                if not scope.has_variable(node.id):
-                    raise SemanticAnalyzerException(f"Обращение к не объявленной переменной : line {node.id.lineno}, pos {node.id.pos}")
-                else:
-                    if (self.last_declared_id != node.id.value and self.is_declaration) or\
-                        (not self.is_declaration):
-                        scope.change_is_using(node.id)
-        for child in node.get_children():
-            self.__analyze(child, scope)
\ No newline at end of file
+    def visit_NodeDeclaration(self, node: NodeDeclaration, scope: Scope):
+        self.last_declared_id = node.id.id.value
+        self.is_declaration = True
+        scope.add_variable(node.id.id, node.type, node.value)
+        self.generic_visit(node, scope)
+
+    def visit_NodeAssigning(self, node: NodeAssigning, scope: Scope):
+        self.is_declaration = False
+        scope.update_variable(node.left_side.id, node.right_side)
+        self.generic_visit(node, scope)
+
+    def visit_NodeForConstruction(self, node: NodeForConstruction, scope: Scope):
+        self.is_declaration = False
+        self.generic_visit(node, scope.add_scope("For"))
+
+    def visit_NodeWhileConstruction(self, node: NodeWhileConstruction, scope: Scope):
+        self.is_declaration = False
+        self.generic_visit(node, scope.add_scope("While"))
+
+    def visit_NodeFunction(self, node: NodeFunction, scope: Scope):
+        self.is_declaration = False
+        scope.add_variable(node.name.id, "Function")
+        scope = scope.add_scope("Function " + node.name.id.value)
+        for id, type in zip(node.params.ids, node.params.types):
+            scope.add_variable(id.id, type)
+        self.generic_visit(node, scope)
+
+    def visit_NodeIfConstruction(self, node: NodeIfConstruction, scope: Scope):
+        self.is_declaration = False
+        scope.add_scope("If")
+        self.generic_visit(node, scope)
+
+    def visit_NodeElseBlock(self, node: NodeElseBlock, scope: Scope):
+        self.is_declaration = False
+        scope.add_scope("Else")
+        self.generic_visit(node, scope)
+
+    def visit_NodeVar(self, node: NodeVar, scope: Scope):
+        if not scope.has_variable(node.id):
+            raise SemanticAnalyzerException(f"Обращение к не объявленной переменной : line {node.id.lineno}, pos {node.id.pos}")
+        else:
+            if (self.last_declared_id != node.id.value and self.is_declaration) or\
+                (not self.is_declaration):
+                scope.change_is_using(node.id)
@@ -43,25 +43,81 @@ class TokenInfo(Enum):
 
   @staticmethod
   def keywords():
-    return {
-      'while'     : TokenInfo.WHILE,
-      'break'     : TokenInfo.BREAK,
-      'continue'  : TokenInfo.CONTINUE,
-      'if'        : TokenInfo.IF,
-      'else'      : TokenInfo.ELSE,
-      'or'        : TokenInfo.OR,
-      'and'       : TokenInfo.AND,
-      'not'       : TokenInfo.NOT,
-      'for'       : TokenInfo.FOR,
-    }
-  
+    return KEYWORDS
+
+
+# ключевые слова: вид токена; таблица строится один раз при загрузке модуля
+KEYWORDS = {
+  'while'     : TokenInfo.WHILE,
+  'break'     : TokenInfo.BREAK,
+  'continue'  : TokenInfo.CONTINUE,
+  'if'        : TokenInfo.IF,
+  'else'      : TokenInfo.ELSE,
+  'or'        : TokenInfo.OR,
+  'and'       : TokenInfo.AND,
+  'not'       : TokenInfo.NOT,
+  'for'       : TokenInfo.FOR,
+}
+
+
+class SymbolTable:
+  """
+    Интернирование идентификаторов: каждое имя получает небольшой целый номер и хранится
+    одной строкой, которую делят все токены с этим именем.
+    Таблица только растёт, поэтому долгоживущий процесс вызывает trim между трансляциями:
+    после reset токены прошлых трансляций получают новые номера при первом обращении
+  """
+  def __init__(self, limit=100_000):
+    self.ids = {}    # имя: номер
+    self.names = []  # номер: имя
+    self.limit = limit
+
+  def intern(self, name):
+    symbol = self.ids.get(name)
+    if symbol is None:
+      symbol = self.ids[name] = len(self.names)
+      self.names.append(name)
+    return symbol
+
+  def reset(self):
+    """Нельзя вызывать, пока используются области видимости, построенные по старым номерам"""
+    self.ids = {}
+    self.names = []
+
+  def trim(self):
+    if len(self.names) > self.limit:
+      self.reset()
+
+  def __len__(self):
+    return len(self.names)
+
+
+# общая таблица процесса: номера не переносятся между процессами, поэтому в pickle токена не попадают
+SYMBOLS = SymbolTable()
+
 
 class Token:
-  def __init__(self, token, value, lineno, pos):
+  __slots__ = ('token', 'value', 'lineno', 'pos', 'symbol_id')
+
+  def __init__(self, token, value, lineno, pos, symbol_id=None):
     self.token = token
     self.value = value
     self.lineno = lineno
     self.pos = pos
+    self.symbol_id = symbol_id  # номер в SYMBOLS; None - ещё не интернирован
+  def __reduce__(self):
+    return Token, (self.token, self.value, self.lineno, self.pos)
+  def symbol(self):
+    """
+      Номер имени в SYMBOLS; у токенов не из Lexer вычисляется при первом обращении.
+      Номер верен, пока под ним лежит та же строка - иначе таблицу сбросили и имя интернируется заново
+    """
+    symbol = self.symbol_id
+    names = SYMBOLS.names
+    if symbol is None or symbol >= len(names) or names[symbol] is not self.value:
+      symbol = self.symbol_id = SYMBOLS.intern(self.value)
+      self.value = SYMBOLS.names[symbol]
+    return symbol
   def __repr__(self):
     return f'<{self.token.value}, {self.value}, ({self.lineno}, {self.pos})>'
   def __str__(self):
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import json
+import struct
+from json.encoder import encode_basestring
+from typing import Iterable, Iterator
+from Token import Token, TokenInfo
+
+TOKEN_FORMATS = ("text", "jsonl", "binary")
+BATCH_SIZE = 4096
+
+MAGIC = b"TOKB"
+FORMAT_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHH")   # сигнатура, версия, число видов токенов
+KIND_NAME = struct.Struct("<B")
+BINARY_RECORD = struct.Struct("<BIII")   # вид, строка, позиция, длина значения в байтах; за ней значение
+
+
+def _text_lines(tokens: Iterable[Token]) -> Iterator[str]:
+    """Строки в формате print(token): <вид, значение>"""
+    prefixes = {kind: f"<{kind.value}, " for kind in TokenInfo}
+    for token in tokens:
+        yield f"{prefixes[token.token]}{token.value}>\n"
+
+
+def _jsonl_lines(tokens: Iterable[Token]) -> Iterator[str]:
+    """Строки JSON Lines {"kind": ..., "value": ..., "line": ..., "pos": ...} - как json.dumps словаря"""
+    for token in tokens:
+        yield f'{{"kind": "{token.token.name}", "value": {encode_basestring(token.value)}, ' \
+              f'"line": {token.lineno}, "pos": {token.pos}}}\n'
+
+
+def _binary_chunks(tokens: Iterable[Token]) -> Iterator[bytes]:
+    """Заголовок с таблицей видов, затем по записи BINARY_RECORD со значением в UTF-8 на токен"""
+    kinds = {kind: index for index, kind in enumerate(TokenInfo)}
+    header = [BINARY_HEADER.pack(MAGIC, FORMAT_VERSION, len(kinds))]
+    for kind in kinds:
+        name = kind.name.encode()
+        header.append(KIND_NAME.pack(len(name)) + name)
+    yield b"".join(header)
+    pack = BINARY_RECORD.pack
+    for token in tokens:
+        value = token.value.encode()
+        yield pack(kinds[token.token], token.lineno, token.pos, len(value)) + value
+
+
+def write_tokens(tokens: Iterable[Token], file, format: str = "text", batch_size: int = BATCH_SIZE) -> int:
+    """
+        Пишет токены в file пачками по batch_size через writelines; возвращает число токенов.
+        text и jsonl пишутся в текстовый файл, binary - в двоичный
+    """
+    match format:
+        case "text":
+            chunks = _text_lines(tokens)
+        case "jsonl":
+            chunks = _jsonl_lines(tokens)
+        case "binary":
+            chunks = _binary_chunks(tokens)
+            # заголовок - не токен
+            file.write(next(chunks))
+        case _:
+            raise ValueError(f"unknown token format {format!r}, expected one of {', '.join(TOKEN_FORMATS)}")
+    count = 0
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            file.writelines(batch)
+            count += len(batch)
+            batch.clear()
+    file.writelines(batch)
+    return count + len(batch)
+
+
+def _read_text(file) -> Iterator[Token]:
+    """Текстовый формат не хранит позиций: у прочитанных токенов lineno и pos - None"""
+    # вид определяется по самому длинному совпавшему началу: значение может содержать ", "
+    kinds = sorted(TokenInfo, key=lambda kind: len(kind.value), reverse=True)
+    for line in file:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        for kind in kinds:
+            prefix = f"<{kind.value}, "
+            if line.startswith(prefix) and line.endswith(">"):
+                yield Token(kind, line[len(prefix):-1], None, None)
+                break
+        else:
+            raise ValueError(f"not a token line: {line!r}")
+
+
+def _read_jsonl(file) -> Iterator[Token]:
+    for line in file:
+        if line.strip():
+            record = json.loads(line)
+            yield Token(TokenInfo[record["kind"]], record["value"], record["line"], record["pos"])
+
+
+def _read_binary(file) -> Iterator[Token]:
+    data = file.read()
+    try:
+        magic, version, kinds_count = BINARY_HEADER.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError("truncated token file") from None
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("not a token file of this translator version")
+    offset = BINARY_HEADER.size
+    kinds = []
+    for _ in range(kinds_count):
+        length, = KIND_NAME.unpack_from(data, offset)
+        kinds.append(TokenInfo[data[offset + 1:offset + 1 + length].decode()])
+        offset += 1 + length
+    unpack = BINARY_RECORD.unpack_from
+    while offset < len(data):
+        try:
+            kind, lineno, pos, length = unpack(data, offset)
+        except struct.error:
+            raise ValueError("truncated token file") from None
+        offset += BINARY_RECORD.size
+        yield Token(kinds[kind], data[offset:offset + length].decode(), lineno, pos)
+        offset += length
+
+
+def read_tokens(file, format: str = "text") -> Iterator[Token]:
+    """Токены, записанные write_tokens в формате format"""
+    match format:
+        case "text":
+            return _read_text(file)
+        case "jsonl":
+            return _read_jsonl(file)
+        case "binary":
+            return _read_binary(file)
+    raise ValueError(f"unknown token format {format!r}, expected one of {', '.join(TOKEN_FORMATS)}")
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+import json
+import os
+import queue
+import threading
+import time
+from IncrementalTranslator import IncrementalTranslator
+from Token import SYMBOLS
+from Exceptions import LexerException, ParserException, SemanticAnalyzerException
+
+LATENCY_WINDOW = 1000    # по скольким последним трансляциям считаются перцентили
+
+
+@dataclass
+class WatchedFile:
+    path: str
+    translator: IncrementalTranslator
+    mtime: int = None
+    size: int = None
+    version: int = 0      # увеличивается после каждой перетрансляции
+    error: str = None
+
+
+class TranslationDaemon:
+    """
+        Долгоживущий процесс трансляции. Держит в памяти дерево, области видимости и код
+        каждого отслеживаемого файла, опрашивает mtime/size и при изменении перетранслирует
+        файл инкрементально. Общается JSON-строками через stdin/stdout:
+        запрос {"id": .., "command": "watch" | "unwatch" | "get" | "translate" | "stats" | "shutdown", ...},
+        ответ {"id": .., "ok": ..., ...}; о перетрансляции по изменению файла сообщается {"event": "changed", ...}.
+        Перед каждой трансляцией таблица имён SYMBOLS очищается, если в ней больше SYMBOLS.limit имён
+    """
+    def __init__(self, encoding: str = "utf-8", lexer_engine: str = "buffered", poll_interval: float = 0.1) -> None:
+        self.encoding = encoding
+        self.lexer_engine = lexer_engine
+        self.poll_interval = poll_interval
+        self.files: dict[str, WatchedFile] = {}
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.translations = 0
+        self.running = False
+
+    def watch(self, path: str) -> WatchedFile:
+        path = os.path.abspath(path)
+        if path not in self.files:
+            self.files[path] = WatchedFile(path, IncrementalTranslator(self.lexer_engine))
+            self.refresh(self.files[path])
+        return self.files[path]
+
+    def unwatch(self, path: str) -> bool:
+        return self.files.pop(os.path.abspath(path), None) is not None
+
+    def refresh(self, watched: WatchedFile) -> bool:
+        """Перетранслирует файл, если изменились его mtime или размер"""
+        try:
+            stat = os.stat(watched.path)
+        except OSError as e:
+            changed = watched.error is None
+            watched.error = f"{type(e).__name__}: {e}"
+            return changed
+        if stat.st_mtime_ns == watched.mtime and stat.st_size == watched.size:
+            return False
+        watched.mtime = stat.st_mtime_ns
+        watched.size = stat.st_size
+        start = time.perf_counter()
+        SYMBOLS.trim()
+        try:
+            watched.translator.update_file(watched.path, self.encoding)
+            watched.error = None
+        except (LexerException, ParserException, SemanticAnalyzerException) as e:
+            # прежний результат остаётся доступным, пока ошибку не исправят
+            watched.error = str(e)
+        except Exception as e:
+            watched.error = f"{type(e).__name__}: {e}"
+        self.record_latency(time.perf_counter() - start)
+        watched.version += 1
+        return True
+
+    def poll(self) -> list[WatchedFile]:
+        return [watched for watched in list(self.files.values()) if self.refresh(watched)]
+
+    @staticmethod
+    def describe(watched: WatchedFile, with_code: bool = True) -> dict:
+        translator = watched.translator
+        result = {"path": watched.path, "version": watched.version, "error": watched.error,
+                  "reused": translator.reused, "reparsed": translator.reparsed}
+        if with_code:
+            result["generated"] = translator.generated_code
+            result["optimized"] = translator.optimized_code
+        return result
+
+    def record_latency(self, seconds: float) -> None:
+        self.translations += 1
+        self.latencies.append(seconds)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"translations": 0}
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        return {"translations": self.translations, "files": len(self.files),
+                "p50_ms": percentile(0.5), "p99_ms": percentile(0.99), "max_ms": latencies[-1] * 1000}
+
+    def handle(self, request: dict) -> dict:
+        command = request.get("command")
+        match command:
+            case "watch":
+                response = self.describe(self.watch(request["path"]), request.get("code", True))
+            case "unwatch":
+                response = {"removed": self.unwatch(request["path"])}
+            case "get":
+                watched = self.files.get(os.path.abspath(request["path"]))
+                if watched is None:
+                    raise KeyError(f"{request['path']} is not watched")
+                self.refresh(watched)
+                response = self.describe(watched, request.get("code", True))
+            case "translate":
+                # исходник прямо в запросе, например несохранённый буфер редактора
+                watched = self.watch(request["path"]) if "path" in request else None
+                translator = watched.translator if watched is not None else IncrementalTranslator(self.lexer_engine)
+                start = time.perf_counter()
+                SYMBOLS.trim()
+                translator.update(request["source"])
+                self.record_latency(time.perf_counter() - start)
+                response = {"generated": translator.generated_code, "optimized": translator.optimized_code,
+                            "reused": translator.reused, "reparsed": translator.reparsed}
+            case "stats":
+                response = self.stats()
+            case "shutdown":
+                self.running = False
+                response = {}
+            case _:
+                raise ValueError(f"unknown command {command!r}")
+        response["ok"] = True
+        return response
+
+    def serve(self, in_file, out_file) -> None:
+        # stdin читается в отдельном потоке, чтобы между запросами можно было опрашивать файлы
+        requests = queue.Queue()
+
+        def read_requests():
+            for line in in_file:
+                requests.put(line)
+            requests.put(None)
+
+        def send(message: dict):
+            out_file.write(json.dumps(message) + "\n")
+            out_file.flush()
+
+        threading.Thread(target=read_requests, daemon=True).start()
+        self.running = True
+        while self.running:
+            try:
+                line = requests.get(timeout=self.poll_interval)
+            except queue.Empty:
+                line = ""
+            if line is None:
+                break
+            if line.strip():
+                request = {}
+                try:
+                    request = json.loads(line)
+                    response = self.handle(request)
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                if "id" in request:
+                    response["id"] = request["id"]
+                send(response)
+            for watched in self.poll():
+                send({"event": "changed", **self.describe(watched, with_code=False)})
@@ -0,0 +1,381 @@
+from __future__ import annotations
+import mmap
+import struct
+import sys
+from array import array
+import Nodes
+from Nodes import Node, NodeProgram
+from Token import Token, TokenInfo
+
+MAGIC = b"ASTB"
+FORMAT_VERSION = 1
+
+# заголовок: сигнатура, версия, число видов узлов, число строк, число токенов, слов в таблице списков,
+# слов в записях узлов, номер слова корня; за ним таблица видов, строки и выровненные по 4 байта массивы u32
+HEADER = struct.Struct("<4sHHIIIII")
+KIND_NAME = struct.Struct("<H")
+
+# слово поля: два старших бита - метка, остальные - смещение записи узла, списка или номер токена
+TAG_SHIFT = 30
+INDEX_MASK = (1 << TAG_SHIFT) - 1
+TAG_NODE, TAG_LIST, TAG_TOKEN, TAG_NONE = range(4)
+NONE_WORD = TAG_NONE << TAG_SHIFT
+
+
+def _words(data, offset: int, count: int):
+    """count слов u32 с offset: без копирования, если порядок байт машины совпадает с форматом"""
+    if count == 0:
+        return array("I")
+    if sys.byteorder == "little":
+        return memoryview(data)[offset:offset + 4 * count].cast("I")
+    words = array("I", bytes(data[offset:offset + 4 * count]))
+    words.byteswap()
+    return words
+
+
+class TreeWriter:
+    """
+        Компактный двоичный формат дерева:
+        - таблица видов: имена классов узлов, вид узла - индекс в ней;
+        - таблица строк: значения и виды токенов, каждая строка хранится один раз;
+        - таблица токенов: номер строки вида, номер строки значения, строка и позиция;
+        - таблица списков: длина и смещения записей элементов;
+        - записи узлов: вид, затем по слову на поле из Node._fields.
+        Все таблицы, кроме строк, - массивы u32, которые читаются без разбора по полям.
+        Записи пишутся детьми вперёд, поэтому смещение ребёнка всегда меньше смещения родителя.
+        Общий экземпляр узла (после ExpressionInterner) и одинаковые токены записываются один раз
+    """
+    def __init__(self) -> None:
+        self.kinds: dict[type, int] = {}
+        self.strings: dict[str, int] = {}
+        self.tokens: dict[tuple[int, int, int, int], int] = {}
+        self.lists = array("I")
+        self.records = array("I")
+        self.offsets: dict[int, int] = {}  # id узла: смещение его записи
+
+    def __kind(self, cls: type) -> int:
+        kind = self.kinds.get(cls)
+        if kind is None:
+            kind = self.kinds[cls] = len(self.kinds)
+        return kind
+
+    def __string(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def __token(self, token: Token) -> int:
+        key = (self.__string(token.token.name), self.__string(token.value), token.lineno, token.pos)
+        index = self.tokens.get(key)
+        if index is None:
+            index = self.tokens[key] = len(self.tokens)
+        return index
+
+    def write(self, tree: Node) -> bytes:
+        records = self.records
+        lists = self.lists
+        offsets = self.offsets
+        for node in tree.walk_postorder():
+            if id(node) in offsets:
+                continue
+            offsets[id(node)] = len(records)
+            records.append(self.__kind(node.__class__))
+            for name in node._fields:
+                attr = getattr(node, name)
+                if attr is None:
+                    records.append(NONE_WORD)
+                elif attr.__class__ is list:
+                    records.append(TAG_LIST << TAG_SHIFT | len(lists))
+                    lists.append(len(attr))
+                    lists.extend(offsets[id(child)] for child in attr)
+                elif isinstance(attr, Token):
+                    records.append(TAG_TOKEN << TAG_SHIFT | self.__token(attr))
+                else:
+                    records.append(TAG_NODE << TAG_SHIFT | offsets[id(attr)])
+        if len(records) > INDEX_MASK or len(lists) > INDEX_MASK:
+            raise ValueError("tree is too large for the binary format")
+        return self.__assemble(offsets[id(tree)])
+
+    def __assemble(self, root: int) -> bytes:
+        parts = []
+        for cls in self.kinds:
+            name = cls.__name__.encode()
+            parts.append(KIND_NAME.pack(len(name)) + name)
+        encoded = [value.encode() for value in self.strings]
+        # смещения строк в блоке, последнее - конец блока
+        string_offsets = array("I", [0])
+        for value in encoded:
+            string_offsets.append(string_offsets[-1] + len(value))
+        tokens = array("I")
+        for key in self.tokens:
+            tokens.extend(key)
+        words = [string_offsets, tokens, self.lists, self.records]
+        if sys.byteorder != "little":
+            for table in words:
+                table.byteswap()
+        parts.append(b"".join(encoded))
+        size = HEADER.size + sum(map(len, parts))
+        parts.append(bytes(-size % 4))
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, len(self.kinds), len(encoded), len(self.tokens),
+                             len(self.lists), len(self.records), root)
+        # строки декодируются по смещениям, поэтому таблица смещений идёт после блока строк
+        return b"".join([header, *parts, *(table.tobytes() for table in words)])
+
+
+def dumps_tree(tree: Node) -> bytes:
+    return TreeWriter().write(tree)
+
+
+def dump_tree(tree: Node, file) -> None:
+    file.write(dumps_tree(tree))
+
+
+class MappedTree:
+    """
+        Чтение дерева из формата TreeWriter. Узлы строятся при обращении и кешируются:
+        tree[i] разбирает только i-й верхнеуровневый оператор NodeProgram, строки и токены
+        декодируются по мере надобности. open отображает файл в память через mmap.
+        Обрезанный или испорченный файл даёт ValueError - при разборе заголовка или при построении узлов
+    """
+    def __init__(self, data) -> None:
+        self.data = data
+        self._file = None
+        self.string_offsets = self.token_words = self.lists = self.records = None
+        try:
+            self.__read_sections(data)
+        except BaseException as e:
+            # представления таблиц держат буфер data: пока они живы, mmap не закрыть
+            self.__release()
+            if isinstance(e, (struct.error, LookupError)):
+                raise ValueError("corrupt tree file") from e
+            raise
+
+    def __read_sections(self, data) -> None:
+        magic, version, kinds_count, strings_count, tokens_count, lists_count, records_count, \
+            self.root = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a tree file of this translator version")
+        self.kinds = []
+        offset = HEADER.size
+        for _ in range(kinds_count):
+            length, = KIND_NAME.unpack_from(data, offset)
+            if offset + 2 + length > len(data):
+                raise ValueError("truncated tree file")
+            name = bytes(data[offset + 2:offset + 2 + length]).decode()
+            cls = getattr(Nodes, name, None)
+            if not isinstance(cls, type) or not issubclass(cls, Node):
+                raise ValueError(f"unknown node kind {name}")
+            self.kinds.append(cls)
+            offset += 2 + length
+        self.strings_base = offset
+        tables_start = len(data) - 4 * (strings_count + 1 + 4 * tokens_count + lists_count + records_count)
+        if tables_start < offset:
+            raise ValueError("truncated tree file")
+        words_offset = tables_start
+        self.string_offsets = _words(data, words_offset, strings_count + 1)
+        words_offset += 4 * (strings_count + 1)
+        self.token_words = _words(data, words_offset, 4 * tokens_count)
+        words_offset += 16 * tokens_count
+        self.lists = _words(data, words_offset, lists_count)
+        words_offset += 4 * lists_count
+        self.records = _words(data, words_offset, records_count)
+        if self.string_offsets[0] != 0 or self.strings_base + self.string_offsets[-1] > tables_start:
+            raise ValueError("corrupt tree file: strings overlap tables")
+        if records_count and (self.root >= records_count or self.records[self.root] >= kinds_count):
+            raise ValueError("corrupt tree file: bad root record")
+        self.strings: list[str | None] = [None] * strings_count
+        self.tokens: list[Token | None] = [None] * tokens_count
+        self.nodes: dict[int, Node] = {}  # смещение записи: построенный узел
+        self.statements = []               # смещения верхнеуровневых операторов
+        if records_count and self.kinds[self.records[self.root]] is NodeProgram:
+            children = self.records[self.root + 1]
+            if children >> TAG_SHIFT == TAG_LIST:
+                start = children & INDEX_MASK
+                self.statements = self.lists[start + 1:start + 1 + self.lists[start]].tolist()
+
+    @classmethod
+    def open(cls, path: str) -> MappedTree:
+        file = open(path, "rb")
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # пустой файл не отображается
+            file.close()
+            raise ValueError("truncated tree file") from None
+        try:
+            tree = cls(data)
+        except BaseException:
+            try:
+                data.close()
+            finally:
+                file.close()
+            raise
+        tree._file = file
+        return tree
+
+    def __release(self) -> None:
+        for table in (self.string_offsets, self.token_words, self.lists, self.records):
+            if isinstance(table, memoryview):
+                table.release()
+
+    def close(self) -> None:
+        """Освобождает отображение; уже построенные узлы от файла не зависят"""
+        if self._file is not None:
+            self.__release()
+            try:
+                self.data.close()
+            finally:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> MappedTree:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def __getitem__(self, index: int) -> Node:
+        return self.node(self.statements[index])
+
+    def __iter__(self):
+        for offset in self.statements:
+            yield self.node(offset)
+
+    def string(self, index: int) -> str:
+        value = self.strings[index]
+        if value is None:
+            start = self.strings_base + self.string_offsets[index]
+            end = self.strings_base + self.string_offsets[index + 1]
+            value = self.strings[index] = bytes(self.data[start:end]).decode()
+        return value
+
+    def token(self, index: int) -> Token:
+        token = self.tokens[index]
+        if token is None:
+            kind, value, lineno, pos = self.token_words[4 * index:4 * index + 4]
+            token = self.tokens[index] = Token(TokenInfo[self.string(kind)], self.string(value), lineno, pos)
+        return token
+
+    def tree(self) -> Node:
+        """Всё дерево; узлы, прочитанные раньше, используются готовыми"""
+        if not self.nodes:
+            try:
+                self.__build_all()
+            except LookupError as e:
+                raise ValueError("corrupt tree file") from e
+        return self.node(self.root)
+
+    def node(self, offset: int) -> Node:
+        nodes = self.nodes
+        if offset not in nodes:
+            # смещения детей меньше смещения родителя: по возрастанию смещений каждый узел строится после детей
+            try:
+                self.__build(sorted(self.__subtree(offset)))
+            except LookupError as e:
+                raise ValueError("corrupt tree file") from e
+        return nodes[offset]
+
+    def __build_all(self) -> None:
+        """Все записи подряд: таблицы копируются в списки целиком, токены строятся одним проходом"""
+        records = self.records.tolist()
+        lists = self.lists.tolist()
+        kinds = [(cls, cls._fields) for cls in self.kinds]
+        tokens = self.__all_tokens()
+        nodes = self.nodes
+        new = object.__new__
+        position = 0
+        end = len(records)
+        while position < end:
+            offset = position
+            cls, fields = kinds[records[position]]
+            node = new(cls)
+            for name in fields:
+                position += 1
+                word = records[position]
+                tag = word >> TAG_SHIFT
+                if tag == TAG_NODE:
+                    value = nodes[word]
+                elif tag == TAG_LIST:
+                    start = word & INDEX_MASK
+                    value = [nodes[child] for child in lists[start + 1:start + 1 + lists[start]]]
+                elif tag == TAG_TOKEN:
+                    value = tokens[word & INDEX_MASK]
+                else:
+                    value = None
+                setattr(node, name, value)
+            nodes[offset] = node
+            position += 1
+
+    def __all_tokens(self) -> list[Token]:
+        """Все токены разом: строки декодируются по одному разу, вид токена ищется один раз на вид"""
+        offsets = self.string_offsets.tolist()
+        start = self.strings_base
+        block = bytes(self.data[start:start + offsets[-1]])
+        strings = self.strings = [block[begin:end].decode() for begin, end in zip(offsets, offsets[1:])]
+        words = self.token_words.tolist()
+        kinds = words[0::4]
+        token_kinds = {kind: TokenInfo[strings[kind]] for kind in set(kinds)}
+        tokens = self.tokens = list(map(Token, map(token_kinds.__getitem__, kinds), map(strings.__getitem__, words[1::4]),
+                                        words[2::4], words[3::4]))
+        return tokens
+
+    def __subtree(self, offset: int) -> set[int]:
+        """Смещения ещё не построенных записей поддерева"""
+        records = self.records
+        lists = self.lists
+        nodes = self.nodes
+        found = set()
+        stack = [offset]
+        while stack:
+            current = stack.pop()
+            if current in found or current in nodes:
+                continue
+            found.add(current)
+            for word in records[current + 1:current + 1 + len(self.kinds[records[current]]._fields)]:
+                tag = word >> TAG_SHIFT
+                if tag == TAG_NODE:
+                    stack.append(word)
+                elif tag == TAG_LIST:
+                    start = word & INDEX_MASK
+                    stack += lists[start + 1:start + 1 + lists[start]]
+        return found
+
+    def __build(self, offsets) -> None:
+        """Строит записи, начинающиеся с данных смещений; offsets - по возрастанию"""
+        records = self.records
+        lists = self.lists
+        nodes = self.nodes
+        kinds = self.kinds
+        new = object.__new__
+        for offset in offsets:
+            cls = kinds[records[offset]]
+            node = new(cls)
+            position = offset
+            for name in cls._fields:
+                position += 1
+                word = records[position]
+                tag = word >> TAG_SHIFT
+                if tag == TAG_NODE:
+                    value = nodes[word]
+                elif tag == TAG_LIST:
+                    start = word & INDEX_MASK
+                    value = [nodes[child] for child in lists[start + 1:start + 1 + lists[start]]]
+                elif tag == TAG_TOKEN:
+                    value = self.token(word & INDEX_MASK)
+                else:
+                    value = None
+                setattr(node, name, value)
+            nodes[offset] = node
+
+
+def loads_tree(data: bytes) -> Node:
+    return MappedTree(data).tree()
+
+
+def load_tree(path: str) -> Node:
+    with MappedTree.open(path) as tree:
+        return tree.tree()
@@ -0,0 +1,64 @@
+"""
+    Масштабирование DeadStoreEliminator: построение графа, живость и удаление на входах, удваивающихся
+    от 12 500 до 50 000 конструкций. Каждая конструкция объявляет свою переменную в своём блоке - при
+    масках по всем переменным программы живость росла бы квадратично; при удвоении входа время должно
+    расти примерно вдвое. Тем же удвоением проверяется LoopOptimizer на результате: тела циклов
+    пусты, выносить нечего, и проход не должен делать работу сверх одного обхода дерева.
+    Сборщик мусора на время замера выключен: полные сборки обходят всю кучу,
+    включая дерево, и их время растёт с размером процесса, а не прохода.
+
+    python -m benchmarks.bench_dead_stores
+"""
+import gc
+import io
+import time
+from Lexer import BufferedLexer
+from Parser import Parser
+from DeadStoreEliminator import DeadStoreEliminator
+from LoopOptimizer import LoopOptimizer
+from benchmarks.common import ROUNDS, check_doubling
+from benchmarks.bench_exclusion import dead_constructions_source
+
+SIZES = (12_500, 25_000, 50_000)
+
+
+def best_time(make_pass, run) -> tuple[float, object, object]:
+    """Лучшее из ROUNDS время run(проход) на новом проходе make_pass(), последний проход и его результат"""
+    best = used = None
+    for _ in range(ROUNDS):
+        gc.collect()
+        gc.disable()
+        try:
+            used = make_pass()
+            start = time.perf_counter()
+            result = run(used)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, used, result
+
+
+def main():
+    timings = []
+    loop_timings = []
+    for count in SIZES:
+        tree = Parser(BufferedLexer(io.StringIO(dead_constructions_source(count)))).parse()
+        elapsed, eliminator, stripped = best_time(DeadStoreEliminator, lambda eliminator: eliminator.eliminate(tree))
+        # по объявлению в каждом блоке: у if/else (чётные конструкции) их два
+        expected = count + (count + 1) // 2
+        if eliminator.removed != expected:
+            raise AssertionError(f"expected {expected} removed declarations, got {eliminator.removed}")
+        loops_elapsed, loops, _ = best_time(LoopOptimizer, lambda loops: loops.optimize(stripped))
+        if loops.hoisted or loops.reduced:
+            raise AssertionError(f"empty loops changed: {loops.hoisted} hoisted, {loops.reduced} reduced")
+        timings.append(elapsed)
+        loop_timings.append(loops_elapsed)
+        print(f"{count:>7} constructions {eliminator.removed:>7} removed {elapsed * 1000:>8.1f} ms "
+              f"{elapsed / count * 1e6:>6.2f} us/construction, loops {loops_elapsed * 1000:>6.1f} ms")
+    check_doubling("dead stores", SIZES, timings)
+    check_doubling("loops", SIZES, loop_timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+    Масштабирование исключения узлов (OptimizeCode.optimize и NodeSet) и генерации кода с исключениями
+    на программах из N конструкций, блоки которых пустеют после удаления мёртвых объявлений (до 50 000).
+    Каждая конструкция должна попасть в исключённые. Исключение и генерация замеряются отдельно от
+    остальных проходов OptimizeCode (лучшее из ROUNDS, сборщик мусора выключен - см. bench_dead_stores);
+    при удвоении N их время должно расти примерно вдвое, иначе бенчмарк падает.
+
+    python -m benchmarks.bench_exclusion
+"""
+import gc
+import io
+import time
+from Lexer import BufferedLexer
+from Nodes import NodeSet
+from OptimizeCode import OptimizeCode
+from Parser import Parser
+from SemanticAnalyzer import SemanticAnalyzer
+from benchmarks.common import ROUNDS, check_doubling
+
+SIZES = (6_250, 12_500, 25_000, 50_000)
+
+
+def dead_constructions_source(count: int) -> str:
+    """if/else и while с одними мёртвыми объявлениями: после DeadStoreEliminator их блоки пусты"""
+    lines = ["int x = 0;"]
+    for i in range(count):
+        if i % 2:
+            lines.append(f"while (x > {i}) {{ int dead{i} = x; }}")
+        else:
+            lines.append(f"if (x < {i}) {{ int dead{i} = {i}; }} else {{ int other{i} = x; }}")
+    lines.append("Console.Write(x);")
+    return "\n".join(lines)
+
+
+def exclusion_times(optimizer: OptimizeCode) -> tuple[float, float]:
+    """Лучшее время прохода исключения по уже оптимизированному дереву и генерации кода с исключениями"""
+    best_exclusion = best_generate = None
+    for _ in range(ROUNDS):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            optimizer.unnessessary_nodes = NodeSet()
+            optimizer.optimize(optimizer.tree)
+            excluded = time.perf_counter()
+            optimizer.write(io.StringIO())
+            generated = time.perf_counter()
+        finally:
+            gc.enable()
+        exclusion, generate = excluded - start, generated - excluded
+        best_exclusion = exclusion if best_exclusion is None else min(best_exclusion, exclusion)
+        best_generate = generate if best_generate is None else min(best_generate, generate)
+    return best_exclusion, best_generate
+
+
+def main():
+    timings = []
+    for count in SIZES:
+        tree = Parser(BufferedLexer(io.StringIO(dead_constructions_source(count)))).parse()
+        scope = SemanticAnalyzer().analyze(tree)
+
+        start = time.perf_counter()
+        optimizer = OptimizeCode(scope, tree)
+        optimized = time.perf_counter() - start
+        exclusion, generate = exclusion_times(optimizer)
+        timings.append(exclusion + generate)
+
+        excluded = len(optimizer.unnessessary_nodes)
+        if excluded != count:
+            raise AssertionError(f"expected {count} excluded constructions, got {excluded}")
+        print(f"{count:>7} constructions {excluded:>7} excluded "
+              f"optimize {optimized * 1000:>8.1f} ms "
+              f"exclusion {exclusion * 1000:>7.1f} ms "
+              f"generate {generate * 1000:>7.1f} ms "
+              f"{(exclusion + generate) / count * 1e6:>6.2f} us/construction")
+    check_doubling("exclusion and codegen", SIZES, timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+    Свёртка констант на длинных цепочках + и *: время должно расти линейно с длиной.
+
+    python -m benchmarks.bench_folding
+"""
+import io
+import time
+from Lexer import BufferedLexer
+from Parser import Parser
+from CodeGenerator import CodeGenerator
+from ConstantFolder import ConstantFolder
+
+LENGTHS = (1_000, 10_000, 100_000)
+
+
+def constant_chain(length: int) -> str:
+    terms = " + ".join(f"{i % 7} * {i % 5 + 1}" for i in range(length))
+    return f"int total = {terms};\n"
+
+
+def mixed_chain(length: int) -> str:
+    """Константы вперемешку с переменной: сворачиваются x*1, x+0 и соседние константы"""
+    terms = " + ".join(f"x * 1 + {i % 3}" if i % 2 else "0" for i in range(length))
+    return f"int x = 5;\nint total = {terms};\n"
+
+
+def main():
+    for name, generator in (("constant", constant_chain), ("mixed", mixed_chain)):
+        for length in LENGTHS:
+            tree = Parser(BufferedLexer(io.StringIO(generator(length)))).parse()
+            before = len(str(CodeGenerator(tree)))
+            folder = ConstantFolder()
+            start = time.perf_counter()
+            folded = folder.fold(tree)
+            elapsed = time.perf_counter() - start
+            after = len(str(CodeGenerator(folded)))
+            print(f"{name:<9} {length:>7} terms {elapsed * 1000:>9.1f} ms {elapsed / length * 1e6:>6.2f} us/term "
+                  f"{folder.folded:>7} folds  code {before:>8} -> {after:>8} chars")
+
+
+if __name__ == "__main__":
+    main()
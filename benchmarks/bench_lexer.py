@@ -0,0 +1,50 @@
+"""
+    Регрессионный бенчмарк лексера на входах, которые раньше упирались в предел рекурсии:
+    100 000 пустых строк и комментарий /* */ размером в несколько мегабайт.
+
+    python -m benchmarks.bench_lexer
+"""
+import io
+import sys
+import time
+from Lexer import LEXER_ENGINES
+
+BLANK_LINES = 100_000
+COMMENT_SIZE = 4 * 1024 * 1024
+
+
+def blank_lines_source() -> str:
+    return "int a = 1;" + "\n" * BLANK_LINES + "int b = a;\n"
+
+
+def comment_block_source() -> str:
+    line = " * Licensed under the Apache License, Version 2.0\n"
+    body = line * (COMMENT_SIZE // len(line))
+    return "/*\n" + body + " */\nint a = 1;\n"
+
+
+def run(engine: str, source: str) -> tuple[float, list]:
+    lexer = LEXER_ENGINES[engine](io.StringIO(source))
+    start = time.perf_counter()
+    tokens = lexer.get_all_tokens()
+    return time.perf_counter() - start, tokens
+
+
+def main():
+    inputs = {
+        "blank lines": blank_lines_source(),
+        "comment block": comment_block_source(),
+    }
+    for name, source in inputs.items():
+        reference = None
+        for engine in LEXER_ENGINES:
+            elapsed, tokens = run(engine, source)
+            if reference is None:
+                reference = [repr(token) for token in tokens]
+            elif reference != [repr(token) for token in tokens]:
+                sys.exit(f"{name}: token stream of '{engine}' differs")
+            print(f"{name:<15} {engine:<10} {len(source) / 1024:>9.0f} KiB {elapsed:>8.3f} s {len(tokens):>4} tokens")
+
+
+if __name__ == "__main__":
+    main()
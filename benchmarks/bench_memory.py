@@ -0,0 +1,66 @@
+"""
+    Замер памяти, занимаемой токенами и синтаксическим деревом, через tracemalloc.
+    Строка interned - то же дерево после ExpressionInterner: повторяющиеся выражения общие.
+
+    python -m benchmarks.bench_memory [повторов file.txt]
+"""
+import io
+import sys
+import tracemalloc
+from Lexer import BufferedLexer
+from Parser import Parser
+from ExpressionInterner import ExpressionInterner
+
+INPUT_PATH = "file.txt"
+ENCODING = "utf-8"
+
+
+def count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.get_children())
+    return count
+
+
+def count_distinct_nodes(node) -> int:
+    seen = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(node.get_children())
+    return len(seen)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with open(INPUT_PATH, "r", encoding=ENCODING) as in_file:
+        source = in_file.read() * repeats
+
+    tracemalloc.start()
+    tokens = BufferedLexer(io.StringIO(source)).get_all_tokens()
+    tokens_memory, _ = tracemalloc.get_traced_memory()
+    tree = Parser(tokens).parse()
+    total_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = count_nodes(tree)
+    del tree
+    tracemalloc.start()
+    # исходное дерево освобождается сразу после интернирования - остаётся только общее
+    interned = ExpressionInterner().intern(Parser(tokens).parse())
+    interned_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    distinct = count_distinct_nodes(interned)
+
+    print(f"tokens: {len(tokens):>8} {tokens_memory / 2**20:>8.2f} MiB {tokens_memory / len(tokens):>6.1f} B/token")
+    print(f"nodes:  {nodes:>8} {(total_memory - tokens_memory) / 2**20:>8.2f} MiB {(total_memory - tokens_memory) / nodes:>6.1f} B/node")
+    print(f"interned: {distinct:>6} {interned_memory / 2**20:>8.2f} MiB {interned_memory / nodes:>6.1f} B/node")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+    Стресс-тест вложенности операторов: if/while/for/функции на 10 000 уровней.
+    Рекурсивный Parser на такой глубине падает с RecursionError, IterativeParser разбирает без рекурсии.
+    На глубине, которую выдерживает рекурсия, деревья обоих парсеров сравниваются по узлам и токенам;
+    на полном уровне проверяется глубина построенного дерева.
+
+    python -m benchmarks.bench_nesting [depth]
+"""
+import io
+import sys
+import time
+from Lexer import BufferedLexer
+from Nodes import NodeBlock
+from Parser import Parser, IterativeParser
+from benchmarks.common import same_tree
+from benchmarks.generators import nested_constructions
+
+DEPTH = 10_000
+CHECKED_DEPTH = 200
+
+
+def nested_source(depth: int) -> str:
+    lines = ["int counter = 0;"]
+    for level in range(depth):
+        match level % 4:
+            case 0:
+                lines.append(f"if (counter < {level}) {{")
+            case 1:
+                lines.append(f"while (counter < {level}) {{ counter = counter + 1;")
+            case 2:
+                lines.append(f"for (int i{level} = 0; i{level} < 2; i{level} = i{level} + 1) {{")
+            case 3:
+                lines.append(f"int f{level}(int a) {{ break;")
+    lines.append("counter = counter + 1;")
+    for level in reversed(range(depth)):
+        lines.append("} else { counter = 0; }" if level % 4 == 0 else "}")
+    return "\n".join(lines) + "\n"
+
+
+def block_depth(tree) -> int:
+    """Число вложенных NodeBlock на самом глубоком пути - без рекурсии"""
+    deepest = 0
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if isinstance(node, NodeBlock):
+            depth += 1
+            deepest = max(deepest, depth)
+        stack += ((child, depth) for child in node.get_children())
+    return deepest
+
+
+def parse(parser_class, source: str):
+    tokens = BufferedLexer(io.StringIO(source)).get_all_tokens()
+    start = time.perf_counter()
+    tree = parser_class(tokens).parse()
+    return time.perf_counter() - start, tree
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else DEPTH
+    checked = nested_source(CHECKED_DEPTH)
+    if not same_tree(parse(Parser, checked)[1], parse(IterativeParser, checked)[1]):
+        raise AssertionError(f"trees differ at depth {CHECKED_DEPTH}")
+
+    source = nested_source(depth)
+    try:
+        elapsed, _ = parse(Parser, source)
+        print(f"recursive  depth {depth}: {elapsed * 1000:.1f} ms")
+    except RecursionError:
+        print(f"recursive  depth {depth}: RecursionError")
+    elapsed, tree = parse(IterativeParser, source)
+    if block_depth(tree) != depth:
+        raise AssertionError(f"expected {depth} nested blocks, got {block_depth(tree)}")
+    print(f"iterative  depth {depth}: {elapsed * 1000:.1f} ms")
+
+    # обычная вложенность: цена явного стека против рекурсивного спуска
+    source = nested_constructions(3000)
+    for parser_class in (Parser, IterativeParser):
+        best = min(parse(parser_class, source)[0] for _ in range(3))
+        print(f"{parser_class.__name__:<16} nested_constructions: {best * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+    Сохранение и загрузка дерева: двоичный формат TreeSerializer против pickle.
+    Перед замером каждое дерево проходит круг dumps_tree -> loads_tree и сравнивается с исходным
+    по классам узлов, токенам и их позициям; ленивая загрузка MappedTree проверяется по операторам.
+    Загрузку заменяет повторный разбор исходника (столбец parse); с pickle.loads она сравнима, зато файл
+    меньше, первый оператор читается без разбора остального, а дерево с глубокой вложенностью, на котором
+    pickle падает с RecursionError (строка deep_nesting), сохраняется и читается без рекурсии.
+
+    python -m benchmarks.bench_serialization [scale]
+"""
+import io
+import os
+import pickle
+import sys
+import tempfile
+from Lexer import BufferedLexer
+from Nodes import Node
+from Parser import Parser, IterativeParser
+from TreeSerializer import MappedTree, dumps_tree, loads_tree
+from ExpressionInterner import ExpressionInterner
+from benchmarks.common import best_time, same_tree
+from benchmarks.bench_nesting import nested_source
+from benchmarks.generators import GENERATORS
+
+DEEP_NESTING = 2000
+
+
+def check_round_trip(name: str, tree: Node) -> None:
+    if not same_tree(tree, loads_tree(dumps_tree(tree))):
+        raise AssertionError(f"{name}: tree changed after round trip")
+    interned = ExpressionInterner().intern(tree)
+    if not same_tree(interned, loads_tree(dumps_tree(interned))):
+        raise AssertionError(f"{name}: interned tree changed after round trip")
+    fd, path = tempfile.mkstemp(suffix=".tree")
+    try:
+        with os.fdopen(fd, "wb") as tree_file:
+            tree_file.write(dumps_tree(tree))
+        with MappedTree.open(path) as mapped:
+            for index in reversed(range(len(mapped))):
+                if not same_tree(tree.children[index], mapped[index]):
+                    raise AssertionError(f"{name}: statement {index} changed after lazy load")
+    finally:
+        os.unlink(path)
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'input':<22} {'binary':>9} {'pickle':>9}  {'parse':>8} {'dump':>8} {'load':>8} {'pickle':>8} "
+          f"{'first stmt':>10}")
+    inputs = [(name, Parser, generator(scale)) for name, generator in GENERATORS.items()]
+    inputs.append(("deep_nesting", IterativeParser, nested_source(DEEP_NESTING)))
+    for name, parser_class, source in inputs:
+        tree = parser_class(BufferedLexer(io.StringIO(source))).parse()
+        check_round_trip(name, tree)
+        binary = dumps_tree(tree)
+        try:
+            pickled = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            pickled = None
+        parse = best_time(lambda: parser_class(BufferedLexer(io.StringIO(source))).parse())
+        dump = best_time(lambda: dumps_tree(tree))
+        load = best_time(lambda: loads_tree(binary))
+        lazy = best_time(lambda: MappedTree(binary)[0])
+        if pickled is not None:
+            pickle_size = f"{len(pickled) / 1024:>7.0f} K"
+            pickle_load = f"{best_time(lambda: pickle.loads(pickled)) * 1000:>5.1f} ms"
+        else:
+            pickle_size = pickle_load = f"{'-':>8}"
+        print(f"{name:<22} {len(binary) / 1024:>7.0f} K {pickle_size}  {parse * 1000:>5.1f} ms {dump * 1000:>5.1f} ms "
+              f"{load * 1000:>5.1f} ms "
+              f"{pickle_load} {lazy * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+    Выгрузка токенов: print по токену против write_tokens в форматах text, jsonl и binary.
+    Перед замером каждый формат проходит круг write_tokens -> read_tokens и сравнивается с исходным потоком;
+    text сверяется байт в байт с выводом print.
+
+    python -m benchmarks.bench_token_export [scale]
+"""
+import io
+import sys
+from Lexer import BufferedLexer
+from TokenExport import TOKEN_FORMATS, read_tokens, write_tokens
+from benchmarks.common import best_time
+from benchmarks.generators import GENERATORS
+
+
+def print_tokens(tokens, file) -> None:
+    for token in tokens:
+        print(token, file=file)
+
+
+def new_file(format: str):
+    return io.BytesIO() if format == "binary" else io.StringIO()
+
+
+def check_round_trip(name: str, tokens) -> None:
+    printed = io.StringIO()
+    print_tokens(tokens, printed)
+    for format in TOKEN_FORMATS:
+        file = new_file(format)
+        write_tokens(tokens, file, format)
+        if format == "text" and file.getvalue() != printed.getvalue():
+            raise AssertionError(f"{name}: text output differs from print")
+        file.seek(0)
+        loaded = list(read_tokens(file, format))
+        with_positions = format != "text"
+        if len(loaded) != len(tokens) or any(
+                expected.token is not actual.token or expected.value != actual.value or
+                with_positions and (expected.lineno, expected.pos) != (actual.lineno, actual.pos)
+                for expected, actual in zip(tokens, loaded)):
+            raise AssertionError(f"{name}: {format} tokens changed after round trip")
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'input':<22} {'tokens':>8} {'print':>9}" + "".join(f" {format:>9}" for format in TOKEN_FORMATS) +
+          f" {'read bin':>9}")
+    for name, generator in GENERATORS.items():
+        tokens = BufferedLexer(io.StringIO(generator(scale))).get_all_tokens()
+        check_round_trip(name, tokens)
+        line = f"{name:<22} {len(tokens):>8} {best_time(lambda: print_tokens(tokens, io.StringIO())) * 1000:>6.1f} ms"
+        for format in TOKEN_FORMATS:
+            line += f" {best_time(lambda: write_tokens(tokens, new_file(format), format)) * 1000:>6.1f} ms"
+        binary = io.BytesIO()
+        write_tokens(tokens, binary, "binary")
+        data = binary.getvalue()
+        line += f" {best_time(lambda: list(read_tokens(io.BytesIO(data), 'binary'))) * 1000:>6.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
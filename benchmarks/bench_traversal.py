@@ -0,0 +1,107 @@
+"""
+    Микробенчмарк полного обхода дерева: рефлексивный get_children с рекурсией
+    против таблиц дочерних полей (walk, walk_postorder, NodeVisitor),
+    и дамп дерева: рекурсивный __repr__ со склейкой строк против Node.dump.
+
+    python -m benchmarks.bench_traversal [повторов file.txt]
+"""
+import io
+import sys
+import time
+from Lexer import BufferedLexer
+from Nodes import Node, NodeVisitor
+from Token import Token
+from Parser import Parser
+
+INPUT_PATH = "file.txt"
+ENCODING = "utf-8"
+ROUNDS = 5
+
+
+def reflective_children(node: Node) -> list[Node]:
+    """get_children в том виде, в каком он был до таблиц дочерних полей"""
+    children = []
+    for attr_name in node._fields:
+        attr = getattr(node, attr_name)
+        if isinstance(attr, list):
+            for el in attr:
+                if isinstance(el, Node):
+                    children.append(el)
+        elif isinstance(attr, Node):
+            children.append(attr)
+    return children
+
+
+def reflective_count(node: Node) -> int:
+    count = 1
+    for child in reflective_children(node):
+        count += reflective_count(child)
+    return count
+
+
+class CountingVisitor(NodeVisitor):
+    def __init__(self):
+        self.count = 0
+
+    def visit_Node(self, node, context=None):
+        self.count += 1
+        self.generic_visit(node, context)
+
+
+def visitor_count(node: Node) -> int:
+    visitor = CountingVisitor()
+    visitor.visit(node)
+    return visitor.count
+
+
+def recursive_repr(node: Node, level=0) -> str:
+    """Node.__repr__ в том виде, в каком он был до Node.dump"""
+    res = f"{node.__class__.__name__}\n"
+    for attr_name in node._fields:
+        attr = getattr(node, attr_name)
+        if attr is None:
+            continue
+        res += '|   ' * level
+        res += "|+-"
+        match attr:
+            case Token():
+                res += f"{attr_name}: {attr}\n"
+            case Node():
+                res += f"{attr_name}: {recursive_repr(attr, level + 1)}"
+            case list() as elements:
+                res += f"{attr_name}:\n"
+                for el in elements:
+                    res += '|   ' * (level + 1)
+                    res += "|+-"
+                    res += recursive_repr(el, level + 2)
+    return res
+
+
+def measure(name, function, tree):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        count = function(tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<22} {count:>8} nodes {best * 1000:>9.2f} ms {count / best:>12.0f} nodes/s")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with open(INPUT_PATH, "r", encoding=ENCODING) as in_file:
+        source = in_file.read() * repeats
+    tree = Parser(BufferedLexer(io.StringIO(source))).parse()
+
+    measure("reflective recursion", reflective_count, tree)
+    measure("walk", lambda node: sum(1 for _ in node.walk()), tree)
+    measure("walk_postorder", lambda node: sum(1 for _ in node.walk_postorder()), tree)
+    measure("NodeVisitor", visitor_count, tree)
+
+    nodes = sum(1 for _ in tree.walk())
+    measure("recursive repr", lambda node: len(recursive_repr(node)) and nodes, tree)
+    measure("dump", lambda node: node.dump(io.StringIO()) or nodes, tree)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Общие помощники бенчмарков: замер лучшего времени, проверка роста при удвоении входа и сравнение деревьев"""
+import time
+from Nodes import Node
+from Token import Token
+
+ROUNDS = 3
+# во сколько раз в среднем может расти время при удвоении входа, чтобы рост ещё считался линейным
+DOUBLING_LIMIT = 2.5
+
+
+def best_time(function, rounds: int = ROUNDS) -> float:
+    """Лучшее время function() из rounds запусков, с"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def check_doubling(name: str, sizes, timings) -> None:
+    """
+        Печатает отношения времён соседних размеров (sizes удваиваются) и их среднее геометрическое;
+        по среднему, а не по худшему шагу, чтобы одиночный шумный замер не ронял проверку
+    """
+    ratios = [later / earlier for earlier, later in zip(timings, timings[1:])]
+    mean = (timings[-1] / timings[0]) ** (1 / len(ratios))
+    print(f"{name}: x{' x'.join(f'{ratio:.2f}' for ratio in ratios)} per doubling, mean x{mean:.2f}")
+    if mean > DOUBLING_LIMIT:
+        raise AssertionError(f"{name} grows superlinearly: x{mean:.2f} per doubling of {sizes[0]}..{sizes[-1]}")
+
+
+def same_tree(expected: Node, actual: Node) -> bool:
+    """Деревья совпадают по классам узлов, токенам и их позициям; сравнение без рекурсии"""
+    stack = [(expected, actual)]
+    while stack:
+        expected, actual = stack.pop()
+        if expected.__class__ is not actual.__class__:
+            return False
+        for name in expected._fields:
+            left, right = getattr(expected, name), getattr(actual, name)
+            if isinstance(left, Token):
+                if not isinstance(right, Token) or left.token is not right.token or \
+                        (left.value, left.lineno, left.pos) != (right.value, right.lineno, right.pos):
+                    return False
+            elif left.__class__ is list:
+                if right.__class__ is not list or len(left) != len(right):
+                    return False
+                stack += zip(left, right)
+            elif left is None or right is None:
+                if left is not right:
+                    return False
+            else:
+                stack.append((left, right))
+    return True
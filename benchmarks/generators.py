@@ -0,0 +1,97 @@
+"""
+    Генераторы синтетических исходников в грамматике, которую принимает Parser.
+    Каждый генератор получает scale - примерное число верхнеуровневых операторов
+    и возвращает программу, проходящую все стадии трансляции.
+"""
+
+NESTING_DEPTH = 30
+CHAIN_LENGTH = 100
+
+
+def flat_declarations(scale: int) -> str:
+    """Длинный плоский список объявлений, каждое использует предыдущее"""
+    lines = ["int v0 = 0;"]
+    for i in range(1, scale):
+        lines.append(f"int v{i} = v{i - 1} + {i};")
+    lines.append(f"Console.Write(v{scale - 1});")
+    return "\n".join(lines) + "\n"
+
+
+def nested_constructions(scale: int) -> str:
+    """Глубоко вложенные if/while/for; scale операторов на NESTING_DEPTH уровней"""
+    lines = ["int counter = 0;"]
+    for i in range(max(1, scale // NESTING_DEPTH)):
+        opened = []
+        for depth in range(NESTING_DEPTH):
+            indent = "  " * depth
+            match depth % 3:
+                case 0:
+                    lines.append(f"{indent}if (counter < {i + depth}) {{")
+                case 1:
+                    lines.append(f"{indent}while (counter < {depth}) {{")
+                case 2:
+                    lines.append(f"{indent}for (int i{i}_{depth} = 0; i{i}_{depth} < 3; i{i}_{depth} = i{i}_{depth} + 1) {{")
+            opened.append(indent)
+        lines.append("  " * NESTING_DEPTH + "counter = counter + 1;")
+        lines.extend(indent + "}" for indent in reversed(opened))
+    lines.append("Console.Write(counter);")
+    return "\n".join(lines) + "\n"
+
+
+def operator_chains(scale: int) -> str:
+    """Длинные цепочки + и * в правой части присваиваний"""
+    lines = ["int x = 1;", "int total = 0;"]
+    for i in range(max(1, scale // 10)):
+        terms = " + ".join(f"x * {j + i}" if j % 2 else f"{j + i}" for j in range(CHAIN_LENGTH))
+        lines.append(f"total = {terms};")
+    lines.append("Console.Write(total);")
+    return "\n".join(lines) + "\n"
+
+
+def many_functions(scale: int) -> str:
+    """Много определений функций с небольшими телами и вызовами"""
+    lines = []
+    for i in range(scale // 2):
+        lines.append(f"int function{i}(int a, float b) {{")
+        lines.append(f"  int c = a * {i} + 1;")
+        lines.append(f"  while (c < {i}) {{ c = c + 2; }}")
+        lines.append("  Console.Write(c);")
+        lines.append("}")
+        lines.append(f"function{i}({i});")
+    return "\n".join(lines) + "\n"
+
+
+def comment_heavy(scale: int) -> str:
+    """Операторы тонут в строчных и блочных комментариях"""
+    lines = []
+    for i in range(scale):
+        lines.append(f"// declaration number {i}: the value is kept for later statements")
+        lines.append("/*")
+        lines.append(" * Multi-line commentary that the lexer has to skip entirely,")
+        lines.append(f" * including symbols like {{ }} ; = + which must not produce tokens ({i})")
+        lines.append(" */")
+        lines.append(f"int value{i} = {i}; // trailing comment")
+    return "\n".join(lines) + "\n"
+
+
+def identifier_heavy(scale: int) -> str:
+    """Длинные различающиеся идентификаторы и выражения почти из одних имён"""
+    lines = []
+    for i in range(scale):
+        name = f"a_rather_long_descriptive_identifier_number_{i}"
+        if i < 3:
+            lines.append(f"int {name} = {i};")
+        else:
+            previous = [f"a_rather_long_descriptive_identifier_number_{j}" for j in (i - 1, i - 2, i - 3)]
+            lines.append(f"int {name} = {previous[0]} + {previous[1]} * {previous[2]};")
+    return "\n".join(lines) + "\n"
+
+
+GENERATORS = {
+    "flat_declarations": flat_declarations,
+    "nested_constructions": nested_constructions,
+    "operator_chains": operator_chains,
+    "many_functions": many_functions,
+    "comment_heavy": comment_heavy,
+    "identifier_heavy": identifier_heavy,
+}
@@ -0,0 +1,203 @@
+"""
+    Регрессионные проверки оптимизатора: исходник, строки, которые должны быть в оптимизированном коде,
+    и строки, которых в нём быть не должно. Каждая проверка - исправленная ошибка оптимизации.
+    TREE_CHECKS - формат TreeSerializer: круг dumps_tree -> loads_tree и испорченные файлы кеша,
+    а также записи кеша неверной формы.
+
+    python -m benchmarks.regressions
+"""
+import io
+import os
+import sys
+import tempfile
+from Lexer import BufferedLexer
+from Parser import Parser
+from SemanticAnalyzer import SemanticAnalyzer
+from OptimizeCode import OptimizeCode
+from CompilationCache import CompilationCache
+from CompilationPipeline import CompilationPipeline
+from TreeSerializer import dumps_tree, loads_tree
+from benchmarks.common import same_tree
+from benchmarks.generators import GENERATORS
+
+CASES = [
+    (
+        "cse: guarded division stays behind && and is not hoisted",
+        """
+        int a = 5;
+        int b = 0;
+        bool ok = b != 0 and a / b > 1;
+        bool ok2 = b != 0 and a / b > 2;
+        int g = a / b + 1;
+        int h = a / b + 1;
+        Console.Write(ok);
+        Console.Write(ok2);
+        Console.Write(g + h);
+        """,
+        ["boolean ok = ((b != 0) && ((a / b) > 1));", "boolean ok2 = ((b != 0) && ((a / b) > 2));",
+         "int g = ((a / b) + 1);", "int h = ((a / b) + 1);"],
+        ["cse"],
+    ),
+    (
+        "dead branches: for with a false condition keeps an init with calls",
+        """
+        int f(int x) { Console.Write(x); }
+        int a = 0;
+        for (f(1); false; f(2)) { a = 1; }
+        for (int i = f(5); false; i = i + 1) { a = 2; }
+        for (int j = 0; false; j = j + 1) { a = 3; }
+        Console.Write(a);
+        """,
+        ["f(1);", "int i = f(5);"],
+        ["f(2)", "int j"],
+    ),
+    (
+        "folding: leading-zero literals are octal as in C and Java",
+        """
+        int a = 010 + 1;
+        int s = 0;
+        for (int i = 0; i < 3; i = i + 1) { s = s + i * 010; }
+        Console.Write(a + s);
+        """,
+        ["int a = 9;", "(ind0 + 8)"],
+        ["int a = 11;", "(ind0 + 10)"],
+    ),
+    (
+        "dead stores: an overwritten division that may throw is kept",
+        """
+        int a = 0;
+        int b = 2;
+        b = 1 / a;
+        b = 3;
+        int c = 4 / a;
+        c = 5;
+        Console.Write(b + c);
+        """,
+        ["b = (1 / a);", "int c = (4 / a);"],
+        ["int c;"],
+    ),
+]
+
+
+def optimize(source: str) -> str:
+    tree = Parser(BufferedLexer(io.StringIO(source))).parse()
+    return str(OptimizeCode(SemanticAnalyzer().analyze(tree), tree))
+
+
+def parse(source: str):
+    return Parser(BufferedLexer(io.StringIO(source))).parse()
+
+
+def corrupted(data: bytes):
+    """Обрезанные копии и копии с одним испорченным байтом"""
+    for cut in (1, 3, len(data) // 2, len(data) - 1):
+        yield data[:-cut]
+    for position in range(0, len(data), 7):
+        damaged = bytearray(data)
+        damaged[position] ^= 0x5a
+        yield bytes(damaged)
+
+
+def check_round_trip() -> list[str]:
+    problems = []
+    for name, generator in GENERATORS.items():
+        tree = parse(generator(50))
+        if not same_tree(tree, loads_tree(dumps_tree(tree))):
+            problems.append(f"{name}: tree changed after round trip")
+    return problems
+
+
+def check_corrupted_trees() -> list[str]:
+    problems = []
+    for data in corrupted(dumps_tree(parse(GENERATORS["many_functions"](20)))):
+        try:
+            loads_tree(data)
+        except ValueError:
+            pass
+        except Exception as e:
+            problems.append(f"{type(e).__name__} instead of ValueError: {e}")
+    return problems
+
+
+def check_corrupted_cache() -> list[str]:
+    """Испорченное дерево в кеше - промах: конвейер разбирает исходник заново"""
+    problems = []
+    source = GENERATORS["nested_constructions"](20)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "source.txt")
+        with open(path, "w", encoding="utf-8") as source_file:
+            source_file.write(source)
+        cache = CompilationCache(directory, store_tree=True)
+        CompilationPipeline(path, cache=cache).optimized_code()
+        tree_path = os.path.join(directory, cache.key(source.encode()) + cache.TREE_SUFFIX)
+        with open(tree_path, "rb") as tree_file:
+            data = tree_file.read()
+        expected = parse(source)
+        for damaged in corrupted(data):
+            with open(tree_path, "wb") as tree_file:
+                tree_file.write(damaged)
+            try:
+                CompilationPipeline(path, cache=cache).tree()
+            except Exception as e:
+                problems.append(f"pipeline failed on a corrupt tree: {type(e).__name__}: {e}")
+        os.unlink(tree_path)
+        if not same_tree(expected, CompilationPipeline(path, cache=cache).tree()):
+            problems.append("pipeline did not reparse after a missing tree")
+    return problems
+
+
+def check_malformed_entries() -> list[str]:
+    """Запись кеша с корректным JSON, но без нужных полей - промах, а не KeyError"""
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CompilationCache(directory)
+        for number, text in enumerate(['{}', '[1]', '"text"', '{"generated": "x"}', 'null']):
+            key = f"entry{number}"
+            with open(os.path.join(directory, key + cache.ENTRY_SUFFIX), "w", encoding="utf-8") as entry_file:
+                entry_file.write(text)
+            try:
+                if cache.get(key) is not None:
+                    problems.append(f"{text} was returned as an entry")
+            except Exception as e:
+                problems.append(f"{text}: {type(e).__name__}: {e}")
+    return problems
+
+
+TREE_CHECKS = [
+    ("tree format: round trip keeps every generated tree", check_round_trip),
+    ("tree format: truncated or damaged data raises ValueError", check_corrupted_trees),
+    ("tree format: a damaged cached tree is a cache miss", check_corrupted_cache),
+    ("cache: an entry of the wrong shape is a cache miss", check_malformed_entries),
+]
+
+
+def main():
+    failed = 0
+    for name, source, present, absent in CASES:
+        code = optimize(source)
+        missing = [line for line in present if line not in code]
+        unexpected = [line for line in absent if line in code]
+        if missing or unexpected:
+            failed += 1
+            print(f"FAIL {name}")
+            for line in missing:
+                print(f"    missing:    {line}")
+            for line in unexpected:
+                print(f"    unexpected: {line}")
+            print("    " + code.replace("\n", "\n    "))
+        else:
+            print(f"ok   {name}")
+    for name, check in TREE_CHECKS:
+        problems = check()
+        if problems:
+            failed += 1
+            print(f"FAIL {name}")
+            for problem in problems[:10]:
+                print(f"    {problem}")
+        else:
+            print(f"ok   {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
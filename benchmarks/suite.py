@@ -0,0 +1,135 @@
+"""
+    Набор бенчмарков стадий трансляции на синтетических входах из benchmarks.generators.
+    Для каждого входа отдельно замеряются Lexer, Parser.parse, SemanticAnalyzer.analyze,
+    CodeGenerator и OptimizeCode: время (лучшее из --repeat), токены/с, узлы/с и пиковая память.
+
+    python -m benchmarks.suite [--scale N] [--only NAME ...] [--json results.json] [--compare old.json]
+"""
+import argparse
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from Lexer import LEXER_ENGINES
+from Parser import Parser
+from SemanticAnalyzer import SemanticAnalyzer
+from CodeGenerator import CodeGenerator
+from OptimizeCode import OptimizeCode
+from CompilationCache import TRANSLATOR_VERSION
+from benchmarks.generators import GENERATORS
+
+RECURSION_LIMIT = 20_000
+
+
+def stages(engine: str):
+    """Стадии в порядке выполнения: имя и функция от результатов предыдущих стадий"""
+    lexer_class = LEXER_ENGINES[engine]
+    return [
+        ("lexer", lambda state: lexer_class(io.StringIO(state["source"])).get_all_tokens(), "tokens"),
+        ("parser", lambda state: Parser(state["tokens"]).parse(), "tree"),
+        ("semantic", lambda state: SemanticAnalyzer(scope_cache=True).analyze(state["tree"]), "scope"),
+        ("codegen", lambda state: str(CodeGenerator(state["tree"])), "generated"),
+        ("optimize", lambda state: str(OptimizeCode(state["scope"], state["tree"])), "optimized"),
+    ]
+
+
+def run_input(source: str, engine: str, repeat: int, memory: bool) -> dict:
+    state = {"source": source}
+    results = {}
+    for name, stage, output in stages(engine):
+        best = None
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            value = stage(state)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        state[output] = value
+        results[name] = {"seconds": best}
+
+    tokens = len(state["tokens"])
+    nodes = sum(1 for _ in state["tree"].walk())
+    for name, result in results.items():
+        result["tokens_per_s"] = tokens / result["seconds"] if result["seconds"] else None
+        if name != "lexer":
+            result["nodes_per_s"] = nodes / result["seconds"] if result["seconds"] else None
+
+    if memory:
+        # отдельный прогон: под tracemalloc время неточно
+        memory_state = {"source": source}
+        tracemalloc.start()
+        for name, stage, output in stages(engine):
+            gc.collect()
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            memory_state[output] = stage(memory_state)
+            _, peak = tracemalloc.get_traced_memory()
+            results[name]["peak_bytes"] = peak - before
+        tracemalloc.stop()
+
+    return {"bytes": len(source.encode("utf-8")), "tokens": tokens, "nodes": nodes, "stages": results}
+
+
+def compare(current: dict, baseline: dict, out) -> None:
+    print(f"\nagainst {baseline.get('version')} ({baseline.get('timestamp')}): time ratio, >1 - slower", file=out)
+    for name, result in current["inputs"].items():
+        old = baseline.get("inputs", {}).get(name)
+        if old is None:
+            continue
+        ratios = []
+        for stage, values in result["stages"].items():
+            old_seconds = old["stages"].get(stage, {}).get("seconds")
+            if old_seconds:
+                ratios.append(f"{stage} {values['seconds'] / old_seconds:5.2f}")
+        print(f"{name:<22} " + "  ".join(ratios), file=out)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Translator stage benchmarks")
+    arg_parser.add_argument("--scale", type=int, default=2000, help="approximate top-level statements per input")
+    arg_parser.add_argument("--only", nargs="+", choices=sorted(GENERATORS), help="run only these inputs")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXER_ENGINES), default="buffered")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    arg_parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    arg_parser.add_argument("--compare", metavar="PATH", help="JSON results of a previous run")
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+
+    report = {
+        "version": TRANSLATOR_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "lexer": args.lexer,
+        "scale": args.scale,
+        "inputs": {},
+    }
+    out = sys.stderr if args.json == "-" else sys.stdout
+    for name in args.only or GENERATORS:
+        source = GENERATORS[name](args.scale)
+        result = run_input(source, args.lexer, args.repeat, not args.no_memory)
+        report["inputs"][name] = result
+        print(f"{name:<22} {result['bytes'] / 1024:>8.0f} KiB {result['tokens']:>8} tokens {result['nodes']:>8} nodes",
+              file=out)
+        for stage, values in result["stages"].items():
+            memory = f" {values['peak_bytes'] / 2**20:>8.2f} MiB" if "peak_bytes" in values else ""
+            print(f"    {stage:<10} {values['seconds'] * 1000:>9.1f} ms {values['tokens_per_s'] or 0:>12.0f} tokens/s"
+                  f" {values.get('nodes_per_s') or 0:>12.0f} nodes/s{memory}", file=out)
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            compare(report, json.load(baseline_file), out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,108 @@
-from Lexer import Lexer
-from Parser import Parser
-from CodeGenerator import CodeGenerator
+import argparse
+import sys
+import time
+from CompilationPipeline import CompilationPipeline
+from BatchTranslator import BatchTranslator, collect_sources
+from TranslationDaemon import TranslationDaemon
+from Instrumentation import ProfileObserver
+from TokenExport import TOKEN_FORMATS, write_tokens
+from Lexer import LEXER_ENGINES
+from Parser import PARSER_ENGINES
 from Exceptions import *
-from SemanticAnalyzer import SemanticAnalyzer
-from OptimizeCode import OptimizeCode
-  
+
 INPUT_PATH = "file.txt"
 LEXER_OUTPUT_PATH = "lexer_output.txt"
+LEXER_OUTPUT_PATHS = {"text": LEXER_OUTPUT_PATH, "jsonl": "lexer_output.jsonl", "binary": "lexer_output.bin"}
 PARSER_OUTPUT_PATH = "parser_output.txt"
 SEMANTIC_ANALYZER_OUTPUT_PATH = "semantic_output.txt"
 GENERATED_CODE_PATH = "generated_code.txt"
 OPTIMIZED_OUTPUT_PATH = "optimized_output.txt"
 ENCODING = "utf-8"
+LEXER_ENGINE = "buffered"  # "char" - посимвольный Lexer
+PARSER_ENGINE = "recursive"  # "iterative" - разбор операторов без рекурсии для глубокой вложенности
+BATCH_OUTPUT_DIR = "translated"
+CACHE_DIR = ".translator_cache"
+
+
+def translate_single(input_path, lexer_engine, observer=None, tokens_format="text", parser_engine=PARSER_ENGINE):
+  pipeline = CompilationPipeline(input_path, ENCODING, lexer_engine, observer=observer, parser_engine=parser_engine)
+
+  if tokens_format == "binary":
+    lexer_file = open(LEXER_OUTPUT_PATHS[tokens_format], "wb")
+  else:
+    lexer_file = open(LEXER_OUTPUT_PATHS[tokens_format], "w", encoding=ENCODING)
+  with lexer_file:
+    write_tokens(pipeline.tokens(), lexer_file, tokens_format)
+
+
+  with open(PARSER_OUTPUT_PATH, "w", encoding=ENCODING) as parser_file:
+    pipeline.tree().dump(parser_file)
+    parser_file.write("\n")
+
+
+  with open(SEMANTIC_ANALYZER_OUTPUT_PATH, "w", encoding=ENCODING) as semantic_file:
+    pipeline.scope().print(file=semantic_file)
+
+
+  with open(GENERATED_CODE_PATH, "w", encoding=ENCODING) as generate_file:
+    pipeline.write_generated_code(generate_file)
+    generate_file.write("\n")
+
+
+  with open(OPTIMIZED_OUTPUT_PATH, "w", encoding=ENCODING) as optimize_file:
+    pipeline.write_optimized_code(optimize_file)
+    optimize_file.write("\n")
+
+
+def translate_batch(args):
+  root, paths = collect_sources(args.batch, args.pattern)
+  translator = BatchTranslator(args.out, args.workers, args.chunksize, ENCODING, args.lexer,
+                               None if args.no_cache else args.cache)
+  start = time.perf_counter()
+  results = translator.run(paths, root)
+  elapsed = time.perf_counter() - start
+
+  failed = [result for result in results if result.error is not None]
+  for result in failed:
+    print(f"{result.path}: {result.error}", file=sys.stderr)
+  print(f"translated {len(results) - len(failed)}/{len(results)} files in {elapsed:.2f} s "
+        f"({len(results) / elapsed if elapsed else 0:.1f} files/s, {translator.workers} workers)")
+  return 1 if failed else 0
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description="C to Java translator")
+  arg_parser.add_argument("input", nargs="?", default=INPUT_PATH, help="file to translate with all stage dumps")
+  arg_parser.add_argument("--lexer", choices=list(LEXER_ENGINES), default=LEXER_ENGINE)
+  arg_parser.add_argument("--parser", choices=list(PARSER_ENGINES), default=PARSER_ENGINE,
+                          help="statement parser: recursive descent or explicit stack for deep nesting")
+  arg_parser.add_argument("--tokens-format", choices=TOKEN_FORMATS, default="text",
+                          help="lexer dump format: text, JSON Lines or packed binary records")
+  arg_parser.add_argument("--batch", metavar="DIR_OR_GLOB", help="translate every matching file in a process pool")
+  arg_parser.add_argument("--pattern", default="*.c", help="file pattern for a --batch directory")
+  arg_parser.add_argument("--out", default=BATCH_OUTPUT_DIR, help="output directory for --batch")
+  arg_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+  arg_parser.add_argument("--chunksize", type=int, default=1, help="files sent to a worker at once")
+  arg_parser.add_argument("--cache", default=CACHE_DIR, help="compilation cache directory for --batch")
+  arg_parser.add_argument("--no-cache", action="store_true")
+  arg_parser.add_argument("--profile", action="store_true", help="print per-stage timings and counters to stderr")
+  arg_parser.add_argument("--cprofile", action="store_true", help="with --profile: also capture cProfile stats per stage")
+  arg_parser.add_argument("--daemon", action="store_true", help="serve JSON requests on stdin/stdout and watch files")
+  arg_parser.add_argument("--poll-interval", type=float, default=0.1, help="file polling interval for --daemon, s")
+  args = arg_parser.parse_args()
 
+  if args.daemon:
+    TranslationDaemon(ENCODING, args.lexer, args.poll_interval).serve(sys.stdin, sys.stdout)
+    return 0
+  if args.batch:
+    return translate_batch(args)
+  observer = ProfileObserver(args.cprofile) if args.profile or args.cprofile else None
+  translate_single(args.input, args.lexer, observer, args.tokens_format, args.parser)
+  if observer is not None:
+    print(f"profile of {args.input}", file=sys.stderr)
+    observer.summary(sys.stderr)
+  return 0
 
-with (
-  open(INPUT_PATH, "r", encoding=ENCODING) as in_file,
-  open(LEXER_OUTPUT_PATH, "w", encoding=ENCODING) as lexer_file
-):
-  lexer = Lexer(in_file)
-  lexer.print_all_tokens(file=lexer_file)
-
-
-with (
-  open(INPUT_PATH, "r", encoding=ENCODING) as in_file,
-  open(PARSER_OUTPUT_PATH, "w", encoding=ENCODING) as parser_file
-):
-  lexer = Lexer(in_file)
-  parser = Parser(lexer)
-  syntax_tree = parser.parse()
-  print(syntax_tree, file=parser_file)
-
-
-with (
-  open(INPUT_PATH, "r", encoding=ENCODING) as in_file,
-  open(SEMANTIC_ANALYZER_OUTPUT_PATH, "w", encoding=ENCODING) as semantic_file
-):
-  lexer = Lexer(in_file)
-  parser = Parser(lexer)
-  tree = parser.parse()
-  semantic = SemanticAnalyzer()
-  scope = semantic.analyze(tree)
-  scope.print(file=semantic_file)
-
-
-with (
-  open(INPUT_PATH, "r", encoding=ENCODING) as in_file,
-  open(GENERATED_CODE_PATH, "w", encoding=ENCODING) as generate_file
-):
-  lexer = Lexer(in_file)
-  parser = Parser(lexer)
-  tree = parser.parse()
-  code_generation = CodeGenerator(tree)
-  print(code_generation, file=generate_file)
-
-
-with (
-  open(OPTIMIZED_OUTPUT_PATH, "w", encoding=ENCODING) as optimize_file
-):
-  optimized_code = OptimizeCode(scope, tree, optimize_file)
-  optimized_code.print()
 
+if __name__ == "__main__":
+  sys.exit(main())